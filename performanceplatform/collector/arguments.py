@@ -3,24 +3,25 @@ import json
 from dateutil.parser import parse as parse_date
 
 
+def _load_json_file(path):
+    with open(path) as f:
+        json_data = json.load(f)
+        json_data['path_to_json_file'] = path
+        return json_data
+
+
 def parse_args(name="", args=None):
     """Parse command line argument for a collector
 
     Returns an argparse.Namespace with 'config' and 'query' options"""
-    def _load_json_file(path):
-        with open(path) as f:
-            json_data = json.load(f)
-            json_data['path_to_json_file'] = path
-            return json_data
-
     parser = argparse.ArgumentParser(description="%s collector for sending"
                                                  " data to the performance"
                                                  " platform" % name)
     parser.add_argument('-c', '--credentials', dest='credentials',
                         type=_load_json_file,
                         help='JSON file containing credentials '
-                             'for the collector',
-                        required=True)
+                             'for the collector (with --batch, only needed '
+                             'by lines without their own)')
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-l', '--collector', dest='collector_slug',
                        type=str,
@@ -32,11 +33,18 @@ def parse_args(name="", args=None):
                             'about the query to make '
                             'against the source API '
                             'and the target data-set')
+    group.add_argument('--batch', dest='batch',
+                       type=str,
+                       help='File listing collectors to run in this '
+                            'process, one collector slug or query file '
+                            'path per line, optionally followed by '
+                            'comma separated credentials and token file '
+                            'paths')
     parser.add_argument('-t', '--token', dest='token',
                         type=_load_json_file,
                         help='JSON file containing token '
-                             'for the collector',
-                        required=True)
+                             'for the collector (with --batch, only needed '
+                             'by lines without their own)')
     parser.add_argument('-b', '--performanceplatform',
                         dest='performanceplatform',
                         type=_load_json_file,
@@ -57,7 +65,29 @@ def parse_args(name="", args=None):
                         help='Instead of pushing to the Performance Platform '
                              'the collector will print out what would have '
                              'been pushed')
-    parser.set_defaults(console_logging=False, dry_run=False)
+    parser.add_argument('--force-push', dest='force_push',
+                        action='store_true',
+                        help='Push every document, including those which '
+                             'have not changed since they were last pushed')
+    parser.add_argument('--batch-concurrency', dest='batch_concurrency',
+                        type=int,
+                        help='Number of collectors from a batch to run at '
+                             'the same time')
+    parser.add_argument('--resume', dest='resume',
+                        action='store_true',
+                        help='Instead of collecting data, send any data '
+                             'spooled by an earlier push which failed')
+    parser.set_defaults(console_logging=False, dry_run=False,
+                        force_push=False, resume=False,
+                        batch_concurrency=4)
     args = parser.parse_args(args)
 
+    # A batch may give every collector its own credentials and token, which
+    # is checked once the batch file has been read
+    if not args.batch:
+        if args.credentials is None:
+            parser.error('argument -c/--credentials is required')
+        if args.token is None:
+            parser.error('argument -t/--token is required')
+
     return args
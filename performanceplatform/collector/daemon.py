@@ -0,0 +1,248 @@
+"""
+A long-running alternative to installing the collector jobs with crontab.
+
+The jobs file (the same one read by crontab.py) and the JSON config files
+it names are read once at start up, and the config of each collector is
+fetched from Stagecraft on its first run. Every minute the jobs which are
+due are run in a pool of threads, so later runs reuse the modules, clients
+and connections warmed up by earlier ones instead of starting a new process.
+Everything logged during a run is tagged with its collector's data set and
+query, as it is by pp-collector.
+"""
+import argparse
+import copy
+import logging
+import os
+import threading
+import time
+from argparse import Namespace
+from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
+
+from performanceplatform.collector.arguments import _load_json_file
+from performanceplatform.collector.crontab import parse_job_line, skip_job
+from performanceplatform.collector.ga.lib.helper import reuse_clients
+from performanceplatform.collector.logging_setup import (
+    job_logging_fields, set_up_logging)
+from performanceplatform.collector.main import (
+    _log_collector_instead_of_running, make_extra_json_fields, run_collection)
+from performanceplatform.utils import requests_with_backoff
+from performanceplatform.utils.collector import get_config
+
+
+class CronSchedule(object):
+
+    """
+    A standard five field crontab schedule, e.g. "*/15 6-18 * * 1-5"
+
+    >>> CronSchedule('*/15 6-18 * * 1-5').matches(datetime(2014, 4, 7, 9, 30))
+    True
+    >>> CronSchedule('*/15 6-18 * * 1-5').matches(datetime(2014, 4, 6, 9, 30))
+    False
+    """
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != len(self.FIELD_RANGES):
+            raise ValueError(
+                "Bad schedule {0!r}, expected five fields".format(expression))
+
+        (self.minutes, self.hours, self.days_of_month, self.months,
+         days_of_week) = [
+            parse_cron_field(field, low, high)
+            for field, (low, high) in zip(fields, self.FIELD_RANGES)]
+        # Both 0 and 7 mean Sunday
+        if 7 in days_of_week:
+            days_of_week = days_of_week | set([0])
+        self.days_of_week = days_of_week
+        self.any_day_of_month = fields[2] == '*'
+        self.any_day_of_week = fields[4] == '*'
+
+    def matches(self, when):
+        day_of_month = when.day in self.days_of_month
+        day_of_week = (when.weekday() + 1) % 7 in self.days_of_week
+
+        # As in cron, a job with both kinds of day restricted runs when
+        # either of them matches
+        if self.any_day_of_month or self.any_day_of_week:
+            day = day_of_month and day_of_week
+        else:
+            day = day_of_month or day_of_week
+
+        return (when.minute in self.minutes and
+                when.hour in self.hours and
+                when.month in self.months and
+                day)
+
+
+def parse_cron_field(field, low, high):
+    """
+    >>> sorted(parse_cron_field('1-3,10-20/5', 0, 59))
+    [1, 2, 3, 10, 15, 20]
+    >>> sorted(parse_cron_field('*/6', 0, 23))
+    [0, 6, 12, 18]
+    """
+    values = set()
+    for part in field.split(','):
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        else:
+            step = 1
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+        else:
+            start = end = int(part)
+
+        if start < low or end > high or start > end:
+            raise ValueError("Bad schedule field {0!r}".format(field))
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Job(object):
+
+    def __init__(self, schedule, collector_slug, credentials, token,
+                 performanceplatform):
+        self.schedule = CronSchedule(schedule)
+        self.collector_slug = collector_slug
+        self.credentials = credentials
+        self.token = token
+        self.performanceplatform = performanceplatform
+        self.query = None
+        self.running = threading.Lock()
+
+    def args(self):
+        """
+        The arguments pp-collector would have been run with by crontab
+        """
+        if self.query is None:
+            self.query = get_config(
+                self.collector_slug, self.performanceplatform)
+
+        return Namespace(
+            collector_slug=self.collector_slug,
+            query=copy.deepcopy(self.query),
+            # collectors are free to change what they are given
+            credentials=copy.deepcopy(self.credentials),
+            token=copy.deepcopy(self.token),
+            performanceplatform=copy.deepcopy(self.performanceplatform),
+            start_at=None,
+            end_at=None,
+            console_logging=True,
+            dry_run=False,
+            force_push=False,
+            resume=False,
+        )
+
+    def run(self):
+        if not self.running.acquire(False):
+            logging.warning('Not running {} as its previous run has not '
+                            'finished'.format(self.collector_slug))
+            return
+        # Filled in with the rest of the collector's fields once its config
+        # has been fetched
+        fields = {'collector': self.collector_slug}
+        with job_logging_fields(fields):
+            try:
+                args = self.args()
+                fields.update(make_extra_json_fields(args))
+                if os.environ.get('DISABLE_COLLECTORS', 'false') == 'true':
+                    _log_collector_instead_of_running(
+                        args.query['entrypoint'], args)
+                else:
+                    run_collection(args.query['entrypoint'], args)
+            except (Exception, SystemExit):
+                logging.exception('Collector {} failed'.format(
+                    self.collector_slug))
+            finally:
+                self.running.release()
+
+
+def load_jobs(path_to_jobs, path_to_app):
+    """
+    Read the jobs this host should run from the jobs file, loading each
+    JSON config file only once.
+    """
+    loaded = {}
+
+    def config(name):
+        path = os.path.join(path_to_app, 'config', name)
+        if path not in loaded:
+            loaded[path] = _load_json_file(path)
+        return loaded[path]
+
+    jobs = []
+    job_number = 0
+    with open(path_to_jobs) as job_lines:
+        for line in job_lines:
+            parsed = parse_job_line(line)
+            if parsed is None:
+                continue
+            job_number += 1
+            if skip_job(job_number):
+                continue
+
+            schedule, collector_slug, credentials, \
+                token, performanceplatform = parsed
+            jobs.append(Job(schedule, collector_slug, config(credentials),
+                            config(token), config(performanceplatform)))
+    return jobs
+
+
+def run_due_jobs(jobs, pool, when):
+    for job in jobs:
+        if job.schedule.matches(when):
+            pool.apply_async(job.run)
+
+
+def run_forever(jobs, workers):
+    reuse_clients()
+    requests_with_backoff.configure_session(pool_maxsize=workers)
+    pool = ThreadPool(workers)
+    logging.info('Scheduling {} collector jobs'.format(len(jobs)))
+    try:
+        while True:
+            now = datetime.now()
+            next_minute = (now + timedelta(minutes=1)).replace(
+                second=0, microsecond=0)
+            time.sleep((next_minute - now).total_seconds())
+            run_due_jobs(jobs, pool, next_minute)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path_to_app',
+                        help='Path to the application, containing the '
+                             'config and log directories')
+    parser.add_argument('path_to_jobs',
+                        help='Path to the file where job templates are')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        default=4,
+                        help='Number of collectors to run at the same time')
+    parser.add_argument('--console-logging', dest='console_logging',
+                        action='store_true',
+                        help='Output logging to the console rather than file')
+    args = parser.parse_args()
+
+    loglevel = getattr(logging, os.environ.get('LOGLEVEL', 'INFO').upper())
+    if args.console_logging:
+        logging.basicConfig(level=loglevel)
+    else:
+        set_up_logging('performanceplatform.collector.daemon', loglevel,
+                       os.path.join(args.path_to_app, 'log'), 'daemon')
+
+    run_forever(load_jobs(args.path_to_jobs, args.path_to_app),
+                args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,9 +7,18 @@ from performanceplatform.collector.ga.core \
 from performanceplatform.collector.ga.lib.helper import create_client
 
 from performanceplatform.utils.data_pusher import Pusher
+from performanceplatform.utils.watermark import (
+    incremental_range, record_collected)
 
 
 def main(credentials, data_set_config, query, options, start_at, end_at):
+    frequency = query.get('frequency', 'weekly')
+    date_range = incremental_range(
+        data_set_config, options, frequency, start_at, end_at)
+    if date_range is None:
+        return
+    start_at, end_at = date_range
+
     client = create_client(credentials)
 
     documents = query_documents_for(
@@ -18,3 +27,4 @@ def main(credentials, data_set_config, query, options, start_at, end_at):
         start_at, end_at)
 
     Pusher(data_set_config, options).push(documents)
+    record_collected(data_set_config, options, frequency, start_at, end_at)
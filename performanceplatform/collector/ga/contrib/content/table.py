@@ -1,20 +1,35 @@
+import logging
 import re
+from multiprocessing.pool import ThreadPool
+
 from performanceplatform.collector.ga.plugins.department import \
-    try_get_department
+    try_get_departments
 
 from performanceplatform.collector.ga import \
     create_client, query_documents_for
+from performanceplatform.collector.ga.core import \
+    MAX_CONCURRENT_REQUESTS_PER_VIEW
 
 from performanceplatform.utils.data_pusher import Pusher
 
 
 def main(credentials, data_set_config, query, options, start_at, end_at):
+    """
+    Query GA once for each of the "filtersets", setting the department of
+    the documents from each one's department filter, and push the documents
+    for each filterset as soon as they have been fetched. With the
+    "empty-data-set" option every filterset is fetched before anything is
+    pushed, so that a failure leaves the data set as it was.
+
+    With the "filterset-concurrency" option that many filtersets are
+    queried at the same time. They all query the same view, so together
+    with "query-concurrency" it is kept within GA's limit of concurrent
+    requests per view.
+    """
     client = create_client(credentials)
 
     assert "filtersets" in options, "`filtersets` must be specified"
 
-    documents = []
-
     original_filters = query.get("filters", [])
 
     def insert_ga(filters):
@@ -28,29 +43,81 @@ def main(credentials, data_set_config, query, options, start_at, end_at):
 
         return list(gen())
 
-    for filters in options["filtersets"]:
-
-        all_filters = insert_ga(original_filters + filters)
-        query["filters"] = [";".join(all_filters)]
+    filtersets = options["filtersets"]
+    departments = get_departments(filtersets)
+
+    def fetch(filters_and_department):
+        filters, department = filters_and_department
+
+        filterset_query = dict(query)
+        filterset_query["filters"] = [
+            ";".join(insert_ga(original_filters + filters))]
+
+        filterset_options = dict(options)
+        filterset_options["additionalFields"] = dict(
+            options.get("additionalFields", {}), department=department)
+
+        # Build the documents in the worker too
+        return department, list(query_documents_for(
+            client, filterset_query, filterset_options,
+            data_set_config['data-type'], start_at, end_at))
+
+    pool = ThreadPool(filterset_concurrency(options))
+    pusher = Pusher(data_set_config, options)
+    try:
+        fetched = pool.imap_unordered(fetch, zip(filtersets, departments))
+        if options.get('empty-data-set'):
+            # Emptying the data set and then failing on a later filterset
+            # would leave only some departments, so fetch them all first
+            documents = []
+            for department, department_documents in fetched:
+                documents.extend(department_documents)
+            pusher.push(documents)
+        else:
+            for department, documents in fetched:
+                logging.info("Pushing {} documents for {}".format(
+                    len(documents), department))
+                pusher.push(documents)
+    finally:
+        pool.terminate()
+
+
+def filterset_concurrency(options):
+    """
+    The number of filtersets to query at the same time
+
+    >>> filterset_concurrency({'filterset-concurrency': 4})
+    4
+    >>> filterset_concurrency({'filterset-concurrency': 4,
+    ...                        'query-concurrency': 5})
+    2
+    >>> filterset_concurrency({'filterset-concurrency': 20})
+    10
+    """
+    requests_per_filterset = options.get('query-concurrency', 1)
+    return max(1, min(options.get('filterset-concurrency', 1),
+                      MAX_CONCURRENT_REQUESTS_PER_VIEW //
+                      requests_per_filterset))
 
-        options.setdefault("additionalFields", {}).update(
-            {"department": get_department(filters)})
 
-        ds = query_documents_for(
-            client, query, options, data_set_config['data-type'],
-            start_at, end_at
-        )
+def get_department(filters):
+    (department, ) = get_departments([filters])
+    return department
 
-        documents.extend(ds)
 
-    Pusher(data_set_config, options).push(documents)
+def get_departments(filtersets):
+    """
+    Return the department for each of the filtersets, in the same order
+    """
+    return try_get_departments(
+        _department_filter_value(filters) for filters in filtersets)
 
 
-def get_department(filters):
+def _department_filter_value(filters):
     for f in filters:
         try:
             filter_key, filter_value = re.split('=~\^', f)
-            return try_get_department(filter_value)
+            return filter_value
         except:
             raise ValueError("department not found in filters, expected "
                              "filter expression expression containing "
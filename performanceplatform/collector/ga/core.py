@@ -1,12 +1,32 @@
 import json
 import logging
-from performanceplatform.utils.data_parser import DataParser
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from multiprocessing.pool import ThreadPool
+
+from performanceplatform.collector.ga.lib.response_cache import (
+    ResponseCache, cache_key)
+from performanceplatform.utils.data_parser import DataParser, run_plugins
+from performanceplatform.utils.iterutil import chunks
 
 from performanceplatform.utils.datetimeutil \
     import period_range
 
+# The Core Reporting API allows at most 10 concurrent requests per view
+# (profile), see
+# https://developers.google.com/analytics/devguides/reporting/core/v3/limits-quotas
+MAX_CONCURRENT_REQUESTS_PER_VIEW = 10
+
+# The GA dimension identifying which period a row belongs to when a whole
+# range is fetched with a single query.
+PERIOD_DIMENSIONS = {
+    'daily': 'date',
+    'weekly': 'isoYearIsoWeek',
+    'monthly': 'yearMonth',
+}
 
-def query_ga(client, config, start_date, end_date):
+
+def query_ga(client, config, start_date, end_date, cache=None):
     logging.info("Querying GA for data in the period: %s - %s"
                  % (str(start_date), str(end_date)))
 
@@ -21,7 +41,7 @@ def query_ga(client, config, start_date, end_date):
     if sort == []:
         sort = None
 
-    return client.query.get(
+    args = (
         config["id"].replace("ga:", ""),
         start_date,
         end_date,
@@ -33,6 +53,19 @@ def query_ga(client, config, start_date, end_date):
         config.get("segment")
     )
 
+    if cache is None or not cache.is_settled(end_date):
+        return client.query.get(*args)
+
+    key = cache_key(*args)
+    records = cache.get(key)
+    if records is None:
+        records = list(client.query.get(*args))
+        cache.put(key, records)
+    else:
+        logging.info("Using cached GA data for the period: %s - %s"
+                     % (str(start_date), str(end_date)))
+    return records
+
 
 def try_number(value):
     """
@@ -78,26 +111,198 @@ def build_document_set(results):
             for item in results)
 
 
-def query_for_range(client, query, range_start, range_end):
+def query_for_range(client, query, range_start, range_end, concurrency=1,
+                    cache=None):
+    """
+    Yield the GA records for every period between `range_start` and
+    `range_end`, in period order.
+
+    With a `concurrency` greater than one the periods are fetched by a pool
+    of that many threads (capped at the per-view limit), then reassembled
+    in period order.
+
+    Closed periods are read from and saved to `cache`, a ResponseCache, if
+    one is given.
+    """
+    frequency = query.get('frequency', 'weekly')
+    periods = period_range(range_start, range_end, frequency)
+
+    if concurrency > 1:
+        results = query_periods_concurrently(
+            client, query, periods, concurrency, cache)
+    else:
+        results = (query_ga(client, query, start, end, cache)
+                   for start, end in periods)
+
+    for period_results in results:
+        for record in period_results:
+            yield record
+
+
+def query_periods_concurrently(client, query, periods, concurrency,
+                               cache=None):
+    def fetch_period(period):
+        start, end = period
+        # Iterate in the worker so that any pagination happens there too
+        return list(query_ga(client, query, start, end, cache))
+
+    pool = ThreadPool(min(concurrency, MAX_CONCURRENT_REQUESTS_PER_VIEW))
+    try:
+        for period_results in pool.imap(fetch_period, periods):
+            yield period_results
+    finally:
+        pool.terminate()
+
+
+def query_range_in_one_shot(client, query, range_start, range_end,
+                            cache=None):
+    """
+    Yield the same records as `query_for_range`, but fetched with one query
+    spanning the whole range and split back into periods using the period
+    dimension for the query's frequency.
+    """
     frequency = query.get('frequency', 'weekly')
+    periods = list(period_range(range_start, range_end, frequency))
+    if not periods:
+        return
+
+    if query.get('maxResults'):
+        raise ValueError("maxResults applies per period, so it can not be "
+                         "used with a single-shot query")
+
+    period_dimension = PERIOD_DIMENSIONS[frequency]
+    dimensions = list(query.get('dimensions') or [])
+    added_dimension = period_dimension not in dimensions
+    if added_dimension:
+        dimensions.append(period_dimension)
+
+    records_by_period = OrderedDict(
+        (period, []) for period in periods)
+    end_of_period = dict(periods)
+
+    query_dimensions = query.get('dimensions') or []
 
-    for start, end in period_range(range_start, range_end, frequency):
-        for record in query_ga(client, query, start, end):
+    for record in query_ga(client, dict(query, dimensions=dimensions),
+                           periods[0][0], periods[-1][1], cache):
+        record_dimensions = record['dimensions']
+        period_value = record_dimensions[period_dimension]
+        if added_dimension:
+            record_dimensions = gapy_dimensions(
+                query_dimensions,
+                [record_dimensions[name] for name in query_dimensions])
+
+        try:
+            start = parse_period_dimension(frequency, period_value)
+            period = (start, end_of_period[start])
+        except (KeyError, ValueError):
+            logging.warning("Skipping GA row for unknown period {0!r}"
+                            .format(period_value))
+            continue
+
+        record = dict(record, start_date=period[0], end_date=period[1])
+        if query.get('dimensions'):
+            record['dimensions'] = record_dimensions
+        else:
+            del record['dimensions']
+        records_by_period[period].append(record)
+
+    for records in records_by_period.values():
+        for record in records:
             yield record
 
 
+def gapy_dimensions(names, values):
+    """
+    Return the dimensions of a row as gapy would have made them for a query
+    with just these dimensions.
+
+    The _id of a document depends on the order dimensions.values() comes
+    out in, which depends on how the dict was built, so this has to build
+    it in the same way as gapy rather than by removing dimensions from a
+    bigger dict.
+    """
+    dimensions = dict(zip(names, values))
+    if "date" in dimensions:
+        if "hour" in dimensions:
+            dimensions["datetime"] = datetime.strptime(
+                dimensions["date"] + dimensions["hour"], "%Y%m%d%H")
+        else:
+            dimensions["datetime"] = datetime.strptime(dimensions["date"],
+                                                       "%Y%m%d")
+    return dimensions
+
+
+def parse_period_dimension(frequency, value):
+    """
+    Return the first day of the period named by a GA period dimension value
+
+    >>> parse_period_dimension('daily', '20140413')
+    datetime.date(2014, 4, 13)
+    >>> parse_period_dimension('weekly', '201415')
+    datetime.date(2014, 4, 7)
+    >>> parse_period_dimension('monthly', '201404')
+    datetime.date(2014, 4, 1)
+    """
+    if frequency == 'daily':
+        return datetime.strptime(value, '%Y%m%d').date()
+    elif frequency == 'weekly':
+        year, week = int(value[:4]), int(value[4:])
+        fourth_of_january = date(year, 1, 4)
+        first_monday = fourth_of_january - timedelta(
+            days=fourth_of_january.weekday())
+        return first_monday + timedelta(weeks=week - 1)
+    elif frequency == 'monthly':
+        return datetime.strptime(value, '%Y%m').date()
+    raise ValueError('Bad value of frequency, should be daily, weekly '
+                     'or monthly')
+
+
 def query_documents_for(client, query, options,
                         data_type, start_date, end_date):
-    results = query_for_range(client, query, start_date, end_date)
+    cache = ResponseCache.from_options(options)
+    if options.get('single-shot'):
+        results = query_range_in_one_shot(
+            client, query, start_date, end_date, cache)
+    else:
+        results = query_for_range(client, query, start_date, end_date,
+                                  options.get('query-concurrency', 1), cache)
 
-    results = list(results)
     frequency = query.get('frequency', 'weekly')
+    if options.get('streaming'):
+        return stream_documents_for(results, options, data_type, frequency)
+
+    results = list(results)
     special_fields = add_timeSpan(frequency, build_document_set(results))
     return DataParser(results, options, data_type).get_data(
         special_fields
     )
 
 
+def stream_documents_for(results, options, data_type, frequency):
+    """
+    Build documents from GA `results` a chunk at a time, so that the first
+    documents can be pushed while later periods are still being fetched.
+
+    Plugins which need the complete set of documents, such as
+    AggregateKey, mean the documents are collected into a single list for
+    them; other plugins are run over the documents as they are built.
+    """
+    plugins = options.get('plugins')
+    parser_options = dict(
+        (key, value) for key, value in options.items() if key != 'plugins')
+
+    documents = (
+        document
+        for chunk in chunks(results, options.get('chunk-size', 100))
+        for document in DataParser(chunk, parser_options, data_type).get_data(
+            add_timeSpan(frequency, build_document_set(chunk)))
+    )
+
+    if plugins:
+        return run_plugins(plugins, documents)
+    return documents
+
+
 def add_timeSpan(frequency, special_fields):
     frequency_to_timespan_mapping = {
         'daily': 'day',
@@ -1,4 +1,11 @@
+import hashlib
+import json
+import threading
+import urlparse
+
 from performanceplatform.utils.http_with_backoff import HttpWithBackoff
+from performanceplatform.utils.rate_limit import shared_bucket
+from performanceplatform.utils.state import state_path
 from gapy.client import (
     from_private_key,
     from_secrets_file,
@@ -11,12 +18,97 @@ def track_ga_api_usage(kwargs):
     statsd.incr('ga.core.{}.count'.format(kwargs['ids'].replace(':', '')))
 
 
+# The most requests per second Google allows for each user of a project
+DEFAULT_REQUESTS_PER_SECOND = 10
+
+
+class GARateLimiter(object):
+
+    """
+    Wait before each request to the GA API so that, between them, all of the
+    clients for the same Google project stay under
+    requests_per_second, and requests for any one profile under
+    requests_per_second_per_profile (if set). These are read from the
+    RATE_LIMIT of the credentials, which can also set
+    share_between_processes to apply the limits across every collector
+    process on the host.
+    """
+
+    def __init__(self, credentials):
+        limits = credentials.get('RATE_LIMIT', {})
+        self.name = hashlib.sha1(_project_of(credentials)).hexdigest()
+        self.share_between_processes = limits.get(
+            'share_between_processes', False)
+        self.per_profile = limits.get('requests_per_second_per_profile')
+        self.project_bucket = self._bucket(
+            'project', limits.get('requests_per_second',
+                                  DEFAULT_REQUESTS_PER_SECOND))
+
+    def __call__(self, uri):
+        self.project_bucket.acquire()
+
+        if self.per_profile:
+            query = urlparse.parse_qs(urlparse.urlparse(uri).query)
+            for profile_id in query.get('ids', []):
+                self._bucket(profile_id.replace(':', ''),
+                             self.per_profile).acquire()
+
+    def _bucket(self, scope, rate):
+        name = '{}-{}'.format(self.name, scope)
+        path = None
+        if self.share_between_processes:
+            path = state_path('ga-rate-limit', '{}.json'.format(name))
+        return shared_bucket(name, rate, path=path)
+
+
+def _project_of(credentials):
+    """
+    Return something identifying the Google project the credentials are for
+    """
+    if 'ACCOUNT_NAME' in credentials:
+        return credentials['ACCOUNT_NAME']
+    client_secrets = credentials['CLIENT_SECRETS']
+    if isinstance(client_secrets, dict):
+        return client_secrets['installed']['client_id']
+    # the path to a client secrets file
+    return client_secrets
+
+
+_reusable_clients = None
+_reusable_clients_lock = threading.Lock()
+
+
+def reuse_clients():
+    """
+    Keep each client once it has been created, so that later collector runs
+    in the same process with the same credentials skip building and
+    authorising a new one.
+    """
+    global _reusable_clients
+    with _reusable_clients_lock:
+        if _reusable_clients is None:
+            _reusable_clients = {}
+
+
 def create_client(credentials):
+    if _reusable_clients is None:
+        return _create_client(credentials)
+
+    key = json.dumps(credentials, sort_keys=True)
+    with _reusable_clients_lock:
+        if key not in _reusable_clients:
+            _reusable_clients[key] = _create_client(credentials)
+        return _reusable_clients[key]
+
+
+def _create_client(credentials):
+    http_client = HttpWithBackoff(rate_limiter=GARateLimiter(credentials))
+
     if "CLIENT_SECRETS" in credentials and "STORAGE_PATH" in credentials:
         return from_secrets_file(
             credentials['CLIENT_SECRETS'],
             storage_path=credentials['STORAGE_PATH'],
-            http_client=HttpWithBackoff(),
+            http_client=http_client,
             ga_hook=track_ga_api_usage,
         )
     elif "ACCOUNT_NAME" in credentials:
@@ -24,13 +116,13 @@ def create_client(credentials):
             credentials['ACCOUNT_NAME'],
             private_key_path=credentials['PRIVATE_KEY'],
             storage_path=credentials['STORAGE_PATH'],
-            http_client=HttpWithBackoff(),
+            http_client=http_client,
             ga_hook=track_ga_api_usage,
         )
     else:
         return from_credentials_db(
             credentials['CLIENT_SECRETS']['installed'],
             credentials['OAUTH2_CREDENTIALS'],
-            http_client=HttpWithBackoff(),
+            http_client=http_client,
             ga_hook=track_ga_api_usage,
         )
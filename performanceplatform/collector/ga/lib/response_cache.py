@@ -0,0 +1,134 @@
+import cPickle as pickle
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from performanceplatform.utils.state import state_path
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# GA keeps processing data for a day or two after it is collected
+DEFAULT_SETTLE_DAYS = 3
+
+
+class ResponseCache(object):
+
+    """
+    A cache on local disk of the records returned by GA queries for periods
+    which have closed, so that backfilling the same range again does not use
+    up any quota.
+
+    Entries are addressed by a hash of everything which affects the results,
+    and the least recently used are removed once the cache is larger than
+    `max_bytes`. Periods ending within `settle_days` of today are never
+    cached, as GA may still change their figures.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES,
+                 settle_days=DEFAULT_SETTLE_DAYS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.settle_days = settle_days
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, options):
+        """
+        Return the cache set up by the 'response-cache' options of a query,
+        or None if it is not turned on.
+        """
+        if not options.get('response-cache'):
+            return None
+        return cls(
+            os.path.dirname(state_path('ga-response-cache', 'entry')),
+            options.get('response-cache-bytes', DEFAULT_MAX_BYTES),
+            options.get('response-cache-settle-days', DEFAULT_SETTLE_DAYS))
+
+    def is_settled(self, end_date, today=None):
+        if isinstance(end_date, datetime):
+            end_date = end_date.date()
+        today = today or date.today()
+        return end_date < today - timedelta(days=self.settle_days)
+
+    def get(self, key):
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as f:
+                records = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return None
+
+        try:
+            # The modified time records when an entry was last used
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+        return records
+
+    def put(self, key, records):
+        entry_path = self._entry_path(key)
+        temporary_path = '{}.{}.{}.tmp'.format(
+            entry_path, os.getpid(), threading.current_thread().ident)
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(records, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(temporary_path, entry_path)
+        self._evict()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, '{}.pickle'.format(key))
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.path):
+                if not name.endswith('.pickle'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except OSError:
+                    # removed by another collector
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+                total_bytes -= size
+                logging.debug('Evicted {} from the GA response cache'
+                              .format(name))
+
+
+def cache_key(profile_id, start_date, end_date, metrics, dimensions=None,
+              filters=None, max_results=None, sort=None, segment=None):
+    """
+    Return a key which is the same for, and only for, queries which return
+    the same results.
+
+    >>> key = cache_key('ga:123', date(2014, 1, 6), date(2014, 1, 12),
+    ...                 ['visits'], ['deviceCategory'])
+    >>> key == cache_key('ga:123', date(2014, 1, 6), date(2014, 1, 12),
+    ...                  ['visits'], ['deviceCategory'])
+    True
+    >>> key == cache_key('ga:123', date(2014, 1, 13), date(2014, 1, 19),
+    ...                  ['visits'], ['deviceCategory'])
+    False
+    """
+    return hashlib.sha1(json.dumps([
+        profile_id,
+        start_date.strftime('%Y-%m-%d'),
+        end_date.strftime('%Y-%m-%d'),
+        metrics,
+        dimensions,
+        filters,
+        max_results,
+        sort,
+        segment,
+    ], sort_keys=True)).hexdigest()
@@ -9,4 +9,4 @@ from .department import ComputeDepartmentKey, SetDepartment
 from .rank import ComputeRank
 from .remove_key import RemoveKey
 
-from .load_plugin import load_plugins
+from .load_plugin import compile_plugins, load_plugins
@@ -1,6 +1,7 @@
 from __future__ import division
 
-from itertools import groupby
+from itertools import chain, groupby
+from operator import itemgetter
 
 
 class AggregateKey(object):
@@ -26,11 +27,53 @@ class AggregateKey(object):
         self.aggregations = aggregations
 
     def __call__(self, documents):
-        first = documents[0]
+        """
+        Aggregate in a single pass, keeping running totals for each key.
+        The aggregates come out sorted by their key, as they always have,
+        since later plugins such as ComputeRank depend on the order.
+        """
+        documents = iter(documents)
+        first = next(documents, None)
+        if first is None:
+            return []
 
         aggregate_keys = [k for k, _ in self.aggregations]
-        groupkeys = set(first) - set(aggregate_keys)
-
+        groupkeys = tuple(set(first) - set(aggregate_keys))
+
+        functions = [function for _, function in self.aggregations]
+        if not all(hasattr(function, 'add') for function in functions):
+            return self._sort_and_group(chain([first], documents), groupkeys)
+
+        if groupkeys:
+            key_of = itemgetter(*groupkeys)
+        else:
+            def key_of(doc):
+                return ()
+
+        groups = {}
+        for doc in chain([first], documents):
+            key = key_of(doc)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = (
+                    doc, [function.start() for function in functions])
+            totals = group[1]
+            for i, function in enumerate(functions):
+                totals[i] = function.add(totals[i], doc)
+
+        aggregates = []
+        for _, (doc, totals) in sorted(groups.items(), key=itemgetter(0)):
+            new_doc = dict(doc)
+            for (keyname, function), total in zip(self.aggregations, totals):
+                new_doc[keyname] = function.result(total)
+            aggregates.append(new_doc)
+        return aggregates
+
+    def _sort_and_group(self, documents, groupkeys):
+        """
+        Aggregate by sorting the documents, for aggregations which can only
+        be given a whole group at a time.
+        """
         def key(doc):
             return tuple(doc[key] for key in groupkeys)
 
@@ -47,14 +90,65 @@ def group(iterable, key):
         yield list(grouped)
 
 
+class Sum(object):
+
+    """
+    An aggregation summing `keyname`. It can be called with a whole group of
+    documents, or keep a running total with start, add and result.
+    """
+
+    def __init__(self, keyname):
+        self.keyname = keyname
+
+    def __call__(self, docs):
+        return sum(doc[self.keyname] for doc in docs)
+
+    def start(self):
+        return 0
+
+    def add(self, total, doc):
+        return total + doc[self.keyname]
+
+    def result(self, total):
+        return total
+
+
+class WeightedRate(object):
+
+    """
+    An aggregation averaging `rate_key` weighted by `count_key`, used in the
+    same ways as Sum.
+    """
+
+    def __init__(self, rate_key, count_key):
+        self.rate_key = rate_key
+        self.count_key = count_key
+
+    def __call__(self, docs):
+        total = sum(doc[self.count_key] for doc in docs)
+        weighted_total = sum(doc[self.rate_key] * doc[self.count_key]
+                             for doc in docs)
+        return self.result((total, weighted_total))
+
+    def start(self):
+        return 0, 0
+
+    def add(self, totals, doc):
+        total, weighted_total = totals
+        count = doc[self.count_key]
+        return total + count, weighted_total + doc[self.rate_key] * count
+
+    def result(self, totals):
+        total, weighted_total = totals
+        total_rate = weighted_total / total
+        return total_rate
+
+
 def aggregate_count(keyname):
     """
     Straightforward sum of the given keyname.
     """
-    def inner(docs):
-        return sum(doc[keyname] for doc in docs)
-
-    return keyname, inner
+    return keyname, Sum(keyname)
 
 
 def aggregate_rate(rate_key, count_key):
@@ -62,13 +156,7 @@ def aggregate_rate(rate_key, count_key):
     Compute an aggregate rate for `rate_key` weighted according to
     `count_rate`.
     """
-    def inner(docs):
-        total = sum(doc[count_key] for doc in docs)
-        weighted_total = sum(doc[rate_key] * doc[count_key] for doc in docs)
-        total_rate = weighted_total / total
-        return total_rate
-
-    return rate_key, inner
+    return rate_key, WeightedRate(rate_key, count_key)
 
 
 def make_aggregate(docs, aggregations):
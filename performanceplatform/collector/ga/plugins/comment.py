@@ -10,3 +10,6 @@ class Comment(object):
 
     def __call__(self, documents):
         return documents
+
+    def stream(self, documents):
+        return documents
@@ -1,42 +1,37 @@
-import base64
 import datetime
 
-import pytz
-
-
-def to_utc(a_datetime):
-    return a_datetime.astimezone(pytz.UTC)
-
-
-def value_id(value):
-    value_bytes = value.encode('utf-8')
-    return base64.urlsafe_b64encode(value_bytes), value_bytes
+from performanceplatform.utils.document_id import (
+    TimestampFormatter, format_timestamp, value_id, value_ids)
 
 
 class ComputeIdFrom(object):
 
     def __init__(self, *fields):
         self.fields = fields
+        self._format_timestamp = TimestampFormatter()
 
     def __call__(self, documents):
-        for document in documents:
-
-            id_parts = (stringify(document[field]) for field in self.fields)
-            id_string = "_".join(id_parts)
-
-            _id, humanId = value_id(id_string)
+        documents = list(documents)
+        id_strings = [self._id_string(document) for document in documents]
 
+        for document, (_id, humanId) in zip(documents, value_ids(id_strings)):
             document['_id'] = _id
             document['humanId'] = humanId
 
         return documents
 
+    def stream(self, documents):
+        for document in documents:
+            document['_id'], document['humanId'] = value_id(
+                self._id_string(document))
+            yield document
 
-def stringify(item):
-    if isinstance(item, datetime.datetime):
-        return _format(item)
-    return u"{0!s}".format(item)
+    def _id_string(self, document):
+        return "_".join(stringify(document[field], self._format_timestamp)
+                        for field in self.fields)
 
 
-def _format(timestamp):
-    return to_utc(timestamp).strftime("%Y%m%d%H%M%S")
+def stringify(item, format_timestamp=format_timestamp):
+    if isinstance(item, datetime.datetime):
+        return format_timestamp(item)
+    return u"{0!s}".format(item)
@@ -11,18 +11,29 @@ class ComputeDepartmentKey(object):
 
     def __init__(self, key_name):
         self.key_name = key_name
+        self.resolver = DepartmentResolver()
 
     def __call__(self, documents):
-        def compute_department(department):
-            assert self.key_name in document, (
-                'key "{}" not found "{}"'.format(self.key_name, document))
-            department_codes = document[self.key_name]
-            department_code = take_first_department_code(department_codes)
-            document["department"] = DEPARTMENT_MAPPING.get(
-                department_code, department_code)
-            return document
+        documents = list(documents)
+        for document in documents:
+            self._check_has_key(document)
+
+        departments = self.resolver.resolve_all(
+            document[self.key_name] for document in documents)
+        for document, department in zip(documents, departments):
+            document["department"] = department
+        return documents
 
-        return [compute_department(document) for document in documents]
+    def stream(self, documents):
+        for document in documents:
+            self._check_has_key(document)
+            document["department"] = self.resolver.resolve(
+                document[self.key_name])
+            yield document
+
+    def _check_has_key(self, document):
+        assert self.key_name in document, (
+            'key "{}" not found "{}"'.format(self.key_name, document))
 
 
 class SetDepartment(object):
@@ -50,10 +61,63 @@ class SetDepartment(object):
             document["department"] = self.value
         return documents
 
+    def stream(self, documents):
+        for document in documents:
+            document["department"] = self.value
+            yield document
+
+
+class DepartmentResolver(object):
+
+    """
+    Looks up the departments for strings of department codes, such as the
+    values of a custom variable, remembering the department for each string
+    since the same few strings come up again and again in GA results.
+
+    By default a string must start with a department code, and the first
+    code is looked up. With `verbatim_fallback` a string which does not
+    start with one is looked up, or used, as it is.
+    """
+
+    def __init__(self, verbatim_fallback=False):
+        self.verbatim_fallback = verbatim_fallback
+        self._departments = {}
+
+    def resolve(self, department_codes):
+        try:
+            return self._departments[department_codes]
+        except KeyError:
+            department = self._resolve(department_codes)
+            self._departments[department_codes] = department
+            return department
+
+    def resolve_all(self, department_codes):
+        """
+        Return the departments for an iterable of strings of department
+        codes, in the same order.
+        """
+        departments = self._departments
+        resolve = self.resolve
+        return [departments[codes] if codes in departments else resolve(codes)
+                for codes in department_codes]
+
+    def _resolve(self, department_codes):
+        match = FIRST_DEPARTMENT_CODE.match(department_codes)
+        if match is None:
+            assert self.verbatim_fallback
+            code = department_codes
+        else:
+            (code, ) = match.groups()
+        return DEPARTMENT_MAPPING.get(code, code)
+
+
+FIRST_DEPARTMENT_CODE = re.compile("^(<[^>]+>).*$")
+
+_verbatim_resolver = DepartmentResolver(verbatim_fallback=True)
+
 
 def take_first_department_code(department_codes):
-    get_first_re = re.compile("^(<[^>]+>).*$")
-    match = get_first_re.match(department_codes)
+    match = FIRST_DEPARTMENT_CODE.match(department_codes)
     assert match is not None
     (department_code, ) = match.groups()
     return department_code
@@ -63,15 +127,14 @@ def try_get_department(department_or_code):
     """
     Try to take the first department code, or fall back to string as passed
     """
-    try:
-        value = take_first_department_code(department_or_code)
-    except AssertionError:
-        value = department_or_code
+    return _verbatim_resolver.resolve(department_or_code)
 
-    if value in DEPARTMENT_MAPPING:
-        value = DEPARTMENT_MAPPING[value]
 
-    return value
+def try_get_departments(departments_or_codes):
+    """
+    try_get_department for each of an iterable of strings
+    """
+    return _verbatim_resolver.resolve_all(departments_or_codes)
 
 
 DEPARTMENT_MAPPING = {
@@ -4,6 +4,14 @@ load_plugin.py
 
 Responsible for taking plugin strings and returning plugin callables.
 
+Each plugin string is parsed once, however many times it is loaded.
+
+Plugins which can work through documents as they arrive, rather than
+needing the whole list at once like AggregateKey or ComputeRank, also have a
+`stream` method taking an iterable of documents and returning an iterable.
+When every plugin does, the compiled plugins can stream the documents too,
+so they are never all in memory.
+
 """
 
 # For the linter
@@ -16,9 +24,47 @@ def load_plugins(plugin_names):
     return [load_plugin(plugin_name) for plugin_name in plugin_names]
 
 
+_compiled_plugins = {}
+
+
 def load_plugin(plugin_name):
 
-    expr = compile(plugin_name, "performanceplatform.collector plugin", "eval")
+    # Each call still creates a new plugin, only the parsing is cached
+    expr = _compiled_plugins.get(plugin_name)
+    if expr is None:
+        expr = compile(plugin_name, "performanceplatform.collector plugin",
+                       "eval")
+        _compiled_plugins[plugin_name] = expr
 
     return eval(expr, __builtin__.__dict__,
                 performanceplatform.collector.ga.plugins.__dict__)
+
+
+def compile_plugins(plugin_names):
+    """
+    Return a Pipeline which runs the plugins over the documents in order
+    """
+    return Pipeline(load_plugins(plugin_names))
+
+
+class Pipeline(object):
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    @property
+    def lazy(self):
+        """
+        Whether every stage can stream documents
+        """
+        return all(hasattr(stage, 'stream') for stage in self.stages)
+
+    def __call__(self, documents):
+        for stage in self.stages:
+            documents = stage(documents)
+        return documents
+
+    def stream(self, documents):
+        for stage in self.stages:
+            documents = stage.stream(documents)
+        return documents
@@ -1,6 +1,14 @@
 
 class ComputeRank(object):
 
+    """
+    Number the documents from 1 in the order they are given. This needs
+    every document at once (so it has no `stream` method), as the ranks are
+    only right if the documents are in their final order, which plugins
+    such as AggregateKey before it may only know once they have seen them
+    all.
+    """
+
     def __init__(self, var_name):
         self.var_name = var_name
 
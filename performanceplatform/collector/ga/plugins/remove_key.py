@@ -13,3 +13,9 @@ class RemoveKey(object):
             for key in self.remove_keys:
                 del document[key]
         return documents
+
+    def stream(self, documents):
+        for document in documents:
+            for key in self.remove_keys:
+                del document[key]
+            yield document
@@ -3,7 +3,11 @@ import logging
 from cloghandler import ConcurrentRotatingFileHandler
 import os
 import sys
+import threading
 import traceback
+from contextlib import contextmanager
+
+_job_fields = threading.local()
 
 
 def get_log_file_handler(path):
@@ -24,6 +28,32 @@ def get_json_log_handler(path, app_name, json_fields):
     return handler
 
 
+class JobFieldsFilter(logging.Filter):
+
+    """
+    Add the fields given to job_logging_fields by the thread logging a
+    record to it, so that the JSON log of a process running many collectors
+    says which one each record is about.
+    """
+
+    def filter(self, record):
+        for name, value in getattr(_job_fields, 'fields', {}).items():
+            setattr(record, name, value)
+        return True
+
+
+@contextmanager
+def job_logging_fields(json_fields):
+    """
+    Add `json_fields` to everything logged by this thread until exiting
+    """
+    _job_fields.fields = json_fields
+    try:
+        yield
+    finally:
+        del _job_fields.fields
+
+
 def uncaught_exception_handler(*exc_info):
     text = "".join(traceback.format_exception(*exc_info))
     (exc_class, exc_message, _) = exc_info
@@ -48,10 +78,12 @@ def set_up_logging(
     logger.setLevel(log_level)
     logger.addHandler(get_log_file_handler(
         os.path.join(logfile_path, '{}.log'.format(logfile_name))))
-    logger.addHandler(get_json_log_handler(
+    json_handler = get_json_log_handler(
         os.path.join(logfile_path, '{}.json.log'.format(logfile_name)),
         app_name,
-        json_fields=json_fields if json_fields else {}))
+        json_fields=json_fields if json_fields else {})
+    json_handler.addFilter(JobFieldsFilter())
+    logger.addHandler(json_handler)
     logger.info("{0} logging started".format(app_name))
 
 
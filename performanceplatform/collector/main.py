@@ -1,13 +1,21 @@
+import copy
 import os
 import logging
 import importlib
+import sys
 
+from argparse import Namespace
 from collections import OrderedDict
+from itertools import izip_longest
+from multiprocessing.pool import ThreadPool
 
 from performanceplatform.collector import arguments
+from performanceplatform.collector.ga.lib.helper import reuse_clients
 from performanceplatform.collector.logging_setup import (
     set_up_logging, close_down_logging)
 from performanceplatform.utils.collector import get_config
+from performanceplatform.utils import requests_with_backoff
+from performanceplatform.utils.data_pusher import Pusher
 
 
 def _get_data_group(query):
@@ -73,7 +81,8 @@ def _log_collector_instead_of_running(entrypoint, args):
 
 
 def merge_performanceplatform_config(
-        performanceplatform, data_set, token, dry_run=False):
+        performanceplatform, data_set, token, dry_run=False,
+        force_push=False):
     return {
         'url': '{0}/{1}/{2}'.format(
             performanceplatform['backdrop_url'],
@@ -83,7 +92,8 @@ def merge_performanceplatform_config(
         'token': token['token'],
         'data-group': data_set['data-group'],
         'data-type': data_set['data-type'],
-        'dry_run': dry_run
+        'dry_run': dry_run,
+        'force_push': force_push
     }
 
 
@@ -100,30 +110,248 @@ def _run_collector(entrypoint, args, logfile_path=None, logfile_name=None):
 
     if os.environ.get('DISABLE_COLLECTORS', 'false') == 'true':
         _log_collector_instead_of_running(entrypoint, args)
+    else:
+        run_collection(entrypoint, args)
+        if not args.console_logging:
+            close_down_logging()
+
+
+def run_collection(entrypoint, args):
+    """
+    Run the collector `entrypoint` (or resume its push) for the parsed
+    command-line `args`, leaving logging as it is.
+    """
+    data_set_config = merge_performanceplatform_config(
+        args.performanceplatform,
+        args.query['data-set'],
+        args.token,
+        args.dry_run,
+        args.force_push
+    )
+    if args.resume:
+        logging.info('Resuming push into {}/{}'.format(
+            data_set_config['data-group'],
+            data_set_config['data-type']))
+        Pusher(data_set_config, args.query['options']).resume()
     else:
         entrypoint_module = importlib.import_module(entrypoint)
         logging.info('Running collection into {}/{}'.format(
-            args.query.get('data-set')['data-group'],
-            args.query.get('data-set')['data-type']))
+            data_set_config['data-group'],
+            data_set_config['data-type']))
         entrypoint_module.main(
             args.credentials,
-            merge_performanceplatform_config(
-                args.performanceplatform,
-                args.query['data-set'],
-                args.token,
-                args.dry_run
-            ),
+            data_set_config,
             args.query['query'],
             args.query['options'],
             args.start_at,
             args.end_at
         )
+
+
+def load_batch(path, performanceplatform, concurrency):
+    """
+    Load the collectors named in a batch file, returning (config,
+    credentials, token) for each. Each line is either the path to a query
+    file or a collector slug to look up in Stagecraft, optionally followed
+    by a comma and the path to a credentials file for that collector, and
+    another comma and the path to a token file. The credentials or token
+    are None for collectors which use the batch's.
+    """
+    with open(path) as batch_file:
+        lines = [line.strip() for line in batch_file]
+
+    json_files = {}
+
+    def load_json_file(json_path):
+        if not json_path:
+            return None
+        if json_path not in json_files:
+            json_files[json_path] = arguments._load_json_file(json_path)
+        return json_files[json_path]
+
+    def load(line):
+        parts = [part.strip() for part in line.split(',')]
+        collector, credentials_path, token_path = (parts + [None, None])[:3]
+        if os.path.isfile(collector):
+            config = arguments._load_json_file(collector)
+        else:
+            config = get_config(collector, performanceplatform)
+        return (config,
+                load_json_file(credentials_path),
+                load_json_file(token_path))
+
+    pool = ThreadPool(concurrency)
+    try:
+        return pool.map(load, [line for line in lines
+                               if line and not line.startswith('#')])
+    finally:
+        pool.terminate()
+
+
+def check_batch_credentials(jobs, credentials, token):
+    """
+    Raise ValueError if any collector in a batch needs the batch's
+    `credentials` or `token` (from -c and -t) when it was not given one, or
+    if the collectors which use the batch's credentials are for more than
+    one source API, as one set of credentials can not be right for all of
+    them.
+
+    >>> check_batch_credentials([
+    ...     ({'entrypoint': 'performanceplatform.collector.ga'}, None, None),
+    ...     ({'entrypoint': 'performanceplatform.collector.ga.trending'},
+    ...      None, None),
+    ...     ({'entrypoint': 'performanceplatform.collector.pingdom'},
+    ...      {'user': 'name'}, None)], {'user': 'ga'}, {'token': 'a'})
+    >>> check_batch_credentials([
+    ...     ({'entrypoint': 'performanceplatform.collector.ga'},
+    ...      {'user': 'name'}, {'token': 'a'})], None, None)
+    >>> check_batch_credentials([
+    ...     ({'entrypoint': 'performanceplatform.collector.ga'}, None, None),
+    ...     ({'entrypoint': 'performanceplatform.collector.pingdom'},
+    ...      None, None)], {'user': 'ga'}, {'token': 'a'})
+    Traceback (most recent call last):
+    ...
+    ValueError: Collectors for ga, pingdom all use the batch's credentials, \
+give all but one of them their own credentials file
+    >>> check_batch_credentials([
+    ...     ({'entrypoint': 'performanceplatform.collector.ga'}, None,
+    ...      {'token': 'a'})], None, None)
+    Traceback (most recent call last):
+    ...
+    ValueError: Some collectors have no credentials file of their own, \
+so the batch needs one (-c)
+    """
+    if credentials is None and any(
+            job_credentials is None for _, job_credentials, _ in jobs):
+        raise ValueError('Some collectors have no credentials file of their '
+                         'own, so the batch needs one (-c)')
+    if token is None and any(
+            job_token is None for _, _, job_token in jobs):
+        raise ValueError('Some collectors have no token file of their own, '
+                         'so the batch needs one (-t)')
+
+    sources = sorted(set(
+        _source_api(config['entrypoint'])
+        for config, job_credentials, _ in jobs if job_credentials is None))
+    if len(sources) > 1:
+        raise ValueError(
+            "Collectors for {} all use the batch's credentials, give all but "
+            "one of them their own credentials file".format(
+                ', '.join(sources)))
+
+
+def _source_api(entrypoint):
+    """
+    The source API an entrypoint collects from, which decides what
+    credentials it needs
+
+    >>> _source_api('performanceplatform.collector.ga.contrib.content.table')
+    'ga'
+    """
+    prefix = 'performanceplatform.collector.'
+    if entrypoint.startswith(prefix):
+        return entrypoint[len(prefix):].split('.')[0]
+    return entrypoint
+
+
+def group_batch(jobs):
+    """
+    Group (config, credentials, token) jobs by entrypoint and credentials,
+    and interleave the groups, so that the collectors running at any one
+    time are spread across source APIs and accounts.
+
+    >>> [config['n'] for config, _, _ in group_batch([
+    ...     ({'entrypoint': 'ga', 'n': 1}, None, None),
+    ...     ({'entrypoint': 'ga', 'n': 2}, None, None),
+    ...     ({'entrypoint': 'ga', 'n': 3}, {'path_to_json_file': 'other'},
+    ...      None),
+    ...     ({'entrypoint': 'pingdom', 'n': 4}, None, None)])]
+    [1, 3, 4, 2]
+    """
+    groups = OrderedDict()
+    for job in jobs:
+        config, credentials, _ = job
+        credentials_path = (credentials or {}).get('path_to_json_file')
+        groups.setdefault(
+            (config['entrypoint'], credentials_path), []).append(job)
+
+    return [job
+            for jobs in izip_longest(*groups.values())
+            for job in jobs
+            if job is not None]
+
+
+def run_batch(args):
+    """
+    Run every collector listed in the `args.batch` file in this process,
+    `args.batch_concurrency` at a time. Returns whether they all succeeded.
+    """
+    if args.console_logging:
+        logging.basicConfig(level=logging.INFO)
+    else:
+        logging_for_entrypoint(
+            'performanceplatform.collector.batch',
+            {'batch': args.batch},
+            None,
+            None
+        )
+
+    reuse_clients()
+    # Enough pooled connections for every collector to use the same host
+    requests_with_backoff.configure_session(
+        pool_maxsize=args.batch_concurrency)
+    jobs = load_batch(
+        args.batch, args.performanceplatform, args.batch_concurrency)
+    try:
+        check_batch_credentials(jobs, args.credentials, args.token)
+    except ValueError as e:
+        logging.error('Not running the batch: {}'.format(e))
         if not args.console_logging:
             close_down_logging()
+        return False
+    jobs = group_batch(jobs)
+
+    def run(job):
+        query, credentials, token = job
+        job_args = Namespace(**vars(args))
+        job_args.query = query
+        job_args.credentials = copy.deepcopy(credentials or args.credentials)
+        job_args.token = token or args.token
+
+        name = _get_data_group_data_type(query)
+        logging.info('Pushing into {} with the token from {}'.format(
+            name, job_args.token.get('path_to_json_file', 'the batch')))
+        try:
+            if os.environ.get('DISABLE_COLLECTORS', 'false') == 'true':
+                _log_collector_instead_of_running(
+                    query['entrypoint'], job_args)
+            else:
+                run_collection(query['entrypoint'], job_args)
+        except (Exception, SystemExit):
+            logging.exception('Collection into {} failed'.format(name))
+            return False
+        logging.info('Collection into {} finished'.format(name))
+        return True
+
+    pool = ThreadPool(args.batch_concurrency)
+    try:
+        results = pool.map(run, jobs)
+    finally:
+        pool.terminate()
+
+    logging.info('{} of {} collectors in the batch succeeded'.format(
+        results.count(True), len(results)))
+    if not args.console_logging:
+        close_down_logging()
+
+    return all(results)
 
 
 def main():
     args = arguments.parse_args('Performance Platform Collector')
+    if getattr(args, 'batch', None):
+        sys.exit(0 if run_batch(args) else 1)
+
     if args.collector_slug:
         args.query = get_config(args.collector_slug, args.performanceplatform)
 
@@ -5,6 +5,8 @@ import pytz
 from performanceplatform.collector.piwik.base import BaseFetcher
 from performanceplatform.utils.data_pusher import Pusher
 from performanceplatform.utils.data_parser import DataParser
+from performanceplatform.utils.watermark import (
+    incremental_range, record_collected)
 
 FREQUENCY_TO_PERIOD_MAPPING = {
     'daily': 'day',
@@ -89,9 +91,16 @@ class Parser():
 
 def main(credentials, data_set_config, query, options, start_at, end_at):
     data_type = data_set_config['data-type']
+    frequency = query.get('frequency', 'weekly')
+    date_range = incremental_range(
+        data_set_config, options, frequency, start_at, end_at)
+    if date_range is None:
+        return
+    start_at, end_at = date_range
 
     data = Fetcher(credentials, query, start_at, end_at).fetch()
 
     parsed_data = Parser(query, options, data_type).parse(data)
 
     Pusher(data_set_config, options).push(parsed_data)
+    record_collected(data_set_config, options, frequency, start_at, end_at)
@@ -0,0 +1,29 @@
+"""
+Fetch every collector config from Stagecraft in one request and cache them
+on disk, so that later collector runs can use them without waiting on
+Stagecraft (see config_cache_ttl) or when it is unavailable.
+"""
+import argparse
+import logging
+
+from performanceplatform.collector.arguments import _load_json_file
+from performanceplatform.utils.collector import prefetch_configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-b', '--performanceplatform',
+                        dest='performanceplatform',
+                        type=_load_json_file,
+                        required=True,
+                        help='JSON file containing details '
+                             'about the Performance Platform')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    count = prefetch_configs(args.performanceplatform)
+    logging.info('Cached the configs of {} collectors'.format(count))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@ from datetime import datetime, timedelta
 import pytz
 from performanceplatform.collector.webtrends.base import(
     BaseCollector, BaseParser)
+from performanceplatform.utils.watermark import (
+    incremental_range, record_collected)
 
 
 class Collector(BaseCollector):
@@ -114,5 +116,13 @@ class V3Parser(BaseParser):
 
 
 def main(credentials, data_set_config, query, options, start_at, end_at):
+    # Reports are fetched a day at a time
+    date_range = incremental_range(
+        data_set_config, options, 'daily', start_at, end_at)
+    if date_range is None:
+        return
+    start_at, end_at = date_range
+
     collector = Collector(credentials, query, start_at, end_at)
     collector.collect_parse_and_push(data_set_config, options)
+    record_collected(data_set_config, options, 'daily', start_at, end_at)
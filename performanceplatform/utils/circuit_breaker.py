@@ -0,0 +1,109 @@
+"""
+Fail fast when a source API is down, rather than having every collector
+spend minutes retrying it.
+
+After COLLECTOR_CIRCUIT_BREAKER_THRESHOLD failures in a row for a host, the
+circuit for it opens and requests to it fail straight away. Once it has been
+open for COLLECTOR_CIRCUIT_BREAKER_RESET seconds (default 300), a single
+request is let through as a probe: if it succeeds the circuit closes again,
+otherwise it stays open for another period. The state is kept in a file per
+host, so every collector process on the host shares it.
+"""
+import logging
+import os
+import threading
+import time
+import urlparse
+from contextlib import contextmanager
+
+from performanceplatform.utils.state import locked_json_state, state_path
+
+DEFAULT_RESET_SECONDS = 300
+
+
+class CircuitOpenError(Exception):
+
+    def __init__(self, name, seconds_left):
+        super(CircuitOpenError, self).__init__(
+            'Not calling {} as it has been failing, trying again in '
+            '{:.0f} seconds'.format(name, seconds_left))
+        self.name = name
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, name, failure_threshold,
+                 reset_seconds=DEFAULT_RESET_SECONDS, path=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory_state = {'failures': 0, 'opened_at': None}
+
+    def check(self):
+        """
+        Raise CircuitOpenError unless a request should be made now
+        """
+        with self._state() as state:
+            if state['opened_at'] is None:
+                return
+            seconds_open = time.time() - state['opened_at']
+            if seconds_open < self.reset_seconds:
+                raise CircuitOpenError(
+                    self.name, self.reset_seconds - seconds_open)
+            # Half open: this request is the probe, and everyone else keeps
+            # failing fast until it has finished
+            logging.info('Probing {} to see if it has recovered'.format(
+                self.name))
+            state['opened_at'] = time.time()
+
+    def is_open(self):
+        with self._state() as state:
+            return state['opened_at'] is not None
+
+    def record_success(self):
+        with self._state() as state:
+            if state['opened_at'] is not None:
+                logging.info('{} has recovered'.format(self.name))
+            state.update(failures=0, opened_at=None)
+
+    def record_failure(self):
+        with self._state() as state:
+            state['failures'] += 1
+            if state['failures'] >= self.failure_threshold:
+                if state['opened_at'] is None:
+                    logging.warning(
+                        '{} has failed {} times in a row, not calling it '
+                        'for {} seconds'.format(
+                            self.name, state['failures'],
+                            self.reset_seconds))
+                state['opened_at'] = time.time()
+
+    @contextmanager
+    def _state(self):
+        if self.path is None:
+            with self._lock:
+                yield self._memory_state
+        else:
+            with locked_json_state(self.path, self._memory_state) as state:
+                yield state
+
+
+def circuit_breaker_for(url):
+    """
+    Return the CircuitBreaker for the host of `url`, or None if circuit
+    breaking has not been turned on.
+    """
+    threshold = os.environ.get('COLLECTOR_CIRCUIT_BREAKER_THRESHOLD')
+    if not threshold:
+        return None
+
+    host = urlparse.urlparse(url).netloc
+    return CircuitBreaker(
+        host,
+        int(threshold),
+        float(os.environ.get('COLLECTOR_CIRCUIT_BREAKER_RESET',
+                             DEFAULT_RESET_SECONDS)),
+        state_path('circuit-breaker', '{}.json'.format(
+            host.replace(':', '_'))))
@@ -1,12 +1,25 @@
+import json
+import logging
+import os
+import threading
+import time
+import urlparse
+
+import pkg_resources
+import requests
+
 from performanceplatform.client.collector import CollectorAPI
+from performanceplatform.utils import requests_with_backoff
+from performanceplatform.utils.circuit_breaker import CircuitOpenError
+from performanceplatform.utils.retry_policy import ExponentialBackoff
+from performanceplatform.utils.state import state_path
+
+_STAGECRAFT_TIMEOUT = 10
+_CONFIG_CACHE_TTL = 3600
 
 
 def get_config(collector_slug, performanceplatform):
-    collector_client = CollectorAPI(
-        performanceplatform['stagecraft_url'],
-        performanceplatform['omniscient_api_token']
-    )
-    collector = collector_client.get_collector(collector_slug)
+    collector = get_collector(collector_slug, performanceplatform)
     return {
         'query': collector.get('query'),
         'options': collector.get('options'),
@@ -18,3 +31,156 @@ def get_config(collector_slug, performanceplatform):
         'entrypoint': collector.get('entry_point'),
         'token': collector.get('provider').get('slug')
     }
+
+
+def get_collector(collector_slug, performanceplatform):
+    """
+    Return a collector from Stagecraft, using the copy cached on disk by an
+    earlier run where possible.
+
+    A cached copy is used without asking Stagecraft for `config_cache_ttl`
+    seconds (an hour unless set in the performanceplatform config), after
+    which it is revalidated using its ETag. If Stagecraft is slow, down or
+    failing, the cached copy is used however old it is. With nothing
+    cached, requests which fail with a status that might be temporary are
+    retried.
+
+    The bearer token of the collector's data set is not written to disk, so
+    a collector returned from the cache does not have one.
+    """
+    path = _cache_path(performanceplatform, collector_slug)
+    cached = _read_cache(path)
+    ttl = performanceplatform.get('config_cache_ttl', _CONFIG_CACHE_TTL)
+    if cached and time.time() - cached['fetched_at'] < ttl:
+        return cached['collector']
+
+    # The same headers as the Performance Platform client sends
+    headers = {
+        'Accept': 'application/json',
+        'User-Agent': 'Performance Platform Client {}'.format(
+            pkg_resources.get_distribution(
+                'performanceplatform-client').version),
+        'Govuk-Request-Id': 'Not-Set',
+        'Authorization': 'Bearer {}'.format(
+            performanceplatform['omniscient_api_token']),
+    }
+    if cached and cached['etag']:
+        headers['If-None-Match'] = cached['etag']
+
+    # A cached copy is better than waiting to retry a failing Stagecraft
+    backoff_policy = ExponentialBackoff(deadline=0) if cached else None
+
+    try:
+        response = requests_with_backoff.get(
+            '{}/collector/{}'.format(
+                performanceplatform['stagecraft_url'], collector_slug),
+            headers=headers,
+            timeout=performanceplatform.get(
+                'stagecraft_timeout', _STAGECRAFT_TIMEOUT),
+            backoff_policy=backoff_policy)
+    except (requests.ConnectionError,
+            requests.HTTPError,
+            requests.Timeout,
+            CircuitOpenError) as e:
+        if cached is None or not _is_unavailable(e):
+            raise
+        logging.warning(
+            'Stagecraft failed with {!r}, using the config for {} cached '
+            '{:.0f} seconds ago'.format(
+                e, collector_slug, time.time() - cached['fetched_at']))
+        return cached['collector']
+
+    if response.status_code == 304:
+        collector, etag = cached['collector'], cached['etag']
+    else:
+        collector, etag = response.json(), response.headers.get('ETag')
+    _write_cache(path, collector, etag)
+
+    return collector
+
+
+def prefetch_configs(performanceplatform):
+    """
+    Fetch every collector from Stagecraft in a single request and cache them
+    all on disk, returning how many there were.
+
+    Any collector in the list without everything that get_config needs is
+    fetched (and cached) on its own instead.
+    """
+    collector_client = CollectorAPI(
+        performanceplatform['stagecraft_url'],
+        performanceplatform['omniscient_api_token']
+    )
+    collectors = collector_client.list_collectors()
+    for collector in collectors:
+        if _is_complete(collector):
+            _write_cache(_cache_path(performanceplatform, collector['slug']),
+                         collector, None)
+        else:
+            get_collector(collector['slug'],
+                          dict(performanceplatform, config_cache_ttl=0))
+
+    return len(collectors)
+
+
+def _is_complete(collector):
+    """
+    Whether a collector has every field which get_config reads
+
+    >>> _is_complete({'query': {}, 'options': {}, 'entry_point': 'ga',
+    ...               'data_set': {'data_group': 'g', 'data_type': 't'},
+    ...               'provider': {'slug': 'ga'}})
+    True
+    >>> _is_complete({'slug': 'ga', 'data_set': 'g-t'})
+    False
+    """
+    data_set = collector.get('data_set')
+    provider = collector.get('provider')
+    return (all(key in collector
+                for key in ('query', 'options', 'entry_point')) and
+            isinstance(data_set, dict) and
+            all(key in data_set for key in ('data_group', 'data_type')) and
+            isinstance(provider, dict) and 'slug' in provider)
+
+
+def _cache_path(performanceplatform, collector_slug):
+    # Kept apart for each Stagecraft, which may have collectors with the
+    # same slug, e.g. state/collector-config/stagecraft_8080/my-slug.json
+    host = urlparse.urlparse(performanceplatform['stagecraft_url']).netloc
+    return state_path('collector-config', host.replace(':', '_'),
+                      '{}.json'.format(collector_slug))
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _write_cache(path, collector, etag):
+    data_set = collector.get('data_set')
+    if isinstance(data_set, dict) and 'bearer_token' in data_set:
+        collector = dict(collector, data_set=dict(data_set))
+        del collector['data_set']['bearer_token']
+
+    # Written to one side and renamed so that a reader never sees half of it,
+    # readable only by the collectors' user
+    temporary_path = '{}.{}.{}.tmp'.format(
+        path, os.getpid(), threading.current_thread().ident)
+    fd = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({
+            'fetched_at': time.time(),
+            'etag': etag,
+            'collector': collector,
+        }, f)
+    os.rename(temporary_path, path)
+
+
+def _is_unavailable(exception):
+    if isinstance(exception, requests.HTTPError):
+        response = exception.response
+        return response is not None and response.status_code >= 500
+    return True
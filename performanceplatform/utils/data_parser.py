@@ -1,8 +1,8 @@
-from performanceplatform.utils.datetimeutil \
-    import to_datetime, to_utc
-import logging
-import base64
+from performanceplatform.utils.datetimeutil import to_datetime
+from performanceplatform.utils.document_id import (
+    TimestampFormatter, format_timestamp, value_id, value_ids)
 import re
+from collections import OrderedDict
 
 
 class DataParser(object):
@@ -77,7 +77,9 @@ class DataParser(object):
                                   additionalFields=self.additionalFields)
 
         if self.plugins:
-            docs = run_plugins(self.plugins, list(docs))
+            # The documents for the parser's data are all built already, so
+            # nothing is saved by streaming them through the plugins
+            docs = list(run_plugins(self.plugins, docs))
 
         return docs
 
@@ -88,83 +90,120 @@ def build_document_set(results, data_type, mappings, special_fields,
     if special_fields and len(results) != len(special_fields):
         raise ValueError(
             "There must be same number of special fields as results")
-    parsed = []
-    for i, item in enumerate(results):
-        if not special_fields:
-            special = {}
-        else:
-            special = special_fields[i]
-        parsed.append(build_document(item,
-                                     data_type,
-                                     special,
-                                     mappings,
-                                     idMapping,
-                                     additionalFields=additionalFields))
-    return parsed
+    return DocumentBuilder(data_type, mappings, idMapping,
+                           additionalFields).build_all(results,
+                                                       special_fields)
 
 
 def build_document(item, data_type, special_fields={},
                    mappings=None, idMapping=None,
                    additionalFields={}):
-    if data_type is None:
-        raise ValueError("Must provide a data type")
-    if mappings is None:
-        mappings = {}
-
-    base_properties = {
-        "_timestamp": to_datetime(item["start_date"]),
-        "dataType": data_type
-    }
-
-    doc = dict(base_properties.items() +
-               additionalFields.items() +
-               item.get("dimensions", {}).items() +
-               special_fields.items())
-    doc = apply_key_mapping(mappings, doc)
-
-    def get_value_for_key(key):
-        return unicode(doc.get(key, ""))
-
-    if idMapping is not None:
-        if not isinstance(idMapping, list):
+    return DocumentBuilder(data_type, mappings, idMapping,
+                           additionalFields).build(item, special_fields)
+
+
+class DocumentBuilder(object):
+
+    """
+    Builds the documents for a data set. Everything which is the same for
+    each document, such as working out which mappings split multi-value
+    fields, is done once when the builder is created.
+    """
+
+    def __init__(self, data_type, mappings=None, idMapping=None,
+                 additionalFields={}):
+        if data_type is None:
+            raise ValueError("Must provide a data type")
+        if idMapping is not None and not isinstance(idMapping, list):
             idMapping = [idMapping]
 
-        values_for_id = map(get_value_for_key, idMapping)
-        string_for_id = "".join(values_for_id)
-    else:
-        string_for_id = get_string_for_data_id(
-            data_type,
-            to_datetime(item["start_date"]),
-            doc.get('timeSpan', None),
-            item.get('dimensions', {}).values())
-    (_id, human_id) = value_id(string_for_id)
+        self.data_type = data_type
+        self.mappings = mappings or {}
+        self.multi_value_mappings = compile_multi_value_mappings(
+            self.mappings)
+        self.idMapping = idMapping
+        self.additionalFields = additionalFields
+
+        # Formats each timestamp once for all the documents built
+        self._format_timestamp = TimestampFormatter()
+
+    def build_all(self, results, special_fields=None):
+        if not special_fields:
+            built = [self._build(item) for item in results]
+        else:
+            built = [self._build(item, special)
+                     for item, special in zip(results, special_fields)]
+
+        ids = value_ids([string_for_id for _, string_for_id in built])
+        for (doc, _), (_id, human_id) in zip(built, ids):
+            doc['humanId'] = human_id
+            doc['_id'] = _id
+        return [doc for doc, _ in built]
+
+    def build(self, item, special_fields=None):
+        doc, string_for_id = self._build(item, special_fields)
+        (_id, human_id) = value_id(string_for_id)
 
-    doc['humanId'] = human_id
-    doc['_id'] = _id
+        doc['humanId'] = human_id
+        doc['_id'] = _id
 
-    return doc
+        return doc
+
+    def _build(self, item, special_fields=None):
+        """
+        Return a document without its ids, and the string to make them from
+        """
+        timestamp = to_datetime(item["start_date"])
+        dimensions = item.get("dimensions", {})
+
+        doc = {
+            "_timestamp": timestamp,
+            "dataType": self.data_type
+        }
+        doc.update(self.additionalFields)
+        doc.update(dimensions)
+        if special_fields:
+            doc.update(special_fields)
+        if self.mappings:
+            doc = self.map_keys(doc)
+
+        if self.idMapping is not None:
+            string_for_id = u"".join(
+                unicode(doc.get(key, "")) for key in self.idMapping)
+        else:
+            string_for_id = get_string_for_data_id(
+                self.data_type,
+                timestamp,
+                doc.get('timeSpan', None),
+                dimensions.values(),
+                self._format_timestamp)
 
+        return doc, string_for_id
 
-def get_string_for_data_id(data_type, timestamp, period, dimension_values):
+    def map_keys(self, doc):
+        mapping = self.mappings
+        mapped = dict((mapping.get(key, key), value)
+                      for key, value in doc.iteritems())
+        _map_multi_value_fields(self.multi_value_mappings, doc, mapped)
+        return mapped
+
+
+def get_string_for_data_id(data_type, timestamp, period, dimension_values,
+                           format_timestamp=format_timestamp):
     # `dimension_values` may be non-string python types and need to be coerced.
     values = map(unicode, dimension_values)
-    slugs = [data_type, _format(timestamp), period] + values
+    slugs = [data_type, format_timestamp(timestamp), period] + values
     slugs = [value for value in slugs
              if value is not None]
     return "_".join(slugs)
 
 
-def _format(timestamp):
-    return to_utc(timestamp).strftime("%Y%m%d%H%M%S")
-
-
-def value_id(value):
-    value_bytes = value.encode('utf-8')
-    logging.debug(u"'{0}' ({1})".format(value, type(value)))
-    return base64.urlsafe_b64encode(value_bytes), value_bytes
-
-
 def run_plugins(plugins_strings, results):
+    """
+    Run the plugins over an iterable of documents. If every plugin can
+    stream, the documents are returned as a generator without ever being
+    collected into a list; otherwise they are all run through as a list.
+    """
 
     last_plugin = plugins_strings[-1]
     if not last_plugin.startswith("ComputeIdFrom"):
@@ -173,16 +212,15 @@ def run_plugins(plugins_strings, results):
                            "necessary")
 
     # Import is here so that it is only required when "plugins" is specified
-    from performanceplatform.collector.ga.plugins import load_plugins
-    plugins = load_plugins(plugins_strings)
+    from performanceplatform.collector.ga.plugins import compile_plugins
 
     # Plugins are designed so that their configuration is described in the
-    # plugin string. At this point, `plugin` should be a closure which only
-    # requires the documents to process.
-    for plugin in plugins:
-        results = plugin(results)
-
-    return results
+    # plugin string. The compiled plugins are a closure which only requires
+    # the documents to process.
+    plugins = compile_plugins(plugins_strings)
+    if plugins.lazy:
+        return plugins.stream(results)
+    return plugins(list(results))
 
 
 def apply_key_mapping(mapping, pairs):
@@ -194,22 +232,46 @@ def map_one_to_one_fields(mapping, pairs):
     return dict((mapping.get(key, key), value) for key, value in pairs.items())
 
 
-def map_multi_value_fields(mapping, pairs):
-    multi_value_regexp = '^(.*)_(\d*)$'
-    multi_value_delimiter = ':'
-    mapped_pairs = {}
+MULTI_VALUE_DELIMITER = ':'
+
+
+def compile_multi_value_mappings(mapping):
+    """
+    Return (source key, [(index, target key), ...]) for each field which
+    mappings such as 'customVarValue1_0' take one of the values of, so that
+    each field only needs to be split once.
+
+    >>> compile_multi_value_mappings({'field_1': 'second', 'other': 'new'})
+    [('field', [(1, 'second')])]
+    """
+    multi_value_regexp = re.compile('^(.*)_(\d*)$')
+    targets_by_key = OrderedDict()
 
     for from_key, to_key in mapping.items():
-        multi_value_matches = re.search(multi_value_regexp, from_key)
+        multi_value_matches = multi_value_regexp.search(from_key)
         if multi_value_matches:
             key = multi_value_matches.group(1)
             index = int(multi_value_matches.group(2))
-            multi_value = pairs.get(key)
-            if multi_value is None:
-                continue
+            targets_by_key.setdefault(key, []).append((index, to_key))
+
+    return targets_by_key.items()
+
+
+def map_multi_value_fields(mapping, pairs):
+    return _map_multi_value_fields(
+        compile_multi_value_mappings(mapping), pairs, {})
+
+
+def _map_multi_value_fields(multi_value_mappings, pairs, mapped_pairs):
+    for key, targets in multi_value_mappings:
+        multi_value = pairs.get(key)
+        if multi_value is None:
+            continue
 
-            values = multi_value.split(multi_value_delimiter)
-            if index < len(values):
+        values = multi_value.split(MULTI_VALUE_DELIMITER)
+        number_of_values = len(values)
+        for index, to_key in targets:
+            if index < number_of_values:
                 mapped_pairs[to_key] = values[index]
 
     return mapped_pairs
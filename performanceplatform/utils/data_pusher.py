@@ -1,18 +1,255 @@
-from performanceplatform.client import DataSet
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+import json
 import logging
+import threading
+import time
+
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+from performanceplatform.client import DataSet
+from performanceplatform.client.base import JsonEncoder
+from performanceplatform.utils.iterutil import chunks, peek
+from performanceplatform.utils.push_index import PushIndex
+from performanceplatform.utils.spool import Spool
+from performanceplatform.utils.state import data_set_state_path
+
+_MAX_CHUNK_ATTEMPTS = 3
 
 
 class Pusher(object):
     def __init__(self, target_data_set_config, options):
         self.data_set_client = DataSet.from_config(target_data_set_config)
+        # The client compresses any request body over 2KB unless told not to
+        self.data_set_client.should_gzip = options.get('gzip', True)
         self.chunk_size = options.get('chunk-size', 100)
         self.empty_data_set = options.get('empty-data-set', False)
+        self.push_concurrency = options.get('push-concurrency', 1)
+        if 'chunk-bytes' in options:
+            self.chunker = AdaptiveChunker(options['chunk-bytes'])
+        else:
+            self.chunker = None
+        # A dry run sends nothing, so it must not record anything as sent
+        if options.get('skip-unchanged') and \
+                not target_data_set_config.get('dry_run'):
+            self.push_index_path = data_set_state_path(
+                target_data_set_config, 'push-index', 'sqlite')
+        else:
+            self.push_index_path = None
+        # Only open while a push is under way
+        self.push_index = None
+        self.force_push = target_data_set_config.get('force_push', False)
+        self.target_data_set_config = target_data_set_config
+        if options.get('spool'):
+            self.spool = self._open_spool()
+        else:
+            self.spool = None
 
     def push(self, data):
-        if data:
+        with self._open_push_index():
+            self._push(data)
+
+    def _push(self, data):
+        if self.push_index:
+            if self.empty_data_set:
+                # Everything is about to be deleted, so all of it is new
+                self.push_index.clear()
+            elif not self.force_push:
+                data = self.push_index.changed(data)
+
+        if not hasattr(data, '__len__'):
+            # A stream of documents, which is only read as it is posted
+            has_data, data = peek(data)
+        else:
+            has_data = bool(data)
+
+        if has_data:
+            if self.spool:
+                self._push_spooled(data)
+                return
+
+            # The data set is always emptied before any chunk is sent, so
+            # none of the new documents can be removed by it
             if self.empty_data_set:
                 self.data_set_client.empty_data_set()
-            self.data_set_client.post(
-                data, chunk_size=self.chunk_size)
+            if self.push_concurrency > 1 or self.chunker or self.push_index:
+                self._post_chunks(enumerate(self._chunks(data), 1))
+            else:
+                self.data_set_client.post(
+                    data, chunk_size=self.chunk_size)
         else:
             logging.info("Doing nothing - no data to push")
+
+    def resume(self):
+        """
+        Send the chunks left in the spool by an earlier push which failed.
+        """
+        if self.spool is None:
+            self.spool = self._open_spool()
+
+        if self.spool.exists():
+            with self._open_push_index():
+                self._flush_spool()
+        else:
+            logging.info("Doing nothing - no spooled data to resume")
+
+    @contextmanager
+    def _open_push_index(self):
+        if self.push_index_path is None:
+            yield
+            return
+
+        with PushIndex(self.push_index_path) as self.push_index:
+            try:
+                yield
+            finally:
+                self.push_index = None
+
+    def _open_spool(self):
+        return Spool(data_set_state_path(
+            self.target_data_set_config, 'spool', 'jsonl'))
+
+    def _push_spooled(self, data):
+        if self.empty_data_set:
+            # Anything left over would be deleted by emptying anyway
+            self.spool.remove()
+        elif self.spool.exists():
+            logging.warning("Adding to spooled data from an earlier push "
+                            "which has not been resumed")
+        self.spool.append(self._chunks(data))
+        self._flush_spool()
+
+    def _flush_spool(self):
+        if self.empty_data_set and not self.spool.emptied:
+            self.data_set_client.empty_data_set()
+            self.spool.mark_emptied()
+        self._post_chunks(self.spool.outstanding(),
+                          on_success=self.spool.acknowledge)
+        self.spool.remove()
+
+    def _chunks(self, data):
+        if self.chunker:
+            return self.chunker.chunks(data)
+        return chunks(data, self.chunk_size)
+
+    def _post_chunks(self, numbered_chunks, on_success=None):
+        """
+        Post (chunk number, chunk) pairs from a pool of threads, with at
+        most `push_concurrency` chunks read but not yet sent.
+
+        Chunks are handed to the pool from this thread, which waits for the
+        oldest one to be sent before reading another once there are enough
+        outstanding, so a chunk which fails is raised from here.
+        """
+        def post_chunk(numbered_chunk):
+            self._post_chunk(*numbered_chunk)
+            if on_success:
+                on_success(numbered_chunk[0])
+
+        pool = ThreadPool(self.push_concurrency)
+        pending = deque()
+        try:
+            for numbered_chunk in numbered_chunks:
+                if len(pending) >= self.push_concurrency:
+                    pending.popleft().get()
+                pending.append(pool.apply_async(post_chunk, (numbered_chunk,)))
+            while pending:
+                pending.popleft().get()
+        finally:
+            pool.terminate()
+
+    def _post_chunk(self, chunk_number, chunk):
+        """
+        Post a single chunk, retrying it on its own if it fails for a
+        reason which might be temporary.
+        """
+        delay = 10
+
+        for attempt in range(1, _MAX_CHUNK_ATTEMPTS + 1):
+            try:
+                logging.info('Sending chunk {}'.format(chunk_number))
+                started = time.time()
+                response = self.data_set_client.post(chunk)
+                if self.chunker:
+                    self.chunker.record_success(time.time() - started)
+                if self.push_index:
+                    self.push_index.record(chunk)
+                return response
+            except (ConnectionError, HTTPError, Timeout) as e:
+                if self.chunker and (_is_too_large(e) or _is_retryable(e)):
+                    self.chunker.record_failure()
+                if _is_too_large(e) and len(chunk) > 1:
+                    middle = len(chunk) // 2
+                    logging.info('Chunk {} was too large, splitting it in '
+                                 'two'.format(chunk_number))
+                    self._post_chunk(chunk_number, chunk[:middle])
+                    return self._post_chunk(chunk_number, chunk[middle:])
+                if not _is_retryable(e) or attempt == _MAX_CHUNK_ATTEMPTS:
+                    raise
+                logging.info(
+                    'Chunk {} failed with {!r} (Attempt {} of {}). '
+                    'Retrying in {} seconds...'.format(
+                        chunk_number, e, attempt, _MAX_CHUNK_ATTEMPTS, delay))
+                time.sleep(delay)
+                delay *= 2
+
+
+class AdaptiveChunker(object):
+
+    """
+    Split documents into chunks of about `target_bytes` of JSON each. The
+    target grows while requests complete quickly, and shrinks when they are
+    slow or fail, so that both small and large documents end up in
+    reasonably sized requests.
+    """
+
+    FAST_SECONDS = 2
+    SLOW_SECONDS = 10
+    MIN_BYTES = 16 * 1024
+    MAX_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, target_bytes):
+        self.target_bytes = target_bytes
+        self.min_bytes = min(target_bytes, self.MIN_BYTES)
+        self.max_bytes = max(target_bytes, self.MAX_BYTES)
+        self._lock = threading.Lock()
+
+    def chunks(self, documents):
+        chunk, chunk_bytes = [], 0
+        for document in documents:
+            document_bytes = len(json.dumps(document, cls=JsonEncoder))
+            if chunk and chunk_bytes + document_bytes > self.target_bytes:
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(document)
+            chunk_bytes += document_bytes
+        if chunk:
+            yield chunk
+
+    def record_success(self, seconds):
+        with self._lock:
+            if seconds < self.FAST_SECONDS:
+                self.target_bytes = min(
+                    self.target_bytes * 3 // 2, self.max_bytes)
+            elif seconds > self.SLOW_SECONDS:
+                self._shrink()
+
+    def record_failure(self):
+        with self._lock:
+            self._shrink()
+
+    def _shrink(self):
+        self.target_bytes = max(self.target_bytes // 2, self.min_bytes)
+
+
+def _is_too_large(exception):
+    response = getattr(exception, 'response', None)
+    return response is not None and response.status_code == 413
+
+
+def _is_retryable(exception):
+    if isinstance(exception, HTTPError):
+        response = exception.response
+        return response is not None and response.status_code >= 500
+    return True
@@ -0,0 +1,70 @@
+"""
+The _id and humanId of a document are made from a string identifying it,
+usually built from its timestamp and dimensions: humanId is the string
+itself and _id the string base64 encoded so that it can go in a URL.
+
+The rows in a batch usually share a handful of timestamps, so each batch
+formats each timestamp once with a TimestampFormatter, and works out the
+ids of all its documents together with value_ids.
+"""
+import base64
+import logging
+
+from performanceplatform.utils.datetimeutil import to_utc
+
+TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
+
+
+def format_timestamp(timestamp):
+    return to_utc(timestamp).strftime(TIMESTAMP_FORMAT)
+
+
+class TimestampFormatter(object):
+
+    """
+    format_timestamp, remembering what each timestamp formatted as. Meant
+    to last for one batch of documents, so nothing is ever forgotten.
+    """
+
+    def __init__(self):
+        self._formatted = {}
+
+    def __call__(self, timestamp):
+        # Python 2 will not compare naive and timezone aware datetimes, so
+        # keep them apart by their offset. The same moment given in two
+        # timezones is formatted once for each.
+        key = (timestamp.utcoffset(), timestamp.replace(tzinfo=None))
+        try:
+            return self._formatted[key]
+        except KeyError:
+            formatted = self._formatted[key] = format_timestamp(timestamp)
+            return formatted
+
+
+def value_id(value):
+    """
+    Return the (_id, humanId) for the string identifying a document
+
+    >>> value_id(u'visits_20140101000000')
+    ('dmlzaXRzXzIwMTQwMTAxMDAwMDAw', 'visits_20140101000000')
+    """
+    value_bytes = value.encode('utf-8')
+    logging.debug(u"'%s' (%s)", value, type(value))
+    return base64.urlsafe_b64encode(value_bytes), value_bytes
+
+
+def value_ids(values):
+    """
+    Return the (_id, humanId) for each of the strings identifying a batch
+    of documents, in the same order.
+    """
+    encode = base64.urlsafe_b64encode
+    log = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    ids = []
+    for value in values:
+        value_bytes = value.encode('utf-8')
+        if log:
+            logging.debug(u"'%s' (%s)", value, type(value))
+        ids.append((encode(value_bytes), value_bytes))
+    return ids
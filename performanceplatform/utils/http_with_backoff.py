@@ -1,10 +1,15 @@
 from httplib2 import *
-from httplib2 import DEFAULT_MAX_REDIRECTS
+from httplib2 import DEFAULT_MAX_REDIRECTS, HttpLib2Error
 import json
 import logging
+import socket
+import threading
 import time
 from performanceplatform.collector.logging_setup import (
     extra_fields_from_exception)
+from performanceplatform.utils.circuit_breaker import circuit_breaker_for
+from performanceplatform.utils.retry_policy import (
+    default_policy, parse_retry_after)
 
 _MAX_RETRIES = 5
 
@@ -150,8 +155,11 @@ class HttpWithBackoff(Http):
     def __init__(self, cache=None, timeout=None,
                  proxy_info=None,
                  ca_certs=None, disable_ssl_certificate_validation=False,
-                 backoff_strategy_predicate=GABackoff):
+                 backoff_strategy_predicate=GABackoff,
+                 rate_limiter=None,
+                 backoff_policy=None):
         dscv = disable_ssl_certificate_validation
+        self._thread_local = threading.local()
         super(HttpWithBackoff, self).__init__(
             cache=cache, timeout=timeout,
             proxy_info=proxy_info,
@@ -161,6 +169,23 @@ class HttpWithBackoff(Http):
             self._backoff_strategy_predicate = backoff_strategy_predicate
         else:
             self._backoff_strategy_predicate = GABackoff
+        # Called with the uri before every request, including retries
+        self._rate_limiter = rate_limiter
+        self._backoff_policy = backoff_policy or default_policy()
+
+    @property
+    def connections(self):
+        """
+        httplib2 keeps a persistent connection per host which must not be
+        used by two threads at once, so each thread gets its own set.
+        """
+        if not hasattr(self._thread_local, 'connections'):
+            self._thread_local.connections = {}
+        return self._thread_local.connections
+
+    @connections.setter
+    def connections(self, value):
+        self._thread_local.connections = value
 
     def request(self,
                 uri,
@@ -170,28 +195,53 @@ class HttpWithBackoff(Http):
                 redirections=DEFAULT_MAX_REDIRECTS,
                 connection_type=None):
 
-        delay = 10
+        delays = self._backoff_policy.delays()
+        breaker = circuit_breaker_for(uri)
 
         for n in range(_MAX_RETRIES):
-            response, content = super(HttpWithBackoff, self).request(
-                uri,
-                method,
-                body,
-                headers,
-                redirections,
-                connection_type)
+            if breaker:
+                breaker.check()
+            if self._rate_limiter:
+                self._rate_limiter(uri)
+
+            try:
+                response, content = super(HttpWithBackoff, self).request(
+                    uri,
+                    method,
+                    body,
+                    headers,
+                    redirections,
+                    connection_type)
+            except (HttpLib2Error, socket.error):
+                if breaker:
+                    breaker.record_failure()
+                raise
+
+            if breaker:
+                if response.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
 
             response_action = self._backoff_strategy_predicate(
                 response, content, method, uri)
 
             if response_action.should_retry:
+                delay = delays.next(
+                    parse_retry_after(response.get('retry-after')))
                 retry_info = response_action.retry_info
                 retry_info += '(Attempt {} of {})'.format(n + 1, _MAX_RETRIES)
+                if delay is None:
+                    logging.info(retry_info + ' Out of time to retry.')
+                    break
+                if breaker and breaker.is_open():
+                    logging.info(retry_info + ' Circuit is open, not '
+                                 'retrying.')
+                    break
                 if n + 1 < _MAX_RETRIES:
-                    retry_info += ' Retrying in {} seconds...'.format(delay)
+                    retry_info += ' Retrying in {:g} seconds...'.format(delay)
                 logging.info(retry_info)
                 time.sleep(delay)
-                delay *= 2
             else:
                 return response, content
 
@@ -0,0 +1,35 @@
+from itertools import chain, islice
+
+
+def chunks(iterable, size):
+    """
+    Split `iterable` into lists of at most `size` items, without reading
+    further ahead than the chunk being built
+
+    >>> list(chunks(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def peek(iterable):
+    """
+    Return whether `iterable` has any items, along with an iterable that
+    still yields all of them
+
+    >>> has_items, items = peek(iter([1, 2]))
+    >>> has_items, list(items)
+    (True, [1, 2])
+    >>> has_items, items = peek(iter([]))
+    >>> has_items, list(items)
+    (False, [])
+    """
+    iterator = iter(iterable)
+    for first in iterator:
+        return True, chain([first], iterator)
+    return False, iterator
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+from performanceplatform.client.base import JsonEncoder
+
+
+class PushIndex(object):
+
+    """
+    Remembers a hash of the content of every document successfully pushed
+    to a data set, keyed by `_id`, so that unchanged documents need not be
+    sent again. Holds a database connection until closed, which it is when
+    used as a context manager.
+    """
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS pushed '
+                '(id TEXT PRIMARY KEY, hash TEXT NOT NULL)')
+
+    def changed(self, documents):
+        """
+        Yield only the documents which differ from when they were last
+        pushed. Documents without an `_id` are always yielded.
+        """
+        for document in documents:
+            if '_id' not in document:
+                yield document
+            elif self._stored_hash(document['_id']) != content_hash(document):
+                yield document
+
+    def record(self, documents):
+        """
+        Record that `documents` have been pushed successfully.
+        """
+        rows = [(unicode(document['_id']), content_hash(document))
+                for document in documents if '_id' in document]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO pushed (id, hash) VALUES (?, ?)',
+                rows)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM pushed')
+
+    def _stored_hash(self, _id):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT hash FROM pushed WHERE id = ?',
+                (unicode(_id),)).fetchone()
+        return row[0] if row else None
+
+
+def content_hash(document):
+    return hashlib.sha1(
+        json.dumps(document, sort_keys=True, cls=JsonEncoder)).hexdigest()
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from performanceplatform.utils.state import locked_json_state
+
+
+class TokenBucket(object):
+
+    """
+    Let through up to `rate` calls to `acquire` a second on average, with
+    bursts of up to `capacity`, by making callers wait for a token.
+
+    With a `path` the bucket is kept in that file, under an exclusive lock,
+    so that every process on the host using the same path shares it.
+    """
+
+    def __init__(self, rate, capacity=None, path=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.time()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                wait = self._take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _take(self):
+        """
+        Take a token if there is one, otherwise return how long to wait
+        before there will be.
+        """
+        if self.path is None:
+            self._tokens, self._updated, wait = self._refill_and_take(
+                self._tokens, self._updated)
+            return wait
+
+        with locked_json_state(self.path, {}) as state:
+            tokens, updated, wait = self._refill_and_take(
+                state.get('tokens', self.capacity),
+                state.get('updated', time.time()))
+            state.update(tokens=tokens, updated=updated)
+        return wait
+
+    def _refill_and_take(self, tokens, updated):
+        now = time.time()
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, now, 0
+        return tokens, now, (1 - tokens) / self.rate
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(name, rate, capacity=None, path=None):
+    """
+    Return the TokenBucket called `name`, creating it the first time, so
+    that every client in the process using that name shares one bucket.
+    """
+    with _buckets_lock:
+        if name not in _buckets:
+            _buckets[name] = TokenBucket(rate, capacity, path)
+        return _buckets[name]
@@ -1,7 +1,16 @@
+import cookielib
 import logging
+import threading
 import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
 from performanceplatform.collector.logging_setup import (
     extra_fields_from_exception)
+from performanceplatform.utils.circuit_breaker import circuit_breaker_for
+from performanceplatform.utils.retry_policy import (
+    default_policy, parse_retry_after)
 
 # import everything from requests so that other code can import this package
 # instead of requests
@@ -9,6 +18,53 @@ from requests import *
 
 _MAX_RETRIES = 5
 
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure_session(pool_connections=10, pool_maxsize=10):
+    """
+    Replace the session shared by every request made through this module,
+    keeping connections open to up to `pool_connections` hosts, with up to
+    `pool_maxsize` connections to each (one for each thread which might
+    use a host at the same time).
+    """
+    global _session
+    session = _new_session(pool_connections, pool_maxsize)
+    with _session_lock:
+        old_session, _session = _session, session
+    if old_session is not None:
+        old_session.close()
+
+
+def session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _new_session(10, 10)
+        return _session
+
+
+def _new_session(pool_connections, pool_maxsize):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # Like requests.request, don't carry cookies from one call to the next,
+    # as different collectors may use the same host with other credentials
+    session.cookies.set_policy(cookielib.DefaultCookiePolicy(
+        allowed_domains=[]))
+    return session
+
+
+def request(method, url, **kwargs):
+    """
+    Make a request like requests.request, but over the shared session so
+    that connections to the same host are kept alive and reused.
+    """
+    return session().request(method, url, **kwargs)
+
 
 def get(url, *args, **kwargs):
     return __request_with_backoff('GET', url, *args, **kwargs)
@@ -19,20 +75,47 @@ def post(url, *args, **kwargs):
 
 
 def __request_with_backoff(method, url, *args, **kwargs):
-    delay = 10
+    """
+    Make a request, retrying it with waits from `backoff_policy` (if passed
+    as a keyword argument, otherwise the default policy) while it fails with
+    a status which might be temporary.
+    """
+    delays = (kwargs.pop('backoff_policy', None) or default_policy()).delays()
+    breaker = circuit_breaker_for(url)
 
     for n in range(_MAX_RETRIES):
-        response = request(method, url, *args, **kwargs)
+        if breaker:
+            breaker.check()
+
+        try:
+            response = request(method, url, *args, **kwargs)
+        except (ConnectionError, Timeout):
+            if breaker:
+                breaker.record_failure()
+            raise
+
         code = response.status_code
+        if breaker:
+            if code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
         if code in [403, 502, 503]:
+            delay = delays.next(
+                parse_retry_after(response.headers.get('Retry-After')))
             retry_info = ('{} request for {} failed with code {} '
                           '(Attempt {} of {}).'.format(method, url, code,
                                                        n + 1, _MAX_RETRIES))
+            if delay is None:
+                logging.info(retry_info + ' Out of time to retry.')
+                break
+            if breaker and breaker.is_open():
+                logging.info(retry_info + ' Circuit is open, not retrying.')
+                break
             if n + 1 < _MAX_RETRIES:
-                retry_info += ' Retrying in {} seconds...'.format(delay)
+                retry_info += ' Retrying in {:g} seconds...'.format(delay)
             logging.info(retry_info)
             time.sleep(delay)
-            delay *= 2
         else:
             response.raise_for_status()
             return response
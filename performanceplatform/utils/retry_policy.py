@@ -0,0 +1,133 @@
+"""
+How long to wait between the attempts at a request which keeps failing for
+a reason which might be temporary, shared by http_with_backoff and
+requests_with_backoff.
+
+Unless told otherwise the wait starts at 10 seconds and doubles each time.
+When many collectors are throttled at the same moment that makes them all
+retry in lockstep, so setting COLLECTOR_BACKOFF=jitter in the environment
+randomises each wait instead. COLLECTOR_BACKOFF_MAX_DELAY caps any single
+wait, and COLLECTOR_BACKOFF_DEADLINE gives up once a request has been
+retried for that many seconds. Every policy waits at least as long as a
+Retry-After header asks.
+"""
+import os
+import random
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+
+class ExponentialBackoff(object):
+
+    """
+    Wait `base` seconds before the first retry, then `factor` times as long
+    as the previous wait before each of the others.
+    """
+
+    def __init__(self, base=10, factor=2, max_delay=None, deadline=None):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def delays(self):
+        """
+        Return the Delays for a new request, which should be created just
+        before its first attempt.
+        """
+        return Delays(self)
+
+    def next_delay(self, previous):
+        if previous is None:
+            return self.base
+        return previous * self.factor
+
+
+class DecorrelatedJitterBackoff(ExponentialBackoff):
+
+    """
+    Wait a random time between `base` seconds and three times the previous
+    wait, so that clients which failed together spread their retries out.
+    See https://www.awsarchitectureblog.com/2015/03/backoff.html
+    """
+
+    def next_delay(self, previous):
+        return random.uniform(self.base, (previous or self.base) * 3)
+
+
+class Delays(object):
+
+    """
+    The waits between the attempts at one request under a policy
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.started = time.time()
+        self.previous = None
+
+    def next(self, retry_after=None):
+        """
+        Return how many seconds to wait before the next attempt, or None if
+        waiting that long would run past the policy's deadline.
+        """
+        delay = self.policy.next_delay(self.previous)
+        if self.policy.max_delay is not None:
+            delay = min(delay, self.policy.max_delay)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self.previous = delay
+
+        if self.policy.deadline is not None:
+            remaining = self.started + self.policy.deadline - time.time()
+            if delay > remaining:
+                return None
+        return delay
+
+
+def default_policy():
+    """
+    Return the policy set up by the COLLECTOR_BACKOFF environment variables
+    """
+    if os.environ.get('COLLECTOR_BACKOFF') == 'jitter':
+        policy_class = DecorrelatedJitterBackoff
+    else:
+        policy_class = ExponentialBackoff
+
+    return policy_class(
+        max_delay=_float_from_environ('COLLECTOR_BACKOFF_MAX_DELAY'),
+        deadline=_float_from_environ('COLLECTOR_BACKOFF_DEADLINE'))
+
+
+def parse_retry_after(value, now=None):
+    """
+    Return the number of seconds to wait given by a Retry-After header,
+    which may be a number of seconds or an HTTP date, or None if there is
+    no usable value.
+
+    >>> parse_retry_after('120')
+    120.0
+    >>> parse_retry_after('Wed, 21 Oct 2015 07:28:30 GMT',
+    ...                   now=1445412480)
+    30.0
+    >>> parse_retry_after(None) is None
+    True
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(float(mktime_tz(parsed) - now), 0.0)
+
+
+def _float_from_environ(name):
+    value = os.environ.get(name)
+    return float(value) if value else None
@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+
+from performanceplatform.client.base import JsonEncoder
+
+_EMPTIED = 'emptied'
+
+
+class Spool(object):
+
+    """
+    An append-only file of the chunks of documents waiting to be pushed to a
+    data set, one JSON list per line, with a journal of the chunks which
+    have been acknowledged. A push which fails part way through can then be
+    resumed later without collecting the data again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + '.acks'
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def append(self, chunks):
+        with open(self.path, 'a') as spool_file:
+            for chunk in chunks:
+                spool_file.write(json.dumps(chunk, cls=JsonEncoder) + '\n')
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+
+    def outstanding(self):
+        """
+        Yield (chunk number, chunk) for every chunk not yet acknowledged
+        """
+        acknowledged = self._journal()
+        with open(self.path) as spool_file:
+            for chunk_number, line in enumerate(spool_file, 1):
+                if str(chunk_number) not in acknowledged:
+                    yield chunk_number, json.loads(line)
+
+    def acknowledge(self, chunk_number):
+        self._write_journal(str(chunk_number))
+
+    @property
+    def emptied(self):
+        return _EMPTIED in self._journal()
+
+    def mark_emptied(self):
+        self._write_journal(_EMPTIED)
+
+    def remove(self):
+        for path in (self.path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _journal(self):
+        if not os.path.exists(self.journal_path):
+            return set()
+        with open(self.journal_path) as journal:
+            return set(line.strip() for line in journal)
+
+    def _write_journal(self, entry):
+        with self._lock:
+            with open(self.journal_path, 'a') as journal:
+                journal.write(entry + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
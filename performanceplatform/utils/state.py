@@ -0,0 +1,64 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+
+def state_path(*parts):
+    """
+    Return the path of a file which is kept between collector runs, making
+    sure that its directory exists.
+
+    Files live under COLLECTOR_STATE_PATH if it is set in the environment,
+    otherwise in a state directory alongside the default log directory.
+    """
+    base_path = os.environ.get('COLLECTOR_STATE_PATH') or os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), '..', '..', 'state')
+    path = os.path.join(base_path, *parts)
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # another collector may have created it in the meantime
+            if not os.path.isdir(directory):
+                raise
+
+    return path
+
+
+def data_set_state_path(data_set_config, kind, extension):
+    """
+    Return the path of a state file of `kind` for a single data set, e.g.
+    state/push-index/my-group/my-type.sqlite
+    """
+    return state_path(
+        kind,
+        data_set_config['data-group'],
+        '{}.{}'.format(data_set_config['data-type'], extension))
+
+
+@contextmanager
+def locked_json_state(path, default):
+    """
+    Hold an exclusive lock on the JSON state file at `path` and yield the
+    dictionary it holds (`default` if it is missing or unreadable). Any
+    changes made to the dictionary are saved before the lock is released,
+    so a read-modify-write is safe between processes.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            state = json.loads(f.read())
+        except ValueError:
+            state = dict(default)
+
+        yield state
+
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f)
+        f.flush()
+        # closing the file releases the lock
@@ -0,0 +1,90 @@
+"""
+Incremental collection: with the 'incremental' option, a collector run
+without a start date only fetches the periods after the last one it pushed,
+less 'recheck-days' days to pick up late changes to recent figures. Runs
+which were missed are caught up by the next one.
+"""
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+
+from performanceplatform.utils.datetimeutil import period_range, to_date
+from performanceplatform.utils.state import data_set_state_path
+
+
+class Watermark(object):
+
+    """
+    The end date of the last complete period pushed to a data set
+    """
+
+    def __init__(self, data_set_config):
+        self.path = data_set_state_path(data_set_config, 'watermark', 'json')
+
+    def get(self):
+        try:
+            with open(self.path) as f:
+                return datetime.strptime(
+                    json.load(f)['end'], '%Y-%m-%d').date()
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def advance(self, end_date):
+        current = self.get()
+        if current is not None and current >= end_date:
+            return
+
+        temporary_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temporary_path, 'w') as f:
+            json.dump({'end': end_date.strftime('%Y-%m-%d')}, f)
+        os.rename(temporary_path, self.path)
+
+
+def incremental_range(data_set_config, options, frequency, start_at, end_at):
+    """
+    Return the (start_at, end_at) a collector should fetch, or None if it
+    has already pushed every complete period.
+
+    Dates given on the command line are used as they are, as are the
+    defaults when the 'incremental' option is not set or nothing has been
+    pushed yet.
+    """
+    if start_at or not options.get('incremental'):
+        return start_at, end_at
+
+    watermark = Watermark(data_set_config).get()
+    if watermark is None:
+        return start_at, end_at
+
+    start_date = watermark + timedelta(
+        days=1 - options.get('recheck-days', 0))
+    if end_at:
+        end_date = to_date(end_at)
+    else:
+        # The end of the latest complete period
+        end_date = list(period_range(None, None, frequency))[-1][1]
+
+    if start_date > end_date:
+        logging.info('Nothing to collect, already pushed up to {}'.format(
+            watermark))
+        return None
+
+    logging.info('Collecting from {} to {}, after the last pushed period '
+                 'ending {}'.format(start_date, end_date, watermark))
+    return (datetime.combine(start_date, time()),
+            datetime.combine(end_date, time()))
+
+
+def record_collected(data_set_config, options, frequency, start_at, end_at):
+    """
+    Move the watermark on to the end of the last complete period in a range
+    which has just been pushed, if the 'incremental' option is set. A dry
+    run pushes nothing, so it leaves the watermark where it was.
+    """
+    if not options.get('incremental') or data_set_config.get('dry_run'):
+        return
+
+    end_date = list(period_range(start_at, end_at, frequency))[-1][1]
+    yesterday = date.today() - timedelta(days=1)
+    Watermark(data_set_config).advance(min(end_date, yesterday))
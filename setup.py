@@ -79,7 +79,11 @@ if __name__ == '__main__':
 
         entry_points={
             'console_scripts': [
-                'pp-collector=performanceplatform.collector.main:main'
+                'pp-collector=performanceplatform.collector.main:main',
+                'pp-collector-daemon='
+                'performanceplatform.collector.daemon:main',
+                'pp-collector-prefetch-configs='
+                'performanceplatform.collector.prefetch_configs:main',
             ]
         }
     )
@@ -1,8 +1,11 @@
 import unittest
+from mock import patch
 from nose.tools import assert_raises
 from hamcrest import assert_that, equal_to
 from performanceplatform.collector.ga.contrib.content.table import \
-    get_department
+    get_department, get_departments, main
+
+table_module = 'performanceplatform.collector.ga.contrib.content.table'
 
 
 class ContribContentTableTestCase(unittest.TestCase):
@@ -24,3 +27,86 @@ class ContribContentTableTestCase(unittest.TestCase):
         filters = ["customVarValue9=<D1>"]
 
         assert_raises(ValueError, get_department, filters)
+
+    def test_get_departments_for_each_filterset(self):
+        filtersets = [["customVarValue9=~^<D1>"],
+                      ["Organisation=~^<D9>", "pagePath=~^/foo"],
+                      ["customVarValue9=~^<D1>"]]
+
+        departments = get_departments(filtersets)
+
+        assert_that(departments, equal_to(["attorney-generals-office",
+                                           "department-for-transport",
+                                           "attorney-generals-office"]))
+
+
+class ContribContentTableMainTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_set_config = {'data-type': 'content'}
+        self.query = {'id': 'ga:123', 'filters': ['pagePath=~^/foo']}
+
+    def _main(self, options, documents_for):
+        with patch(table_module + '.create_client'), \
+                patch(table_module + '.query_documents_for') as query_for, \
+                patch(table_module + '.Pusher') as pusher:
+            query_for.side_effect = documents_for
+            main({}, self.data_set_config, self.query, options, None, None)
+        return query_for, pusher
+
+    def test_queries_each_filterset_with_its_own_query_and_options(self):
+        options = {'filtersets': [['customVarValue9=~^<D1>'],
+                                  ['customVarValue9=~^<D9>']],
+                   'filterset-concurrency': 2}
+
+        def documents_for(client, query, options, *args):
+            return [{'filters': query['filters'],
+                     'department': options['additionalFields']['department']}]
+
+        query_for, pusher = self._main(options, documents_for)
+
+        pushed = sorted(call[0][0][0]['department']
+                        for call in pusher.return_value.push.call_args_list)
+        assert_that(pushed, equal_to(['attorney-generals-office',
+                                      'department-for-transport']))
+        filters = sorted(call[0][1]['filters']
+                         for call in query_for.call_args_list)
+        assert_that(filters, equal_to([
+            ['pagePath=~^/foo;ga:customVarValue9=~^<D1>'],
+            ['pagePath=~^/foo;ga:customVarValue9=~^<D9>']]))
+        assert_that(self.query['filters'], equal_to(['pagePath=~^/foo']))
+        assert_that(options.get('additionalFields'), equal_to(None))
+
+    def test_empties_the_data_set_once_every_filterset_is_fetched(self):
+        options = {'filtersets': [['customVarValue9=~^<D1>'],
+                                  ['customVarValue9=~^<D9>']],
+                   'empty-data-set': True}
+        documents = {'attorney-generals-office': [{'a': 1}],
+                     'department-for-transport': [{'a': 2}]}
+
+        def documents_for(client, query, options, *args):
+            return documents[options['additionalFields']['department']]
+
+        query_for, pusher = self._main(options, documents_for)
+
+        pusher.return_value.push.assert_called_once_with(
+            [{'a': 1}, {'a': 2}])
+
+    def test_failing_filterset_leaves_an_emptied_data_set_alone(self):
+        options = {'filtersets': [['customVarValue9=~^<D1>'],
+                                  ['customVarValue9=~^<D9>']],
+                   'empty-data-set': True}
+
+        def documents_for(client, query, options, *args):
+            if options['additionalFields']['department'] == \
+                    'department-for-transport':
+                raise RuntimeError('GA is down')
+            return [{'a': 1}]
+
+        with patch(table_module + '.create_client'), \
+                patch(table_module + '.query_documents_for',
+                      side_effect=documents_for), \
+                patch(table_module + '.Pusher') as pusher:
+            assert_raises(RuntimeError, main, {}, self.data_set_config,
+                          self.query, options, None, None)
+
+        assert_that(pusher.return_value.push.called, equal_to(False))
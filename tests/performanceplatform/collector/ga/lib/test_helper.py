@@ -1,7 +1,8 @@
 # encoding: utf-8
 
 from mock import Mock, patch, ANY
-from performanceplatform.collector.ga.lib.helper import create_client
+from performanceplatform.collector.ga.lib.helper import (
+    GARateLimiter, create_client)
 
 
 @patch("performanceplatform.collector.ga.lib.helper.from_credentials_db")
@@ -26,3 +27,40 @@ def test_create_client_handles_oauth2_credentials(mock_from_credentials_db):
     create_client(credentials)
     mock_from_credentials_db.assert_called_with(
         client_secrets, mock_storage_object, http_client=ANY, ga_hook=ANY)
+
+
+@patch("performanceplatform.collector.ga.lib.helper._reusable_clients", {})
+@patch("performanceplatform.collector.ga.lib.helper.from_private_key")
+def test_create_client_reuses_clients(mock_from_private_key):
+    credentials = {
+        "ACCOUNT_NAME": "an account",
+        "PRIVATE_KEY": "path/to/key",
+        "STORAGE_PATH": "path/to/storage",
+    }
+
+    first = create_client(credentials)
+    second = create_client(dict(credentials))
+
+    assert first is second
+    assert mock_from_private_key.call_count == 1
+
+
+@patch("performanceplatform.collector.ga.lib.helper.shared_bucket")
+def test_rate_limiter_uses_project_and_profile_buckets(mock_shared_bucket):
+    credentials = {
+        "ACCOUNT_NAME": "someone@example.com",
+        "RATE_LIMIT": {
+            "requests_per_second": 8,
+            "requests_per_second_per_profile": 2,
+        },
+    }
+
+    limiter = GARateLimiter(credentials)
+    limiter('https://www.googleapis.com/analytics/v3/data/ga'
+            '?ids=ga%3A1234&metrics=ga%3Avisits')
+
+    rates = sorted(
+        (c[0][0].split('-')[-1], c[0][1])
+        for c in mock_shared_bucket.call_args_list)
+    assert rates == [('ga1234', 2), ('project', 8)], rates
+    assert mock_shared_bucket.return_value.acquire.call_count == 2
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from hamcrest import assert_that, equal_to
+
+from performanceplatform.collector.ga.lib.response_cache import (
+    ResponseCache, cache_key)
+
+RECORDS = [{
+    'metrics': {'visits': '10'},
+    'dimensions': {'date': '20140106',
+                   'datetime': datetime(2014, 1, 6)},
+    'start_date': date(2014, 1, 6),
+    'end_date': date(2014, 1, 12),
+}]
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_records_come_back_unchanged(self):
+        cache = ResponseCache(self.path)
+        key = cache_key('123', date(2014, 1, 6), date(2014, 1, 12),
+                        ['visits'], ['date'])
+
+        assert_that(cache.get(key), equal_to(None))
+        cache.put(key, RECORDS)
+        assert_that(cache.get(key), equal_to(RECORDS))
+
+    def test_only_periods_outside_the_settle_window_are_settled(self):
+        cache = ResponseCache(self.path, settle_days=3)
+        today = date(2014, 1, 20)
+
+        assert cache.is_settled(date(2014, 1, 16), today)
+        assert not cache.is_settled(date(2014, 1, 17), today)
+        assert not cache.is_settled(datetime(2014, 1, 19, 12), today)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(self.path)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, RECORDS)
+        entry_bytes = os.path.getsize(os.path.join(self.path, 'a.pickle'))
+        os.utime(os.path.join(self.path, 'a.pickle'), (1, 1))
+        os.utime(os.path.join(self.path, 'b.pickle'), (3, 3))
+        os.utime(os.path.join(self.path, 'c.pickle'), (2, 2))
+
+        cache.max_bytes = entry_bytes * 2
+        cache.get('a')
+        cache.put('d', RECORDS)
+
+        assert_that(sorted(os.listdir(self.path)),
+                    equal_to(['a.pickle', 'd.pickle']))
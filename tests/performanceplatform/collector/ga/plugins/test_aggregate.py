@@ -67,3 +67,46 @@ def test_AggregateKeyPlugin():
         "rate": (0.25 * 100 + 0.75 * 100) / (100 + 100)}
 
     assert_equal(output_docs, [expected_aggregate])
+
+
+def _documents():
+    import random
+    rng = random.Random(42)
+    return [{"page": rng.choice(["/a", "/b", "/c", "/d"]),
+             "device": rng.choice(["mobile", "desktop"]),
+             "visits": rng.randint(1, 100),
+             "rate": rng.random()}
+            for _ in range(500)]
+
+
+def test_AggregateKeyPlugin_matches_sorting_and_grouping():
+    from nose.tools import assert_equal
+
+    plugin = AggregateKey(aggregate_count("visits"),
+                          aggregate_rate("rate", "visits"))
+    groupkeys = tuple(set(_documents()[0]) - set(["visits", "rate"]))
+
+    assert_equal(plugin(_documents()),
+                 plugin._sort_and_group(_documents(), groupkeys))
+
+
+def test_AggregateKeyPlugin_aggregates_a_stream():
+    from nose.tools import assert_equal
+
+    plugin = AggregateKey(aggregate_count("visits"))
+
+    assert_equal(plugin(iter(_documents())), plugin(_documents()))
+    assert_equal(plugin(iter([])), [])
+
+
+def test_AggregateKeyPlugin_with_plain_aggregation_functions():
+    from nose.tools import assert_equal
+
+    def biggest(docs):
+        return max(doc["visits"] for doc in docs)
+
+    docs = [{"a": 1, "visits": 3}, {"a": 2, "visits": 1},
+            {"a": 1, "visits": 5}]
+
+    assert_equal(AggregateKey(("visits", biggest))(docs),
+                 [{"a": 1, "visits": 5}, {"a": 2, "visits": 1}])
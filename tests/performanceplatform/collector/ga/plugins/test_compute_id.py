@@ -27,3 +27,20 @@ def test_ComputeIdFrom():
     _id, humanId = value_id("{0}_{1}".format(document['a'], document['b']))
     assert_equal(_id, document['_id'])
     assert_equal(humanId, document['humanId'])
+
+
+def test_ComputeIdFrom_formats_timestamps():
+    from datetime import datetime
+    import pytz
+    from nose.tools import assert_equal
+
+    documents = [
+        {"_timestamp": datetime(2014, 1, 6, tzinfo=pytz.UTC), "a": u"x"},
+        {"_timestamp": datetime(2014, 1, 6, tzinfo=pytz.UTC), "a": u"y"},
+    ]
+
+    documents = ComputeIdFrom("_timestamp", "a")(documents)
+
+    assert_equal([document['humanId'] for document in documents],
+                 ["20140106000000_x", "20140106000000_y"])
+    assert_equal(documents[0]['_id'], value_id(u"20140106000000_x")[0])
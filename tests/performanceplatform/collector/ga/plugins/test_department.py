@@ -1,5 +1,5 @@
 from performanceplatform.collector.ga.plugins.department \
-    import ComputeDepartmentKey, try_get_department
+    import ComputeDepartmentKey, DepartmentResolver, try_get_department
 
 
 def test_try_get_department():
@@ -50,3 +50,42 @@ def test_takes_first_code():
 
     assert_equal(transformed_document["department"],
                  "department-for-work-pensions")
+
+
+def test_resolver_looks_up_each_string_once():
+    from mock import patch
+    from nose.tools import assert_equal
+
+    resolver = DepartmentResolver()
+
+    with patch.object(resolver, '_resolve',
+                      wraps=resolver._resolve) as resolve:
+        departments = resolver.resolve_all(["<D10>", "<D9><D10>", "<D10>"])
+        resolver.resolve("<D9><D10>")
+
+    assert_equal(departments, ["department-for-work-pensions",
+                               "department-for-transport",
+                               "department-for-work-pensions"])
+    assert_equal(resolve.call_count, 2)
+
+
+def test_resolver_requires_a_department_code():
+    from nose.tools import assert_equal, assert_raises
+
+    with assert_raises(AssertionError):
+        DepartmentResolver().resolve("Department for fooing the bar")
+
+    verbatim = DepartmentResolver(verbatim_fallback=True)
+    assert_equal(verbatim.resolve_all(["Department for fooing the bar",
+                                       "<D1>"]),
+                 ["Department for fooing the bar",
+                  "attorney-generals-office"])
+
+
+def test_stream_matches_plugin():
+    from nose.tools import assert_equal
+
+    plugin = ComputeDepartmentKey("key_name")
+    streamed = list(plugin.stream(iter([{"key_name": "<D10><D9>"}])))
+
+    assert_equal(plugin([{"key_name": "<D10><D9>"}]), streamed)
@@ -1,8 +1,8 @@
 from performanceplatform.collector.ga.plugins.load_plugin \
-    import load_plugin
+    import compile_plugins, load_plugin, load_plugins
 
 from performanceplatform.collector.ga.plugins \
-    import AggregateKey, ComputeDepartmentKey
+    import AggregateKey, ComputeDepartmentKey, ComputeRank
 
 
 def test_load_plugin_trivial():
@@ -24,3 +24,102 @@ def test_load_plugin_compute_aggregate_key():
     plugin = load_plugin('AggregateKey(aggregate_count("visits"),'
                          '             aggregate_rate("rate", "visits"))')
     assert_is_instance(plugin, AggregateKey)
+
+
+def test_load_plugin_parses_each_plugin_string_once():
+    from mock import patch
+    from nose.tools import assert_equal, assert_is_not
+
+    with patch('performanceplatform.collector.ga.plugins.load_plugin.'
+               '_compiled_plugins', {}) as compiled:
+        first = load_plugin('RemoveKey("a")')
+        second = load_plugin('RemoveKey("a")')
+
+    assert_equal(list(compiled), ['RemoveKey("a")'])
+    assert_is_not(first, second)
+
+
+def test_compile_plugins_loads_each_plugin_in_order():
+    from nose.tools import assert_equal
+
+    pipeline = compile_plugins([
+        'AggregateKey(aggregate_count("visits"))',
+        'ComputeRank("rank")',
+    ])
+
+    assert_equal([type(stage) for stage in pipeline.stages],
+                 [AggregateKey, ComputeRank])
+
+
+def test_compiled_plugins_give_the_same_documents_as_separate_passes():
+    from nose.tools import assert_equal
+
+    plugin_names = [
+        'ComputeDepartmentKey("customVarValue9")',
+        'RemoveKey("customVarValue9")',
+        'AggregateKey(aggregate_count("visits"))',
+        'Comment("sort happens in AggregateKey")',
+        'ComputeRank("rank")',
+        'ComputeIdFrom("department", "rank")',
+    ]
+
+    def documents():
+        return [
+            {"customVarValue9": "<D1><D2>", "visits": 2},
+            {"customVarValue9": "<D3>", "visits": 3},
+            {"customVarValue9": "<D1>", "visits": 4},
+        ]
+
+    expected = documents()
+    for plugin in load_plugins(plugin_names):
+        expected = plugin(expected)
+
+    assert_equal(compile_plugins(plugin_names)(documents()), expected)
+
+
+def test_compiled_plugins_are_lazy_unless_one_needs_every_document():
+    from nose.tools import assert_equal
+
+    assert_equal(compile_plugins(['RemoveKey("a")',
+                                  'ComputeIdFrom("b")']).lazy, True)
+    assert_equal(compile_plugins(['RemoveKey("a")',
+                                  'ComputeRank("rank")',
+                                  'ComputeIdFrom("rank")']).lazy, False)
+    assert_equal(compile_plugins(['AggregateKey(aggregate_count("visits"))',
+                                  'ComputeIdFrom("a")']).lazy, False)
+
+
+def test_streamed_plugins_give_the_same_documents():
+    from nose.tools import assert_equal
+
+    plugin_names = ['SetDepartment("<D3>")',
+                    'ComputeDepartmentKey("b")',
+                    'RemoveKey("b")',
+                    'Comment("streamed one at a time")',
+                    'ComputeIdFrom("department", "a")']
+
+    def documents():
+        return [{"a": 1, "b": "<D1>"}, {"a": 2, "b": "<D2>"}]
+
+    streamed = compile_plugins(plugin_names).stream(iter(documents()))
+
+    assert_equal(list(streamed), compile_plugins(plugin_names)(documents()))
+
+
+def test_compiled_plugins_make_ids_in_bulk():
+    from mock import patch
+    from nose.tools import assert_equal
+
+    documents = [{"a": 1, "b": u"x"}, {"a": 2, "b": u"y"}]
+
+    with patch('performanceplatform.collector.ga.plugins.compute_id.'
+               'value_ids', return_value=[('1', '1'), ('2', '2')]) as ids, \
+            patch('performanceplatform.collector.ga.plugins.compute_id.'
+                  'value_id') as one_id:
+        documents = compile_plugins(['RemoveKey("b")',
+                                     'ComputeIdFrom("a")'])(documents)
+
+    ids.assert_called_once_with(["1", "2"])
+    assert_equal(one_id.called, False)
+    assert_equal(documents, [{"a": 1, "_id": "1", "humanId": "1"},
+                             {"a": 2, "_id": "2", "humanId": "2"}])
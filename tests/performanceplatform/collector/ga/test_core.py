@@ -1,19 +1,22 @@
 # encoding: utf-8
 
 from datetime import date
-from hamcrest import assert_that, is_, has_entries, has_item, equal_to
+from hamcrest import (
+    assert_that, is_, has_entries, has_item, has_key, equal_to)
 
 import mock
 import datetime
 import pytz
 
-from nose.tools import (eq_)
+from nose.tools import (eq_, assert_raises)
 
 from performanceplatform.collector.ga.core import \
     query_ga, \
     build_document_set, query_for_range, \
-    query_documents_for, \
-    convert_durations
+    query_documents_for, query_range_in_one_shot, \
+    convert_durations, PERIOD_DIMENSIONS
+from performanceplatform.utils.datetimeutil import period_range
+from gapy.response import QueryResponse
 
 
 # wanted something big and complicated to ensure my refactor worked
@@ -171,6 +174,333 @@ def test_query_for_range():
     assert_that(response_1, is_(expected_response_1))
 
 
+def test_query_for_range_concurrently_keeps_period_order():
+    query = {
+        "id": "12345",
+        "metrics": ["visits"],
+        "frequency": "daily",
+    }
+
+    def get(ids, start_date, *args):
+        return [{"metrics": {"visits": "1"}, "start_date": start_date}]
+
+    client = mock.Mock()
+    client.query.get.side_effect = get
+
+    items = list(query_for_range(
+        client, query, date(2013, 4, 1), date(2013, 4, 20), concurrency=4))
+
+    assert_that(
+        [item["start_date"] for item in items],
+        is_([date(2013, 4, day) for day in range(1, 21)]))
+
+
+@mock.patch("performanceplatform.collector.ga.core.ThreadPool")
+def test_query_for_range_caps_concurrency_at_view_limit(mock_pool):
+    mock_pool.return_value.imap.return_value = []
+    query = {
+        "id": "12345",
+        "metrics": ["visits"],
+    }
+
+    list(query_for_range(
+        mock.Mock(), query, date(2013, 4, 1), date(2013, 4, 8),
+        concurrency=50))
+
+    mock_pool.assert_called_once_with(10)
+
+
+@mock.patch("performanceplatform.collector.ga.core.query_for_range")
+def test_query_documents_for_passes_query_concurrency(mock_query_in_range):
+    mock_query_in_range.return_value = iter([])
+    client = mock.Mock()
+    query = {"id": "ga:123", "metrics": ["visits"]}
+
+    query_documents_for(client, query, {'query-concurrency': 5},
+                        "test", date(2013, 4, 1), date(2013, 4, 8))
+
+    mock_query_in_range.assert_called_once_with(
+        client, query, date(2013, 4, 1), date(2013, 4, 8), 5, None)
+
+
+def test_query_range_in_one_shot_splits_rows_into_periods():
+    query = {
+        "id": "ga:12345",
+        "metrics": ["visits"],
+        "dimensions": ["browser"],
+        "frequency": "weekly",
+    }
+
+    def ga_row(week, browser, visits):
+        return {
+            "metrics": {"visits": visits},
+            "dimensions": {"browser": browser, "isoYearIsoWeek": week},
+            "start_date": date(2013, 4, 1),
+            "end_date": date(2013, 4, 14),
+        }
+
+    client = mock.Mock()
+    client.query.get.return_value = [
+        ga_row("201315", "Chrome", "3"),
+        ga_row("201314", "Chrome", "1"),
+        ga_row("201314", "Safari", "2"),
+    ]
+
+    items = list(query_range_in_one_shot(
+        client, query, date(2013, 4, 1), date(2013, 4, 8)))
+
+    client.query.get.assert_called_once_with(
+        "12345",
+        date(2013, 4, 1),
+        date(2013, 4, 14),
+        ["visits"],
+        ["browser", "isoYearIsoWeek"],
+        None,
+        None,
+        None,
+        None
+    )
+    assert_that(items, is_([
+        {
+            "metrics": {"visits": "1"},
+            "dimensions": {"browser": "Chrome"},
+            "start_date": date(2013, 4, 1),
+            "end_date": date(2013, 4, 7),
+        },
+        {
+            "metrics": {"visits": "2"},
+            "dimensions": {"browser": "Safari"},
+            "start_date": date(2013, 4, 1),
+            "end_date": date(2013, 4, 7),
+        },
+        {
+            "metrics": {"visits": "3"},
+            "dimensions": {"browser": "Chrome"},
+            "start_date": date(2013, 4, 8),
+            "end_date": date(2013, 4, 14),
+        },
+    ]))
+
+
+def test_query_range_in_one_shot_without_dimensions():
+    query = {
+        "id": "ga:12345",
+        "metrics": ["visits"],
+        "frequency": "monthly",
+    }
+    client = mock.Mock()
+    client.query.get.return_value = [{
+        "metrics": {"visits": "10"},
+        "dimensions": {"yearMonth": "201305"},
+        "start_date": date(2013, 4, 1),
+        "end_date": date(2013, 5, 31),
+    }]
+
+    items = list(query_range_in_one_shot(
+        client, query, date(2013, 4, 1), date(2013, 5, 1)))
+
+    assert_that(items, is_([{
+        "metrics": {"visits": "10"},
+        "start_date": date(2013, 5, 1),
+        "end_date": date(2013, 5, 31),
+    }]))
+
+
+def test_query_range_in_one_shot_rejects_max_results():
+    query = {
+        "id": "ga:12345",
+        "metrics": ["visits"],
+        "maxResults": 10,
+    }
+
+    assert_raises(ValueError, list, query_range_in_one_shot(
+        mock.Mock(), query, date(2013, 4, 1), date(2013, 4, 8)))
+
+
+def _gapy_response(dimensions, rows, start_date, end_date):
+    return QueryResponse(None, {
+        "rows": rows,
+        "query": {"start-date": start_date.strftime("%Y-%m-%d"),
+                  "end-date": end_date.strftime("%Y-%m-%d")},
+    }, ["visits"], dimensions, None)
+
+
+def _assert_single_shot_documents_match_serial_documents(
+        dimensions, frequency, start_date, end_date):
+    query = {
+        "id": "ga:12345",
+        "metrics": ["visits"],
+        "dimensions": dimensions,
+        "frequency": frequency,
+    }
+    period_dimension = PERIOD_DIMENSIONS[frequency]
+    values = [u"09" if dimension == "hour" else u"{}-value".format(dimension)
+              for dimension in dimensions]
+
+    def serial_get(ids, start, end, metrics, query_dimensions, *args):
+        return _gapy_response(query_dimensions, [values + ["1"]], start, end)
+
+    def single_shot_get(ids, start, end, metrics, query_dimensions, *args):
+        periods = period_range(start, end, frequency)
+        rows = [values + [period_value(period_dimension, period_start),
+                          "1"]
+                for period_start, _ in periods]
+        return _gapy_response(query_dimensions, rows, start, end)
+
+    single_shot_client = mock.Mock()
+    single_shot_client.query.get.side_effect = single_shot_get
+    serial_client = mock.Mock()
+    serial_client.query.get.side_effect = serial_get
+
+    single_shot = query_documents_for(
+        single_shot_client, query, {'single-shot': True}, "test",
+        start_date, end_date)
+    serial = query_documents_for(
+        serial_client, query, {}, "test", start_date, end_date)
+
+    assert_that(single_shot_client.query.get.call_count, is_(1))
+    assert_that([doc['humanId'] for doc in single_shot],
+                equal_to([doc['humanId'] for doc in serial]))
+    assert_that(single_shot, equal_to(serial))
+
+
+def period_value(period_dimension, period_start):
+    if period_dimension == 'date':
+        return period_start.strftime('%Y%m%d')
+    year, week, _ = period_start.isocalendar()
+    return '{:04d}{:02d}'.format(year, week)
+
+
+def test_single_shot_documents_match_serial_documents():
+    dimension_sets = [
+        ["browser"],
+        ["browser", "operatingSystem"],
+        ["operatingSystem", "browser"],
+        ["deviceCategory", "browser", "operatingSystem"],
+        ["pagePath", "hostname", "source", "medium"],
+        ["country", "city", "userType", "landingPagePath"],
+        ["hour", "browser"],
+    ]
+    for dimensions in dimension_sets:
+        _assert_single_shot_documents_match_serial_documents(
+            dimensions, "daily", date(2013, 4, 1), date(2013, 4, 3))
+        _assert_single_shot_documents_match_serial_documents(
+            dimensions, "weekly", date(2013, 4, 1), date(2013, 4, 14))
+
+
+def _weekly_ga_records(count):
+    return [{
+        "metrics": {"visits": str(i)},
+        "dimensions": {"browser": "browser-%d" % i},
+        "start_date": date(2013, 4, 1),
+        "end_date": date(2013, 4, 7),
+    } for i in range(count)]
+
+
+@mock.patch("performanceplatform.collector.ga.core.query_for_range")
+def test_streaming_documents_match_materialised_documents(
+        mock_query_in_range):
+    query = {"id": "ga:123", "metrics": ["visits"]}
+    mock_query_in_range.side_effect = lambda *args: iter(
+        _weekly_ga_records(5))
+
+    streamed = query_documents_for(
+        {}, query, {'streaming': True, 'chunk-size': 2}, "test", None, None)
+    materialised = query_documents_for(
+        {}, query, {}, "test", None, None)
+
+    assert_that(isinstance(streamed, list), is_(False))
+    assert_that(list(streamed), equal_to(materialised))
+
+
+@mock.patch("performanceplatform.collector.ga.core.query_for_range")
+def test_streaming_only_fetches_what_has_been_consumed(mock_query_in_range):
+    fetched = []
+
+    def records(*args):
+        for record in _weekly_ga_records(10):
+            fetched.append(record)
+            yield record
+
+    mock_query_in_range.side_effect = records
+    query = {"id": "ga:123", "metrics": ["visits"]}
+
+    documents = query_documents_for(
+        {}, query, {'streaming': True, 'chunk-size': 3}, "test", None, None)
+    next(documents)
+
+    assert_that(len(fetched), is_(3))
+
+
+@mock.patch("performanceplatform.collector.ga.core.query_for_range")
+def test_streaming_runs_plugins_over_all_documents(mock_query_in_range):
+    mock_query_in_range.return_value = iter(_weekly_ga_records(4))
+    query = {"id": "ga:123", "metrics": ["visits"]}
+    options = {
+        'streaming': True,
+        'chunk-size': 3,
+        'plugins': [
+            "ComputeRank('rank')",
+            "ComputeIdFrom('browser')",
+        ],
+    }
+
+    documents = query_documents_for({}, query, options, "test", None, None)
+
+    assert_that([doc['rank'] for doc in documents], is_([1, 2, 3, 4]))
+
+
+@mock.patch("performanceplatform.collector.ga.core.query_for_range")
+def test_streaming_ranks_only_once_every_document_is_built(
+        mock_query_in_range):
+    fetched = []
+
+    def records(*args):
+        for record in _weekly_ga_records(10):
+            fetched.append(record)
+            yield record
+
+    mock_query_in_range.side_effect = records
+    query = {"id": "ga:123", "metrics": ["visits"]}
+    options = {
+        'streaming': True,
+        'chunk-size': 3,
+        'plugins': ["ComputeRank('rank')", "ComputeIdFrom('rank')"],
+    }
+
+    documents = query_documents_for({}, query, options, "test", None, None)
+
+    assert_that(next(iter(documents))['rank'], is_(1))
+    assert_that(len(fetched), is_(10))
+
+
+@mock.patch("performanceplatform.collector.ga.core.query_for_range")
+def test_streaming_runs_plugins_which_can_stream_as_it_goes(
+        mock_query_in_range):
+    fetched = []
+
+    def records(*args):
+        for record in _weekly_ga_records(10):
+            fetched.append(record)
+            yield record
+
+    mock_query_in_range.side_effect = records
+    query = {"id": "ga:123", "metrics": ["visits"]}
+    options = {
+        'streaming': True,
+        'chunk-size': 3,
+        'plugins': [
+            "RemoveKey('browser')",
+            "ComputeIdFrom('visits')",
+        ],
+    }
+
+    documents = query_documents_for({}, query, options, "test", None, None)
+
+    assert_that(next(documents), has_key('_id'))
+    assert_that(len(fetched), is_(3))
+
+
 def test_build_document_set():
     def build_gapy_response(visits):
         return {
@@ -401,3 +731,51 @@ def test_segment_is_optional_for_querying():
     )
 
     assert_that(response, equal_to([]))
+
+
+def test_query_ga_uses_the_cache_for_settled_periods():
+    config = {
+        "id": "ga:123",
+        "metrics": ["visits"],
+    }
+    records = [{'metrics': {'visits': '1'},
+                'start_date': date(2013, 4, 1),
+                'end_date': date(2013, 4, 7)}]
+    client = mock.Mock()
+    client.query.get.return_value = iter(records)
+    cache = mock.Mock()
+    cache.is_settled.return_value = True
+    cache.get.return_value = None
+
+    response = query_ga(client, config, date(2013, 4, 1), date(2013, 4, 7),
+                        cache)
+
+    assert_that(response, equal_to(records))
+    key = cache.get.call_args[0][0]
+    cache.put.assert_called_once_with(key, records)
+
+    cache.get.return_value = records
+    client.query.get.reset_mock()
+
+    response = query_ga(client, config, date(2013, 4, 1), date(2013, 4, 7),
+                        cache)
+
+    assert_that(response, equal_to(records))
+    assert not client.query.get.called
+
+
+def test_query_ga_does_not_cache_unsettled_periods():
+    config = {
+        "id": "ga:123",
+        "metrics": ["visits"],
+    }
+    client = mock.Mock()
+    client.query.get.return_value = []
+    cache = mock.Mock()
+    cache.is_settled.return_value = False
+
+    query_ga(client, config, date(2013, 4, 1), date(2013, 4, 7), cache)
+
+    assert client.query.get.called
+    assert not cache.get.called
+    assert not cache.put.called
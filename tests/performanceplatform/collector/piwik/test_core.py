@@ -189,3 +189,41 @@ class TestMain(unittest.TestCase):
         second_call = mock_pusher.mock_calls[1]
         argument = second_call[1][0]
         assert_that(argument, equal_to(parsed_data))
+
+    @patch("performanceplatform.collector.piwik.core.Pusher")
+    @patch("performanceplatform.collector.piwik.base."
+           "requests_with_backoff.get")
+    @patch("performanceplatform.collector.piwik.core.incremental_range")
+    def test_main_does_nothing_when_up_to_date(self, mock_incremental_range,
+                                               mock_get, mock_pusher):
+        mock_incremental_range.return_value = None
+
+        main(credentials(),
+             {'data-type': 'browser-count'}, query(),
+             dict(options(), incremental=True), None, None)
+
+        assert_that(mock_get.called, equal_to(False))
+        assert_that(mock_pusher.called, equal_to(False))
+
+    @patch("performanceplatform.collector.piwik.core.Pusher")
+    @patch("performanceplatform.collector.piwik.base."
+           "requests_with_backoff.get")
+    @patch("performanceplatform.collector.piwik.core.record_collected")
+    @patch("performanceplatform.collector.piwik.core.incremental_range")
+    def test_main_fetches_from_the_watermark(self, mock_incremental_range,
+                                             mock_record_collected,
+                                             mock_get, mock_pusher):
+        mock_get().json.return_value = get_piwik_data()
+        mock_incremental_range.return_value = (
+            datetime(2014, 3, 3), datetime(2014, 3, 23))
+        data_set_config = {'data-type': 'browser-count'}
+        incremental_options = dict(options(), incremental=True)
+
+        main(credentials(), data_set_config, query(), incremental_options,
+             None, None)
+
+        assert_that(mock_get.call_args[1]['params']['date'],
+                    equal_to('2014-03-03,2014-03-23'))
+        mock_record_collected.assert_called_once_with(
+            data_set_config, incremental_options, 'weekly',
+            datetime(2014, 3, 3), datetime(2014, 3, 23))
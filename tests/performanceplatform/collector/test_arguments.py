@@ -47,6 +47,21 @@ class TestParseArgs(object):
                                               "-t", query_path,
                                               "-b", query_path])
 
+    def test_token_path_is_required(self):
+        with json_file({}) as config_path:
+            assert_raises(
+                SystemExit, parse_args, args=["-c", config_path,
+                                              "-l", "test-collector-slug",
+                                              "-b", config_path])
+
+    def test_batch_does_not_require_credentials_or_token(self):
+        with json_file({}) as config_path:
+            args = parse_args(
+                args=["--batch", "/path/to/batch", "-b", config_path])
+
+            assert_that(args.credentials, equal_to(None))
+            assert_that(args.token, equal_to(None))
+
     def test_start_and_end_fields_are_allowed(self):
         with json_file({}) as config_path:
             parse_args(
@@ -80,3 +95,42 @@ class TestParseArgs(object):
                 assert_raises(
                     SystemExit, parse_args, args=args)
                 ok_("invalid _load_json_file value" in stderr.getvalue())
+
+    def test_force_push_defaults_to_false(self):
+        with json_file({}) as config_path:
+            args = parse_args(
+                args=["-c", config_path, "-l", "test-collector-slug",
+                      "-t", config_path, "-b", config_path]
+            )
+
+            assert_that(args.force_push, equal_to(False))
+
+    def test_force_push_can_be_set(self):
+        with json_file({}) as config_path:
+            args = parse_args(
+                args=["-c", config_path, "-l", "test-collector-slug",
+                      "-t", config_path, "-b", config_path, "--force-push"]
+            )
+
+            assert_that(args.force_push, equal_to(True))
+
+    def test_resume_can_be_set(self):
+        with json_file({}) as config_path:
+            args = parse_args(
+                args=["-c", config_path, "-l", "test-collector-slug",
+                      "-t", config_path, "-b", config_path, "--resume"]
+            )
+
+            assert_that(args.resume, equal_to(True))
+
+    def test_batch_can_be_given_instead_of_a_collector(self):
+        with json_file({}) as config_path:
+            args = parse_args(
+                args=["-c", config_path, "--batch", "/path/to/batch",
+                      "-t", config_path, "-b", config_path,
+                      "--batch-concurrency", "8"]
+            )
+
+            assert_that(args.batch, equal_to("/path/to/batch"))
+            assert_that(args.batch_concurrency, equal_to(8))
+            assert_that(args.collector_slug, equal_to(None))
@@ -0,0 +1,169 @@
+from datetime import datetime
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from hamcrest import assert_that, equal_to
+from mock import patch, Mock
+
+from performanceplatform.collector.daemon import (
+    CronSchedule, Job, load_jobs, run_due_jobs)
+from performanceplatform.collector.logging_setup import JobFieldsFilter
+
+
+class TestCronSchedule(unittest.TestCase):
+    def test_every_minute(self):
+        assert_that(CronSchedule('* * * * *').matches(
+            datetime(2014, 4, 7, 9, 31)), equal_to(True))
+
+    def test_specific_minute_and_hour(self):
+        schedule = CronSchedule('15 3 * * *')
+        assert_that(schedule.matches(datetime(2014, 4, 7, 3, 15)),
+                    equal_to(True))
+        assert_that(schedule.matches(datetime(2014, 4, 7, 4, 15)),
+                    equal_to(False))
+
+    def test_sunday_can_be_seven(self):
+        assert_that(CronSchedule('0 0 * * 7').matches(
+            datetime(2014, 4, 6, 0, 0)), equal_to(True))
+
+    def test_restricted_day_of_month_or_week(self):
+        schedule = CronSchedule('0 0 1 * 1')
+        # the 1st of the month, a Tuesday
+        assert_that(schedule.matches(datetime(2014, 4, 1)), equal_to(True))
+        # a Monday
+        assert_that(schedule.matches(datetime(2014, 4, 7)), equal_to(True))
+        assert_that(schedule.matches(datetime(2014, 4, 8)), equal_to(False))
+
+    def test_rejects_bad_schedules(self):
+        self.assertRaises(ValueError, CronSchedule, '* * * *')
+        self.assertRaises(ValueError, CronSchedule, '61 * * * *')
+
+
+@patch('socket.gethostname', Mock(return_value='nonnumerichostname'))
+class TestLoadJobs(unittest.TestCase):
+    def setUp(self):
+        self.app_path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.app_path, 'config'))
+        for name in ('ga.json', 'token.json', 'pp.json'):
+            with open(os.path.join(self.app_path, 'config', name), 'w') as f:
+                json.dump({'name': name}, f)
+        self.jobs_path = os.path.join(self.app_path, 'jobs')
+        with open(self.jobs_path, 'w') as f:
+            f.write('# a comment\n'
+                    '*/5 * * * *,slug-one,ga.json,token.json,pp.json\n'
+                    '0 3 * * *,slug-two,ga.json,token.json,pp.json\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.app_path)
+
+    def test_loads_every_job(self):
+        jobs = load_jobs(self.jobs_path, self.app_path)
+
+        assert_that([job.collector_slug for job in jobs],
+                    equal_to(['slug-one', 'slug-two']))
+        assert_that(jobs[0].credentials['name'], equal_to('ga.json'))
+
+    def test_config_files_are_read_once(self):
+        jobs = load_jobs(self.jobs_path, self.app_path)
+
+        assert jobs[0].credentials is jobs[1].credentials
+
+
+QUERY = {
+    'entrypoint': 'foo.collector',
+    'data-set': {'data-group': 'group', 'data-type': 'type'},
+    'query': {'metrics': ['visits']},
+    'options': {},
+}
+
+
+class TestJob(unittest.TestCase):
+    def setUp(self):
+        self.job = Job('* * * * *', 'some-slug', {'CLIENT_SECRETS': 'x'},
+                       {'token': 'y'}, {'backdrop_url': 'z'})
+
+    @patch('performanceplatform.collector.daemon.get_config')
+    @patch('performanceplatform.collector.daemon.run_collection')
+    def test_runs_collection_like_pp_collector(self, mock_run_collection,
+                                               mock_get_config):
+        mock_get_config.return_value = QUERY
+
+        self.job.run()
+
+        entrypoint, args = mock_run_collection.call_args[0]
+        assert_that(entrypoint, equal_to('foo.collector'))
+        assert_that(args.credentials, equal_to({'CLIENT_SECRETS': 'x'}))
+        assert_that(args.start_at, equal_to(None))
+        mock_get_config.assert_called_once_with(
+            'some-slug', {'backdrop_url': 'z'})
+
+    @patch('performanceplatform.collector.daemon.get_config')
+    @patch('performanceplatform.collector.daemon.run_collection')
+    def test_fetches_the_config_once(self, mock_run_collection,
+                                     mock_get_config):
+        mock_get_config.return_value = QUERY
+        mock_run_collection.side_effect = \
+            lambda entrypoint, args: args.query['options'].update(used=True)
+
+        self.job.run()
+        self.job.run()
+
+        assert_that(mock_get_config.call_count, equal_to(1))
+        assert_that(mock_run_collection.call_args[0][1].query,
+                    equal_to(dict(QUERY, options={'used': True})))
+        assert_that(self.job.query, equal_to(QUERY))
+
+    @patch('performanceplatform.collector.daemon.get_config')
+    @patch('performanceplatform.collector.daemon.run_collection')
+    def test_logs_with_the_fields_of_its_collector(self, mock_run_collection,
+                                                   mock_get_config):
+        mock_get_config.return_value = QUERY
+        records = []
+        handler = logging.Handler()
+        handler.addFilter(JobFieldsFilter())
+        handler.emit = records.append
+        mock_run_collection.side_effect = \
+            lambda entrypoint, args: logging.warning('collecting')
+        logging.getLogger().addHandler(handler)
+        try:
+            self.job.run()
+            logging.warning('between runs')
+        finally:
+            logging.getLogger().removeHandler(handler)
+
+        assert_that(records[0].collector, equal_to('some-slug'))
+        assert_that(records[0].data_group_data_type, equal_to('group/type'))
+        assert 'collector' not in records[1].__dict__
+
+    @patch('performanceplatform.collector.daemon.get_config')
+    @patch('performanceplatform.collector.daemon.run_collection')
+    def test_failures_do_not_escape(self, mock_run_collection,
+                                    mock_get_config):
+        mock_run_collection.side_effect = ValueError('broken collector')
+
+        self.job.run()
+
+        assert_that(self.job.running.acquire(False), equal_to(True))
+
+    @patch('performanceplatform.collector.daemon.run_collection')
+    def test_does_not_overlap_runs(self, mock_run_collection):
+        self.job.running.acquire()
+
+        self.job.run()
+
+        assert_that(mock_run_collection.called, equal_to(False))
+
+
+def test_run_due_jobs_only_runs_matching_jobs():
+    due, not_due = Mock(), Mock()
+    due.schedule.matches.return_value = True
+    not_due.schedule.matches.return_value = False
+    pool = Mock()
+
+    run_due_jobs([due, not_due], pool, datetime(2014, 4, 7, 9, 30))
+
+    pool.apply_async.assert_called_once_with(due.run)
@@ -4,7 +4,9 @@ import logging
 import json
 from performanceplatform.collector.logging_setup import (
     set_up_logging,
-    extra_fields_from_exception)
+    extra_fields_from_exception,
+    job_logging_fields,
+    JobFieldsFilter)
 import unittest
 
 
@@ -41,3 +43,15 @@ class TestJsonLogging(unittest.TestCase):
                 'exception_class': 'Exception',
                 'exception_message': 'test'
             }))
+
+    def test_job_logging_fields_are_added_until_the_job_ends(self):
+        def record():
+            record = logging.LogRecord(
+                'root', logging.INFO, __file__, 1, 'message', None, None)
+            JobFieldsFilter().filter(record)
+            return record
+
+        with job_logging_fields({'data_type': 'one'}):
+            assert_that(record().__dict__, has_entries({'data_type': 'one'}))
+
+        assert 'data_type' not in record().__dict__
@@ -2,6 +2,8 @@ from argparse import Namespace
 from hamcrest import assert_that, equal_to
 import mock
 import os
+import shutil
+import tempfile
 import unittest
 
 from performanceplatform.collector import main
@@ -45,6 +47,23 @@ class TestMain(unittest.TestCase):
         assert_that(merged['url'], equal_to('http://foo/data/group/type'))
         assert_that(merged['dry_run'], equal_to(True))
 
+    def test_merge_performanceplatform_config_with_force_push(self):
+        performanceplatform = {
+            'backdrop_url': 'http://foo/data',
+        }
+        data_set = {
+            'data-group': 'group',
+            'data-type': 'type'
+        }
+        token = {
+            'token': 'foo',
+        }
+
+        merged = main.merge_performanceplatform_config(
+            performanceplatform, data_set, token, force_push=True)
+
+        assert_that(merged['force_push'], equal_to(True))
+
     @mock.patch('performanceplatform.collector.main.'
                 '_log_collector_instead_of_running')
     @mock.patch('performanceplatform.collector.arguments.parse_args')
@@ -116,3 +135,177 @@ class TestMain(unittest.TestCase):
             assert mock_get_config.called
         except:
             pass
+
+    @mock.patch.dict(os.environ, {'DISABLE_COLLECTORS': 'false'})
+    @mock.patch('performanceplatform.collector.main.importlib')
+    @mock.patch('performanceplatform.collector.main.Pusher')
+    def test_resume_pushes_spooled_data_instead_of_collecting(
+            self, mock_pusher, mock_importlib):
+        args = Namespace(
+            query={
+                'entrypoint': 'foo.collector',
+                'data-set': {'data-group': 'group', 'data-type': 'type'},
+                'query': {},
+                'options': {'spool': True},
+            },
+            performanceplatform={'backdrop_url': 'http://foo/data'},
+            token={'token': 'foo'},
+            credentials={},
+            start_at=None,
+            end_at=None,
+            console_logging=True,
+            dry_run=False,
+            force_push=False,
+            resume=True,
+        )
+
+        main._run_collector('foo.collector', args)
+
+        assert_that(mock_pusher.call_args[0][1], equal_to({'spool': True}))
+        assert mock_pusher.return_value.resume.called
+        assert not mock_importlib.import_module.called
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write(self, name, contents):
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def _query(self, entrypoint, data_type, bearer_token=None):
+        data_set = {'data-group': 'group', 'data-type': data_type}
+        if bearer_token:
+            data_set['bearer_token'] = bearer_token
+        return {
+            'entrypoint': entrypoint,
+            'data-set': data_set,
+            'query': {},
+            'options': {},
+        }
+
+    def _args(self, batch):
+        return Namespace(
+            batch=batch,
+            batch_concurrency=2,
+            performanceplatform={'backdrop_url': 'http://foo/data'},
+            token={'token': 'from-file'},
+            credentials={'key': 'value'},
+            start_at=None,
+            end_at=None,
+            console_logging=True,
+            dry_run=False,
+            force_push=False,
+            resume=False,
+        )
+
+    @mock.patch('performanceplatform.collector.main.get_config')
+    def test_load_batch_reads_query_files_and_slugs(self, mock_get_config):
+        mock_get_config.return_value = {'from': 'stagecraft'}
+        query_file = self._write('query.json', '{"from": "file"}')
+        credentials_file = self._write('credentials.json', '{"user": "me"}')
+        token_file = self._write('token.json', '{"token": "mine"}')
+        batch = self._write(
+            'batch', '# a comment\n{}\n\nsome-slug, {}\n{},,{}\n'.format(
+                query_file, credentials_file, query_file, token_file))
+
+        jobs = main.load_batch(batch, {'url': 'foo'}, 2)
+
+        assert_that(jobs, equal_to([
+            ({'from': 'file', 'path_to_json_file': query_file}, None, None),
+            ({'from': 'stagecraft'},
+             {'user': 'me', 'path_to_json_file': credentials_file}, None),
+            ({'from': 'file', 'path_to_json_file': query_file}, None,
+             {'token': 'mine', 'path_to_json_file': token_file})]))
+        mock_get_config.assert_called_once_with('some-slug', {'url': 'foo'})
+
+    @mock.patch.dict(os.environ, {'DISABLE_COLLECTORS': 'false'})
+    @mock.patch('performanceplatform.collector.main.run_collection')
+    @mock.patch('performanceplatform.collector.main.get_config')
+    def test_run_batch_runs_every_collector(
+            self, mock_get_config, mock_run_collection):
+        mock_get_config.side_effect = lambda slug, _: {
+            'one': self._query('ga', 'one', bearer_token='secret'),
+            'two': self._query('pingdom', 'two'),
+        }[slug]
+        pingdom_credentials = self._write('pingdom.json', '{"user": "me"}')
+        pingdom_token = self._write('token.json', '{"token": "pingdom"}')
+        batch = self._write('batch', 'one\ntwo,{},{}\n'.format(
+            pingdom_credentials, pingdom_token))
+
+        assert main.run_batch(self._args(batch))
+
+        runs = {args.query['data-set']['data-type']: (entrypoint, args)
+                for entrypoint, args in
+                (c[0] for c in mock_run_collection.call_args_list)}
+        assert_that(runs['one'][0], equal_to('ga'))
+        # like a single run, the token file wins over Stagecraft's token
+        assert_that(runs['one'][1].token, equal_to({'token': 'from-file'}))
+        assert_that(runs['one'][1].credentials, equal_to({'key': 'value'}))
+        assert_that(runs['two'][0], equal_to('pingdom'))
+        assert_that(runs['two'][1].token, equal_to(
+            {'token': 'pingdom', 'path_to_json_file': pingdom_token}))
+        assert_that(runs['two'][1].credentials, equal_to(
+            {'user': 'me', 'path_to_json_file': pingdom_credentials}))
+
+    @mock.patch('performanceplatform.collector.main.run_collection')
+    @mock.patch('performanceplatform.collector.main.get_config')
+    def test_run_batch_rejects_sources_sharing_credentials(
+            self, mock_get_config, mock_run_collection):
+        mock_get_config.side_effect = lambda slug, _: {
+            'one': self._query('performanceplatform.collector.ga', 'one'),
+            'two': self._query('performanceplatform.collector.pingdom',
+                               'two'),
+        }[slug]
+        batch = self._write('batch', 'one\ntwo\n')
+
+        assert not main.run_batch(self._args(batch))
+        assert_that(mock_run_collection.called, equal_to(False))
+
+    @mock.patch.dict(os.environ, {'DISABLE_COLLECTORS': 'false'})
+    @mock.patch('performanceplatform.collector.main.run_collection')
+    @mock.patch('performanceplatform.collector.main.get_config')
+    def test_run_batch_needs_no_credentials_when_every_line_has_them(
+            self, mock_get_config, mock_run_collection):
+        mock_get_config.side_effect = lambda slug, _: self._query('ga', slug)
+        credentials = self._write('credentials.json', '{"user": "me"}')
+        token = self._write('token.json', '{"token": "mine"}')
+        batch = self._write('batch', 'one,{0},{1}\ntwo,{0},{1}\n'.format(
+            credentials, token))
+        args = self._args(batch)
+        args.credentials = args.token = None
+
+        assert main.run_batch(args)
+        assert_that(mock_run_collection.call_count, equal_to(2))
+
+    @mock.patch('performanceplatform.collector.main.run_collection')
+    @mock.patch('performanceplatform.collector.main.get_config')
+    def test_run_batch_rejects_lines_without_credentials_when_none_given(
+            self, mock_get_config, mock_run_collection):
+        mock_get_config.side_effect = lambda slug, _: self._query('ga', slug)
+        credentials = self._write('credentials.json', '{"user": "me"}')
+        batch = self._write('batch', 'one,{}\ntwo\n'.format(credentials))
+        args = self._args(batch)
+        args.credentials = None
+
+        assert not main.run_batch(args)
+        assert_that(mock_run_collection.called, equal_to(False))
+
+    @mock.patch.dict(os.environ, {'DISABLE_COLLECTORS': 'false'})
+    @mock.patch('performanceplatform.collector.main.run_collection')
+    @mock.patch('performanceplatform.collector.main.get_config')
+    def test_run_batch_carries_on_after_a_failure(
+            self, mock_get_config, mock_run_collection):
+        mock_get_config.side_effect = lambda slug, _: self._query('ga', slug)
+        mock_run_collection.side_effect = [Exception('boom'), None]
+        batch = self._write('batch', 'one\ntwo\n')
+
+        assert not main.run_batch(self._args(batch))
+        assert_that(mock_run_collection.call_count, equal_to(2))
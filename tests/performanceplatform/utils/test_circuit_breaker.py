@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hamcrest import assert_that, equal_to, is_
+from mock import patch
+from nose.tools import assert_raises
+import requests
+
+from performanceplatform.utils import requests_with_backoff
+from performanceplatform.utils.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, circuit_breaker_for)
+
+
+@patch('performanceplatform.utils.circuit_breaker.time.time')
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'host.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_opens_after_the_threshold(self, mock_time):
+        mock_time.return_value = 1000
+        breaker = CircuitBreaker('host', 3, path=self.path)
+
+        for _ in range(2):
+            breaker.record_failure()
+            breaker.check()
+        breaker.record_failure()
+
+        assert_raises(CircuitOpenError, breaker.check)
+
+    def test_successes_reset_the_count(self, mock_time):
+        mock_time.return_value = 1000
+        breaker = CircuitBreaker('host', 2, path=self.path)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        breaker.check()
+        assert_that(breaker.is_open(), is_(False))
+
+    def test_lets_one_probe_through_after_the_reset_time(self, mock_time):
+        mock_time.return_value = 1000
+        breaker = CircuitBreaker('host', 1, reset_seconds=60, path=self.path)
+        breaker.record_failure()
+
+        mock_time.return_value = 1061
+        breaker.check()
+        assert_raises(CircuitOpenError, breaker.check)
+
+        breaker.record_success()
+        breaker.check()
+        assert_that(breaker.is_open(), is_(False))
+
+    def test_a_failed_probe_opens_it_again(self, mock_time):
+        mock_time.return_value = 1000
+        breaker = CircuitBreaker('host', 1, reset_seconds=60, path=self.path)
+        breaker.record_failure()
+
+        mock_time.return_value = 1061
+        breaker.check()
+        breaker.record_failure()
+
+        mock_time.return_value = 1100
+        assert_raises(CircuitOpenError, breaker.check)
+
+    def test_processes_share_the_state_through_the_file(self, mock_time):
+        mock_time.return_value = 1000
+        CircuitBreaker('host', 1, path=self.path).record_failure()
+
+        assert_raises(CircuitOpenError,
+                      CircuitBreaker('host', 1, path=self.path).check)
+
+    def test_works_in_memory_without_a_path(self, mock_time):
+        mock_time.return_value = 1000
+        breaker = CircuitBreaker('host', 1)
+        breaker.record_failure()
+
+        assert_raises(CircuitOpenError, breaker.check)
+
+
+class TestCircuitBreakerFor(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_is_off_by_default(self):
+        assert_that(circuit_breaker_for('http://example.com/'), is_(None))
+
+    @patch('time.sleep')
+    @patch('performanceplatform.utils.requests_with_backoff.request')
+    def test_requests_fail_fast_once_the_circuit_opens(self, mock_request,
+                                                       mock_sleep):
+        unavailable = requests.Response()
+        unavailable.status_code = 503
+        mock_request.return_value = unavailable
+
+        with patch.dict(os.environ, {
+                'COLLECTOR_STATE_PATH': self.directory,
+                'COLLECTOR_CIRCUIT_BREAKER_THRESHOLD': '2'}):
+            breaker = circuit_breaker_for('http://example.com:8080/stats')
+            assert_that(breaker.name, equal_to('example.com:8080'))
+
+            assert_raises(requests.HTTPError, requests_with_backoff.get,
+                          'http://example.com:8080/stats')
+            assert_raises(CircuitOpenError, requests_with_backoff.get,
+                          'http://example.com:8080/other')
+
+        assert_that(mock_request.call_count, equal_to(2))
+        assert_that(mock_sleep.call_count, equal_to(1))
@@ -0,0 +1,242 @@
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+import mock
+import requests
+from hamcrest import assert_that, equal_to, has_entry, starts_with
+from nose.tools import assert_raises
+
+from performanceplatform.utils.collector import (
+    get_collector, get_config, prefetch_configs)
+
+PERFORMANCEPLATFORM = {
+    'stagecraft_url': 'http://stagecraft',
+    'omniscient_api_token': 'token',
+    'config_cache_ttl': 0,
+}
+
+COLLECTOR = {
+    'slug': 'some-collector',
+    'query': {'metrics': ['visits']},
+    'options': {},
+    'data_set': {'data_group': 'group', 'data_type': 'type'},
+    'entry_point': 'performanceplatform.collector.ga',
+    'provider': {'slug': 'ga'},
+}
+
+
+def _response(status_code, json=None, etag=None):
+    response = mock.Mock(status_code=status_code, headers={})
+    response.json.return_value = json
+    if etag:
+        response.headers['ETag'] = etag
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(
+            response=response)
+    return response
+
+
+@mock.patch('performanceplatform.utils.requests_with_backoff.request')
+class TestGetCollector(unittest.TestCase):
+    def setUp(self):
+        self.state_path = tempfile.mkdtemp()
+        self.environ = mock.patch.dict(
+            os.environ, {'COLLECTOR_STATE_PATH': self.state_path})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.state_path)
+
+    def test_get_config_translates_the_collector(self, mock_get):
+        mock_get.return_value = _response(200, COLLECTOR)
+
+        config = get_config('some-collector', PERFORMANCEPLATFORM)
+
+        assert_that(config['entrypoint'],
+                    equal_to('performanceplatform.collector.ga'))
+        assert_that(config['data-set'], has_entry('data-type', 'type'))
+        assert_that(config['token'], equal_to('ga'))
+
+    def test_does_not_cache_the_bearer_token(self, mock_get):
+        performanceplatform = dict(PERFORMANCEPLATFORM, config_cache_ttl=60)
+        collector = dict(COLLECTOR, data_set=dict(
+            COLLECTOR['data_set'], bearer_token='secret'))
+        mock_get.return_value = _response(200, collector)
+
+        assert_that(get_collector('some-collector', performanceplatform),
+                    equal_to(collector))
+        assert_that(get_collector('some-collector', performanceplatform),
+                    equal_to(COLLECTOR))
+
+        path = os.path.join(self.state_path, 'collector-config',
+                            'stagecraft', 'some-collector.json')
+        with open(path) as f:
+            assert_that('secret' in f.read(), equal_to(False))
+        assert_that(stat.S_IMODE(os.stat(path).st_mode), equal_to(0o600))
+
+    def test_keeps_the_copies_from_each_stagecraft_apart(self, mock_get):
+        staging = dict(PERFORMANCEPLATFORM, config_cache_ttl=60,
+                       stagecraft_url='http://staging:8080')
+        production = dict(PERFORMANCEPLATFORM, config_cache_ttl=60)
+        mock_get.return_value = _response(200, dict(COLLECTOR, query={}))
+        get_collector('some-collector', staging)
+        mock_get.return_value = _response(200, COLLECTOR)
+        get_collector('some-collector', production)
+
+        assert_that(get_collector('some-collector', staging)['query'],
+                    equal_to({}))
+        assert_that(get_collector('some-collector', production),
+                    equal_to(COLLECTOR))
+        assert_that(mock_get.call_count, equal_to(2))
+
+    def test_revalidates_the_cached_copy_with_its_etag(self, mock_get):
+        mock_get.return_value = _response(200, COLLECTOR, etag='"v1"')
+        get_collector('some-collector', PERFORMANCEPLATFORM)
+
+        mock_get.return_value = _response(304)
+        collector = get_collector('some-collector', PERFORMANCEPLATFORM)
+
+        assert_that(collector, equal_to(COLLECTOR))
+        headers = mock_get.call_args[1]['headers']
+        assert_that(headers, has_entry('If-None-Match', '"v1"'))
+
+    def test_uses_the_cached_copy_within_the_ttl(self, mock_get):
+        performanceplatform = dict(PERFORMANCEPLATFORM, config_cache_ttl=60)
+        mock_get.return_value = _response(200, COLLECTOR)
+        get_collector('some-collector', performanceplatform)
+
+        collector = get_collector('some-collector', performanceplatform)
+
+        assert_that(collector, equal_to(COLLECTOR))
+        assert_that(mock_get.call_count, equal_to(1))
+
+    def test_uses_the_cached_copy_for_an_hour_by_default(self, mock_get):
+        performanceplatform = dict(PERFORMANCEPLATFORM)
+        del performanceplatform['config_cache_ttl']
+        mock_get.return_value = _response(200, COLLECTOR)
+        get_collector('some-collector', performanceplatform)
+
+        with mock.patch('performanceplatform.utils.collector.time.time',
+                        return_value=time.time() + 3599):
+            get_collector('some-collector', performanceplatform)
+        assert_that(mock_get.call_count, equal_to(1))
+
+        with mock.patch('performanceplatform.utils.collector.time.time',
+                        return_value=time.time() + 3601):
+            get_collector('some-collector', performanceplatform)
+        assert_that(mock_get.call_count, equal_to(2))
+
+    def test_refetches_once_the_ttl_has_passed(self, mock_get):
+        performanceplatform = dict(PERFORMANCEPLATFORM, config_cache_ttl=60)
+        mock_get.return_value = _response(200, COLLECTOR)
+        get_collector('some-collector', performanceplatform)
+
+        with mock.patch('performanceplatform.utils.collector.time.time',
+                        return_value=time.time() + 61):
+            get_collector('some-collector', performanceplatform)
+
+        assert_that(mock_get.call_count, equal_to(2))
+
+    def test_falls_back_to_the_cached_copy_when_stagecraft_is_down(
+            self, mock_get):
+        mock_get.return_value = _response(200, COLLECTOR)
+        get_collector('some-collector', PERFORMANCEPLATFORM)
+
+        mock_get.side_effect = requests.Timeout()
+        assert_that(get_collector('some-collector', PERFORMANCEPLATFORM),
+                    equal_to(COLLECTOR))
+
+        mock_get.side_effect = None
+        mock_get.return_value = _response(503)
+        assert_that(get_collector('some-collector', PERFORMANCEPLATFORM),
+                    equal_to(COLLECTOR))
+
+    def test_sends_the_same_headers_as_the_client(self, mock_get):
+        mock_get.return_value = _response(200, COLLECTOR)
+
+        get_collector('some-collector', PERFORMANCEPLATFORM)
+
+        headers = mock_get.call_args[1]['headers']
+        assert_that(headers, has_entry('Authorization', 'Bearer token'))
+        assert_that(headers, has_entry('Govuk-Request-Id', 'Not-Set'))
+        assert_that(headers['User-Agent'],
+                    starts_with('Performance Platform Client '))
+
+    @mock.patch('performanceplatform.utils.requests_with_backoff.time.sleep')
+    def test_retries_failures_when_nothing_is_cached(self, mock_sleep,
+                                                     mock_get):
+        mock_get.side_effect = [_response(502), _response(200, COLLECTOR)]
+
+        assert_that(get_collector('some-collector', PERFORMANCEPLATFORM),
+                    equal_to(COLLECTOR))
+        assert_that(mock_get.call_count, equal_to(2))
+
+    @mock.patch('performanceplatform.utils.requests_with_backoff.time.sleep')
+    def test_does_not_retry_failures_when_a_copy_is_cached(self, mock_sleep,
+                                                           mock_get):
+        mock_get.return_value = _response(200, COLLECTOR)
+        get_collector('some-collector', PERFORMANCEPLATFORM)
+
+        mock_get.return_value = _response(502)
+        assert_that(get_collector('some-collector', PERFORMANCEPLATFORM),
+                    equal_to(COLLECTOR))
+        assert_that(mock_get.call_count, equal_to(2))
+        assert_that(mock_sleep.called, equal_to(False))
+
+    def test_does_not_hide_client_errors(self, mock_get):
+        mock_get.return_value = _response(200, COLLECTOR)
+        get_collector('some-collector', PERFORMANCEPLATFORM)
+
+        mock_get.return_value = _response(404)
+        assert_raises(requests.HTTPError, get_collector,
+                      'some-collector', PERFORMANCEPLATFORM)
+
+    def test_raises_when_nothing_is_cached(self, mock_get):
+        mock_get.side_effect = requests.ConnectionError()
+
+        assert_raises(requests.ConnectionError, get_collector,
+                      'some-collector', PERFORMANCEPLATFORM)
+
+    @mock.patch('performanceplatform.utils.collector.CollectorAPI')
+    def test_prefetch_caches_every_collector(self, mock_api, mock_get):
+        mock_api.return_value.list_collectors.return_value = [
+            COLLECTOR, dict(COLLECTOR, slug='another-collector')]
+
+        assert_that(prefetch_configs(PERFORMANCEPLATFORM), equal_to(2))
+
+        mock_get.side_effect = requests.ConnectionError()
+        assert_that(get_collector('another-collector', PERFORMANCEPLATFORM),
+                    has_entry('slug', 'another-collector'))
+
+    @mock.patch('performanceplatform.utils.collector.CollectorAPI')
+    def test_prefetched_collectors_give_the_same_config(self, mock_api,
+                                                        mock_get):
+        mock_get.return_value = _response(200, COLLECTOR)
+        fetched = get_config('some-collector', PERFORMANCEPLATFORM)
+        shutil.rmtree(os.path.join(self.state_path, 'collector-config'))
+        mock_api.return_value.list_collectors.return_value = [COLLECTOR]
+        prefetch_configs(PERFORMANCEPLATFORM)
+
+        mock_get.side_effect = requests.ConnectionError()
+        assert_that(get_config('some-collector', PERFORMANCEPLATFORM),
+                    equal_to(fetched))
+
+    @mock.patch('performanceplatform.utils.collector.CollectorAPI')
+    def test_prefetch_fetches_incomplete_collectors_on_their_own(
+            self, mock_api, mock_get):
+        mock_api.return_value.list_collectors.return_value = [
+            {'slug': 'some-collector', 'data_set': 'group-type'}]
+        mock_get.return_value = _response(200, COLLECTOR)
+
+        assert_that(prefetch_configs(PERFORMANCEPLATFORM), equal_to(1))
+
+        assert_that(mock_get.call_args[0][1],
+                    equal_to('http://stagecraft/collector/some-collector'))
+        mock_get.side_effect = requests.ConnectionError()
+        assert_that(get_collector('some-collector', PERFORMANCEPLATFORM),
+                    equal_to(COLLECTOR))
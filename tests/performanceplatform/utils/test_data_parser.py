@@ -19,7 +19,8 @@ from nose.tools import (
 from performanceplatform.utils.data_parser import \
     build_document, build_document_set, \
     apply_key_mapping, map_multi_value_fields, \
-    DataParser, get_string_for_data_id, value_id
+    DataParser, DocumentBuilder, get_string_for_data_id, run_plugins, \
+    value_id
 
 from performanceplatform.collector.ga.core import \
     build_document_set as ga_build_document_set
@@ -316,6 +317,26 @@ def test_plugin():
     assert_not_in("customVarValue9", result[0])
 
 
+def test_run_plugins_streams_when_every_plugin_can():
+    documents = iter([{'a': 1, 'visits': 1}, {'a': 1, 'visits': 2}])
+
+    streamed = run_plugins(['RemoveKey("visits")', 'ComputeIdFrom("a")'],
+                           documents)
+
+    assert_that(isinstance(streamed, list), is_(False))
+    assert_that(next(streamed), has_entries({'a': 1, 'humanId': '1'}))
+
+
+def test_run_plugins_collects_documents_for_plugins_which_need_them_all():
+    documents = iter([{'a': 1, 'visits': 1}, {'a': 1, 'visits': 2}])
+
+    aggregated = run_plugins(['AggregateKey(aggregate_count("visits"))',
+                              'ComputeIdFrom("a")'], documents)
+
+    assert_that(aggregated, equal_to([
+        {'a': 1, 'visits': 3, '_id': 'MQ==', 'humanId': '1'}]))
+
+
 def test_data_type_defaults_to_passed_in_data_type():
     data = [{
         "metrics": {"visits": "12345"},
@@ -372,3 +393,54 @@ def test_build_document_set_handles_big_numbers():
     assert_that(
         calling(build_document_set).with_args(results, '', {}, special_fields),
         is_not(raises(ValueError)))
+
+
+def test_document_builder_builds_the_same_documents_as_before():
+    mappings = {
+        'customVarValue1': 'name',
+        'customVarValue1_0': 'first',
+        'customVarValue1_1': 'second',
+        'visits': 'count',
+    }
+    items = [
+        {'dimensions': {'customVarValue1': 'a:b', 'browser': 'Firefox'},
+         'start_date': date(2014, 1, 6)},
+        {'dimensions': {'customVarValue1': 'c', 'browser': 'Chrome'},
+         'start_date': date(2014, 1, 13)},
+    ]
+    special_fields = [{'visits': 1, 'timeSpan': 'week'},
+                      {'visits': 2, 'timeSpan': 'week'}]
+    builder = DocumentBuilder('browsers', mappings,
+                              additionalFields={'department': 'dft'})
+
+    docs = builder.build_all(items, special_fields)
+
+    def build_by_hand(item, special):
+        doc = dict({'_timestamp': dt(item['start_date'].year,
+                                     item['start_date'].month,
+                                     item['start_date'].day, 0, 0, 0, 'UTC'),
+                    'dataType': 'browsers',
+                    'department': 'dft'}.items() +
+                   item['dimensions'].items() + special.items())
+        doc = apply_key_mapping(mappings, doc)
+        _id, human_id = value_id(get_string_for_data_id(
+            'browsers', doc['_timestamp'], 'week',
+            item['dimensions'].values()))
+        doc.update(_id=_id, humanId=human_id)
+        return doc
+
+    assert_that(docs, equal_to([build_by_hand(item, special)
+                                for item, special
+                                in zip(items, special_fields)]))
+    assert_that(docs[0], has_entries({'name': 'a:b', 'first': 'a',
+                                      'second': 'b', 'count': 1}))
+    assert_that(docs[1], is_not(has_entries({'second': 'b'})))
+
+
+def test_document_builder_uses_id_mapping():
+    builder = DocumentBuilder('test', idMapping=['a', 'b'])
+
+    doc = builder.build({'dimensions': {'a': u'1', 'b': u'2'},
+                         'start_date': date(2014, 1, 6)})
+
+    assert_that(doc['humanId'], equal_to('12'))
@@ -1,8 +1,18 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 from performanceplatform.utils.data_pusher import \
-    Pusher
-from mock import patch, Mock
-from hamcrest import assert_that, equal_to
+    Pusher, AdaptiveChunker
+from mock import patch, Mock, call
+from hamcrest import assert_that, equal_to, contains_inanyorder
+from requests import Response
+from requests.exceptions import ConnectionError, HTTPError
 
 
 @patch('performanceplatform.utils.data_pusher.DataSet.from_config')
@@ -47,3 +57,405 @@ class TestPusher(unittest.TestCase):
         Pusher(self.data_set_config, {}).push(self.data)
         assert_that(mock_data_set_client.empty_data_set.called,
                     equal_to(False))
+
+    def test_pushes_a_stream_of_documents(self, mock_from_config):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        Pusher(self.data_set_config, {}).push(
+            doc for doc in [{'a': 1}, {'a': 2}])
+        args, kwargs = mock_data_set_client.post.call_args
+        assert_that(list(args[0]), equal_to([{'a': 1}, {'a': 2}]))
+        assert_that(kwargs, equal_to({'chunk_size': 100}))
+
+    def test_pushes_nothing_when_empty_stream(self, mock_from_config):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        Pusher(self.data_set_config, {'empty-data-set': True}).push(
+            doc for doc in [])
+        assert_that(mock_data_set_client.post.called, equal_to(False))
+        assert_that(mock_data_set_client.empty_data_set.called,
+                    equal_to(False))
+
+    def test_pushes_chunks_concurrently(self, mock_from_config):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        data = [{'a': i} for i in range(5)]
+        Pusher(self.data_set_config,
+               {'chunk-size': 2, 'push-concurrency': 3}).push(data)
+        assert_that(mock_data_set_client.post.call_args_list,
+                    contains_inanyorder(
+                        call([{'a': 0}, {'a': 1}]),
+                        call([{'a': 2}, {'a': 3}]),
+                        call([{'a': 4}])))
+
+    def test_empties_data_set_before_concurrent_push(self, mock_from_config):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        Pusher(self.data_set_config,
+               {'empty-data-set': True, 'push-concurrency': 2}).push(
+            [{'a': 1}])
+        assert_that(mock_data_set_client.method_calls[0],
+                    equal_to(call.empty_data_set()))
+
+    @patch('time.sleep')
+    def test_retries_only_the_failed_chunk(self, mock_sleep,
+                                           mock_from_config):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        attempts = []
+
+        def post(chunk):
+            attempts.append(chunk)
+            if chunk == [{'a': 1}] and attempts.count(chunk) == 1:
+                raise ConnectionError('connection reset')
+
+        mock_data_set_client.post.side_effect = post
+        Pusher(self.data_set_config,
+               {'chunk-size': 1, 'push-concurrency': 2}).push(
+            [{'a': 0}, {'a': 1}, {'a': 2}])
+        assert_that(attempts, contains_inanyorder(
+            [{'a': 0}], [{'a': 1}], [{'a': 1}], [{'a': 2}]))
+        # the thread pool also sleeps while it waits for work
+        assert_that(mock_sleep.call_args_list.count(call(10)), equal_to(1))
+
+    @patch('time.sleep')
+    def test_does_not_retry_rejected_chunk(self, mock_sleep,
+                                           mock_from_config):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        response = Response()
+        response.status_code = 400
+        mock_data_set_client.post.side_effect = HTTPError(response=response)
+        pusher = Pusher(self.data_set_config, {'push-concurrency': 2})
+        self.assertRaises(HTTPError, pusher.push, [{'a': 0}])
+        assert_that(mock_data_set_client.post.call_count, equal_to(1))
+
+    def _push_with_rejected_chunk(self, mock_from_config, rejected):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        response = Response()
+        response.status_code = 400
+
+        def post(chunk):
+            if chunk == [{'a': rejected}]:
+                raise HTTPError(response=response)
+
+        mock_data_set_client.post.side_effect = post
+        raised = []
+
+        def push():
+            try:
+                Pusher(self.data_set_config,
+                       {'chunk-size': 1, 'push-concurrency': 2}).push(
+                    [{'a': i} for i in range(50)])
+            except HTTPError as e:
+                raised.append(e)
+
+        # A push which hangs rather than raising must not hang the tests
+        pushing = threading.Thread(target=push)
+        pushing.daemon = True
+        pushing.start()
+        pushing.join(10)
+
+        assert_that(pushing.is_alive(), equal_to(False))
+        assert_that(len(raised), equal_to(1))
+
+    def test_raises_when_a_middle_chunk_is_rejected(self, mock_from_config):
+        self._push_with_rejected_chunk(mock_from_config, 25)
+
+    def test_raises_when_the_first_chunk_is_rejected(self, mock_from_config):
+        self._push_with_rejected_chunk(mock_from_config, 0)
+
+    def test_pushes_chunks_by_size_in_bytes(self, mock_from_config):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        data = [{'a': 'x' * 100}, {'a': 'y' * 100}, {'a': 'z' * 10}]
+        Pusher(self.data_set_config, {'chunk-bytes': 150}).push(data)
+        assert_that(mock_data_set_client.post.call_args_list, equal_to([
+            call([{'a': 'x' * 100}]),
+            call([{'a': 'y' * 100}, {'a': 'z' * 10}]),
+        ]))
+
+    def test_splits_chunk_rejected_as_too_large(self, mock_from_config):
+        mock_data_set_client = Mock()
+        mock_from_config.return_value = mock_data_set_client
+        response = Response()
+        response.status_code = 413
+
+        def post(chunk):
+            if len(chunk) > 1:
+                raise HTTPError(response=response)
+
+        mock_data_set_client.post.side_effect = post
+        pusher = Pusher(self.data_set_config, {'chunk-bytes': 64 * 1024})
+        pusher.push([{'a': 1}, {'a': 2}])
+        assert_that(mock_data_set_client.post.call_args_list, equal_to([
+            call([{'a': 1}, {'a': 2}]),
+            call([{'a': 1}]),
+            call([{'a': 2}]),
+        ]))
+        # halved for the rejection, then grown by half for each success
+        assert_that(pusher.chunker.target_bytes,
+                    equal_to(64 * 1024 * 9 // 8))
+
+
+class TestAdaptiveChunker(unittest.TestCase):
+    def test_grows_target_when_requests_are_fast(self):
+        chunker = AdaptiveChunker(100 * 1024)
+        chunker.record_success(0.5)
+        assert_that(chunker.target_bytes, equal_to(150 * 1024))
+
+    def test_shrinks_target_when_requests_are_slow(self):
+        chunker = AdaptiveChunker(100 * 1024)
+        chunker.record_success(30)
+        assert_that(chunker.target_bytes, equal_to(50 * 1024))
+
+    def test_keeps_target_when_requests_are_steady(self):
+        chunker = AdaptiveChunker(100 * 1024)
+        chunker.record_success(5)
+        assert_that(chunker.target_bytes, equal_to(100 * 1024))
+
+    def test_does_not_shrink_below_minimum(self):
+        chunker = AdaptiveChunker(20 * 1024)
+        chunker.record_failure()
+        chunker.record_failure()
+        assert_that(chunker.target_bytes, equal_to(16 * 1024))
+
+    def test_always_puts_a_document_in_a_chunk(self):
+        chunker = AdaptiveChunker(1)
+        assert_that(list(chunker.chunks([{'a': 1}, {'a': 2}])),
+                    equal_to([[{'a': 1}], [{'a': 2}]]))
+
+
+@patch('performanceplatform.utils.data_pusher.DataSet.from_config')
+class TestPusherSkipUnchanged(unittest.TestCase):
+    def setUp(self):
+        self.state_path = tempfile.mkdtemp()
+        self.patcher = patch.dict(
+            os.environ, {'COLLECTOR_STATE_PATH': self.state_path})
+        self.patcher.start()
+        self.data_set_config = {'data-group': 'group', 'data-type': 'type'}
+        self.options = {'skip-unchanged': True}
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.state_path)
+
+    def test_only_pushes_changed_documents(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+        Pusher(self.data_set_config, self.options).push(
+            [{'_id': 'a', 'count': 1}, {'_id': 'b', 'count': 1}])
+        mock_data_set_client.post.reset_mock()
+
+        Pusher(self.data_set_config, self.options).push(
+            [{'_id': 'a', 'count': 1}, {'_id': 'b', 'count': 2}])
+
+        mock_data_set_client.post.assert_called_once_with(
+            [{'_id': 'b', 'count': 2}])
+
+    def test_pushes_nothing_when_nothing_changed(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+        Pusher(self.data_set_config, self.options).push([{'_id': 'a'}])
+        mock_data_set_client.post.reset_mock()
+
+        Pusher(self.data_set_config, self.options).push([{'_id': 'a'}])
+
+        assert_that(mock_data_set_client.post.called, equal_to(False))
+
+    def test_dry_run_does_not_record_pushes(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+        dry_run_config = dict(self.data_set_config, dry_run=True)
+        Pusher(dry_run_config, self.options).push([{'_id': 'a', 'v': 1}])
+        mock_data_set_client.post.reset_mock()
+
+        Pusher(self.data_set_config, self.options).push(
+            [{'_id': 'a', 'v': 1}])
+
+        mock_data_set_client.post.assert_called_once_with(
+            [{'_id': 'a', 'v': 1}])
+
+    def test_does_not_record_failed_pushes(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+        response = Response()
+        response.status_code = 400
+        mock_data_set_client.post.side_effect = HTTPError(response=response)
+        pusher = Pusher(self.data_set_config, self.options)
+        self.assertRaises(HTTPError, pusher.push, [{'_id': 'a'}])
+        mock_data_set_client.post.side_effect = None
+        mock_data_set_client.post.reset_mock()
+
+        Pusher(self.data_set_config, self.options).push([{'_id': 'a'}])
+
+        mock_data_set_client.post.assert_called_once_with([{'_id': 'a'}])
+
+    @patch('performanceplatform.utils.data_pusher.PushIndex')
+    def test_closes_the_push_index_after_each_push(self, mock_push_index,
+                                                   mock_from_config):
+        mock_from_config.return_value.post.side_effect = [
+            HTTPError(response=Response()), None]
+        index = mock_push_index.return_value.__enter__.return_value
+        index.changed.side_effect = lambda documents: documents
+        pusher = Pusher(self.data_set_config, self.options)
+
+        self.assertRaises(HTTPError, pusher.push, [{'_id': 'a'}])
+        pusher.push([{'_id': 'a'}])
+
+        assert_that(mock_push_index.return_value.__exit__.call_count,
+                    equal_to(2))
+        assert_that(pusher.push_index, equal_to(None))
+        index.record.assert_called_once_with([{'_id': 'a'}])
+
+    def test_force_push_sends_everything(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+        Pusher(self.data_set_config, self.options).push([{'_id': 'a'}])
+        mock_data_set_client.post.reset_mock()
+
+        forced_config = dict(self.data_set_config, force_push=True)
+        Pusher(forced_config, self.options).push([{'_id': 'a'}])
+
+        mock_data_set_client.post.assert_called_once_with([{'_id': 'a'}])
+
+    def test_emptying_data_set_pushes_everything(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+        Pusher(self.data_set_config, self.options).push([{'_id': 'a'}])
+        mock_data_set_client.post.reset_mock()
+
+        Pusher(self.data_set_config,
+               dict(self.options, **{'empty-data-set': True})).push(
+            [{'_id': 'a'}])
+
+        mock_data_set_client.post.assert_called_once_with([{'_id': 'a'}])
+
+
+@patch('performanceplatform.utils.data_pusher.DataSet.from_config')
+class TestPusherSpool(unittest.TestCase):
+    def setUp(self):
+        self.state_path = tempfile.mkdtemp()
+        self.patcher = patch.dict(
+            os.environ, {'COLLECTOR_STATE_PATH': self.state_path})
+        self.patcher.start()
+        self.data_set_config = {'data-group': 'group', 'data-type': 'type'}
+        self.options = {'spool': True, 'chunk-size': 1}
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.state_path)
+
+    def _fail_on(self, mock_data_set_client, failing_chunk):
+        response = Response()
+        response.status_code = 400
+
+        def post(chunk):
+            if chunk == failing_chunk:
+                raise HTTPError(response=response)
+
+        mock_data_set_client.post.side_effect = post
+
+    def test_removes_spool_after_successful_push(self, mock_from_config):
+        Pusher(self.data_set_config, self.options).push([{'a': 1}])
+
+        assert_that(os.listdir(os.path.join(self.state_path, 'spool',
+                                            'group')),
+                    equal_to([]))
+
+    def test_resume_sends_only_unacknowledged_chunks(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+        self._fail_on(mock_data_set_client, [{'a': 3}])
+        pusher = Pusher(self.data_set_config, self.options)
+        self.assertRaises(HTTPError, pusher.push,
+                          [{'a': 1}, {'a': 2}, {'a': 3}])
+        mock_data_set_client.post.side_effect = None
+        mock_data_set_client.post.reset_mock()
+
+        Pusher(self.data_set_config, self.options).resume()
+
+        assert_that(mock_data_set_client.post.call_args_list,
+                    equal_to([call([{'a': 3}])]))
+
+    def test_resume_does_not_empty_data_set_twice(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+        self._fail_on(mock_data_set_client, [{'a': 1}])
+        options = dict(self.options, **{'empty-data-set': True})
+        pusher = Pusher(self.data_set_config, options)
+        self.assertRaises(HTTPError, pusher.push, [{'a': 1}])
+        mock_data_set_client.post.side_effect = None
+
+        Pusher(self.data_set_config, options).resume()
+
+        assert_that(mock_data_set_client.empty_data_set.call_count,
+                    equal_to(1))
+
+    def test_resume_with_nothing_spooled(self, mock_from_config):
+        mock_data_set_client = mock_from_config.return_value
+
+        Pusher(self.data_set_config, {}).resume()
+
+        assert_that(mock_data_set_client.post.called, equal_to(False))
+
+
+class StandInBackdrop(object):
+    """
+    A local HTTP server which records the headers and decoded JSON body of
+    every request it receives.
+    """
+
+    def __init__(self):
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.GzipFile(fileobj=BytesIO(body)).read()
+                stand_in.requests.append((self.headers, json.loads(body)))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write('{"status": "ok"}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/group/type'.format(
+            self.server.server_address[1])
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestPusherCompression(unittest.TestCase):
+    def setUp(self):
+        self.backdrop = StandInBackdrop()
+        self.data_set_config = {
+            'url': self.backdrop.url,
+            'token': 'some-token',
+            'dry_run': False,
+        }
+        self.data = [{'_id': 'id-{}'.format(i), 'dataType': 'browsers'}
+                     for i in range(100)]
+
+    def tearDown(self):
+        self.backdrop.stop()
+
+    def test_sends_gzipped_json_by_default(self):
+        Pusher(self.data_set_config, {}).push(self.data)
+
+        [(headers, body)] = self.backdrop.requests
+        assert_that(headers['Content-Encoding'], equal_to('gzip'))
+        assert_that(body, equal_to(self.data))
+
+    def test_sends_plain_json_when_gzip_is_off(self):
+        Pusher(self.data_set_config, {'gzip': False}).push(self.data)
+
+        [(headers, body)] = self.backdrop.requests
+        assert_that(headers.get('Content-Encoding'), equal_to(None))
+        assert_that(body, equal_to(self.data))
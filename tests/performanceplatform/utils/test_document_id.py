@@ -0,0 +1,69 @@
+# encoding: utf-8
+import logging
+from datetime import datetime
+
+import pytz
+from hamcrest import assert_that, equal_to
+from mock import patch
+
+from performanceplatform.utils.document_id import (
+    TimestampFormatter, format_timestamp, value_id, value_ids)
+
+
+def test_timestamp_formatter_formats_like_format_timestamp():
+    format_once = TimestampFormatter()
+    london = pytz.timezone('Europe/London')
+    timestamps = [
+        datetime(2014, 1, 6, tzinfo=pytz.UTC),
+        london.localize(datetime(2014, 7, 1)),
+        datetime(2014, 1, 6, tzinfo=pytz.UTC),
+    ]
+
+    assert_that([format_once(timestamp) for timestamp in timestamps],
+                equal_to([format_timestamp(timestamp)
+                          for timestamp in timestamps]))
+
+
+@patch('performanceplatform.utils.document_id.format_timestamp')
+def test_timestamp_formatter_formats_each_timestamp_once(mock_format):
+    mock_format.return_value = '20140106000000'
+    format_once = TimestampFormatter()
+
+    for _ in range(3):
+        format_once(datetime(2014, 1, 6, tzinfo=pytz.UTC))
+
+    assert_that(mock_format.call_count, equal_to(1))
+
+
+@patch('performanceplatform.utils.document_id.format_timestamp')
+def test_timestamp_formatter_keeps_naive_and_aware_timestamps_apart(
+        mock_format):
+    format_once = TimestampFormatter()
+
+    format_once(datetime(2014, 1, 6))
+    format_once(datetime(2014, 1, 6, tzinfo=pytz.UTC))
+
+    assert_that(mock_format.call_count, equal_to(2))
+
+
+def test_value_ids_match_value_id():
+    values = [u'visits_20140106000000_week', u'pågående_20140106000000']
+
+    assert_that(value_ids(values),
+                equal_to([value_id(value) for value in values]))
+
+
+@patch('logging.debug')
+def test_value_ids_only_log_when_debugging(mock_debug):
+    logger = logging.getLogger()
+    level = logger.level
+    try:
+        logger.setLevel(logging.INFO)
+        value_ids([u'a', u'b'])
+        assert_that(mock_debug.call_count, equal_to(0))
+
+        logger.setLevel(logging.DEBUG)
+        value_ids([u'a', u'b'])
+        assert_that(mock_debug.call_count, equal_to(2))
+    finally:
+        logger.setLevel(level)
@@ -2,8 +2,10 @@ from mock import patch, call
 from nose.tools import assert_equal
 from performanceplatform.utils.http_with_backoff import HttpWithBackoff
 from performanceplatform.utils.http_with_backoff import parse_reason
+from performanceplatform.utils.retry_policy import ExponentialBackoff
 from httplib2 import Response
 import logging
+import threading
 
 
 @patch('time.sleep')
@@ -443,3 +445,73 @@ class TestHttpWithBackoff(object):
   "message": "Invalid value '-1' for max-results. Value must be within the range: [1, 1000]"
  }
 }"""), 'invalidParameter')
+
+    def test_connections_are_not_shared_between_threads(self):
+        http = HttpWithBackoff()
+        http.connections['https:example.com'] = 'main thread connection'
+        seen_in_thread = []
+
+        thread = threading.Thread(
+            target=lambda: seen_in_thread.append(dict(http.connections)))
+        thread.start()
+        thread.join()
+
+        assert_equal(seen_in_thread, [{}])
+        assert_equal(http.connections,
+                     {'https:example.com': 'main thread connection'})
+
+    @patch('performanceplatform.utils.http_with_backoff.Http.request')
+    @patch('time.sleep')
+    def test_rate_limiter_is_called_before_every_attempt(self,
+                                                         mock_sleep,
+                                                         mock_request):
+        limited = []
+        rate_limited_response = Response({})
+        rate_limited_response.status = 403
+        ok_response = Response({})
+        ok_response.status = 200
+        mock_request.side_effect = [
+            (rate_limited_response,
+             google_error_response(403, 'userRateLimitExceeded')),
+            (ok_response, 'some content')]
+
+        HttpWithBackoff(rate_limiter=limited.append).request(
+            'http://fake.com/?ids=ga%3A123')
+
+        assert_equal(limited, ['http://fake.com/?ids=ga%3A123'] * 2)
+
+    @patch('performanceplatform.utils.http_with_backoff.Http.request')
+    @patch('time.sleep')
+    def test_request_waits_as_long_as_retry_after_asks(self,
+                                                       mock_sleep,
+                                                       mock_request):
+        rate_limited_response = Response({'retry-after': '90'})
+        rate_limited_response.status = 403
+        ok_response = Response({})
+        ok_response.status = 200
+        mock_request.side_effect = [
+            (rate_limited_response,
+             google_error_response(403, 'quotaExceeded')),
+            (ok_response, 'some content')]
+
+        HttpWithBackoff().request('http://fake.com')
+
+        assert_equal([call(90)], mock_sleep.call_args_list)
+
+    @patch('performanceplatform.utils.http_with_backoff.Http.request')
+    @patch('time.sleep')
+    def test_request_uses_the_backoff_policy_it_is_given(self,
+                                                         mock_sleep,
+                                                         mock_request):
+        rate_limited_response = Response({})
+        rate_limited_response.status = 403
+        mock_request.return_value = (
+            rate_limited_response,
+            google_error_response(403, 'quotaExceeded'))
+
+        HttpWithBackoff(
+            backoff_policy=ExponentialBackoff(base=1, factor=3, max_delay=5)
+        ).request('http://fake.com')
+
+        assert_equal([call(1), call(3), call(5), call(5), call(5)],
+                     mock_sleep.call_args_list)
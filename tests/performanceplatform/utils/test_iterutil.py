@@ -0,0 +1,28 @@
+from hamcrest import assert_that, is_
+
+from performanceplatform.utils.iterutil import chunks, peek
+
+
+def test_chunks_reads_lazily():
+    consumed = []
+
+    def numbers():
+        for number in range(10):
+            consumed.append(number)
+            yield number
+
+    first_chunk = next(chunks(numbers(), 3))
+
+    assert_that(first_chunk, is_([0, 1, 2]))
+    assert_that(consumed, is_([0, 1, 2]))
+
+
+def test_chunks_of_empty_iterable():
+    assert_that(list(chunks([], 3)), is_([]))
+
+
+def test_peek_keeps_first_item():
+    has_items, items = peek(x for x in 'abc')
+
+    assert_that(has_items, is_(True))
+    assert_that(list(items), is_(['a', 'b', 'c']))
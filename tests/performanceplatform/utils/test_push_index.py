@@ -0,0 +1,56 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from hamcrest import assert_that, equal_to
+
+from performanceplatform.utils.push_index import PushIndex
+
+
+class TestPushIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'index.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_everything_has_changed_at_first(self):
+        documents = [{'_id': 'a', 'count': 1}, {'_id': 'b', 'count': 2}]
+
+        changed = list(PushIndex(self.path).changed(documents))
+
+        assert_that(changed, equal_to(documents))
+
+    def test_skips_documents_which_have_not_changed(self):
+        PushIndex(self.path).record(
+            [{'_id': 'a', 'count': 1}, {'_id': 'b', 'count': 2}])
+
+        changed = list(PushIndex(self.path).changed(
+            [{'_id': 'a', 'count': 1}, {'_id': 'b', 'count': 3}]))
+
+        assert_that(changed, equal_to([{'_id': 'b', 'count': 3}]))
+
+    def test_documents_without_an_id_are_always_changed(self):
+        index = PushIndex(self.path)
+        index.record([{'count': 1}])
+
+        assert_that(list(index.changed([{'count': 1}])),
+                    equal_to([{'count': 1}]))
+
+    def test_clear_forgets_everything(self):
+        index = PushIndex(self.path)
+        index.record([{'_id': 'a', 'count': 1}])
+        index.clear()
+
+        assert_that(list(index.changed([{'_id': 'a', 'count': 1}])),
+                    equal_to([{'_id': 'a', 'count': 1}]))
+
+    def test_closes_its_connection_as_a_context_manager(self):
+        with PushIndex(self.path) as index:
+            index.record([{'_id': 'a', 'count': 1}])
+
+        self.assertRaises(sqlite3.ProgrammingError, index.record,
+                          [{'_id': 'b', 'count': 1}])
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hamcrest import assert_that, close_to, equal_to, is_
+from mock import patch
+
+from performanceplatform.utils.rate_limit import TokenBucket, shared_bucket
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.patchers = [
+            patch('performanceplatform.utils.rate_limit.time.time',
+                  self.clock.time),
+            patch('performanceplatform.utils.rate_limit.time.sleep',
+                  self.clock.sleep),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def test_a_burst_up_to_capacity_does_not_wait(self):
+        bucket = TokenBucket(2, capacity=5)
+
+        for _ in range(5):
+            bucket.acquire()
+
+        assert_that(self.clock.now, equal_to(1000.0))
+
+    def test_then_waits_for_tokens_at_the_rate(self):
+        bucket = TokenBucket(2, capacity=1)
+
+        for _ in range(5):
+            bucket.acquire()
+
+        assert_that(self.clock.now, close_to(1002.0, 0.001))
+
+    def test_buckets_with_the_same_path_share_their_tokens(self):
+        path = os.path.join(self.directory, 'bucket.json')
+        first = TokenBucket(1, capacity=2, path=path)
+        second = TokenBucket(1, capacity=2, path=path)
+
+        first.acquire()
+        second.acquire()
+        assert_that(self.clock.now, equal_to(1000.0))
+
+        first.acquire()
+        assert_that(self.clock.now, close_to(1001.0, 0.001))
+
+    def test_shared_buckets_are_created_once(self):
+        bucket = shared_bucket('test-shared-bucket', 5)
+
+        assert_that(shared_bucket('test-shared-bucket', 5), is_(bucket))
@@ -1,7 +1,11 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import threading
+
 from mock import patch, call
 from nose.tools import assert_equal, assert_raises, assert_is
 import requests
 from performanceplatform.utils import requests_with_backoff
+from performanceplatform.utils.retry_policy import ExponentialBackoff
 
 
 def _make_good_response():
@@ -263,3 +267,90 @@ class TestRequestsWithBackoff(object):
                                         'http://fake.com',
                                         kwarg1='a kwarg',
                                         kwarg2='another kwarg')
+
+    @patch('performanceplatform.utils.requests_with_backoff.request')
+    @patch('time.sleep')
+    def test_get_waits_as_long_as_retry_after_asks(self,
+                                                   mock_sleep,
+                                                   mock_request):
+        throttled_response = _make_bad_response(503)
+        throttled_response.headers['Retry-After'] = '30'
+        mock_request.side_effect = [throttled_response,
+                                    _make_good_response()]
+
+        requests_with_backoff.get('http://fake.com')
+
+        assert_equal([call(30)], mock_sleep.call_args_list)
+
+    @patch('performanceplatform.utils.retry_policy.time.time')
+    @patch('performanceplatform.utils.requests_with_backoff.request')
+    @patch('time.sleep')
+    def test_get_gives_up_at_the_policy_deadline(self,
+                                                 mock_sleep,
+                                                 mock_request,
+                                                 mock_time):
+        clock = [1000]
+        mock_time.side_effect = lambda: clock[0]
+        mock_sleep.side_effect = lambda seconds: clock.append(
+            clock.pop() + seconds)
+        mock_request.return_value = _make_bad_response(503)
+
+        with assert_raises(requests.HTTPError):
+            requests_with_backoff.get(
+                'http://fake.com',
+                backoff_policy=ExponentialBackoff(deadline=45))
+
+        assert_equal([call(10), call(20)], mock_sleep.call_args_list)
+        assert_equal(3, mock_request.call_count)
+        mock_request.assert_called_with('GET', 'http://fake.com')
+
+
+class TestSharedSession(object):
+
+    def setup(self):
+        connections = self.connections = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                connections.append(self.client_address)
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write('ok')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/'.format(
+            self.server.server_address[1])
+        requests_with_backoff.configure_session()
+
+    def teardown(self):
+        requests_with_backoff.configure_session()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_requests_to_the_same_host_reuse_a_connection(self):
+        for _ in range(3):
+            response = requests_with_backoff.get(self.url)
+            assert_equal(response.text, 'ok')
+
+        assert_equal(len(self.connections), 1)
+
+    def test_configuring_the_session_closes_the_old_one(self):
+        old_session = requests_with_backoff.session()
+
+        with patch.object(old_session, 'close') as mock_close:
+            requests_with_backoff.configure_session(pool_maxsize=4)
+
+        assert mock_close.called
+        assert requests_with_backoff.session() is not old_session
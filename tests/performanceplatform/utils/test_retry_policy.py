@@ -0,0 +1,84 @@
+import os
+
+from hamcrest import (
+    assert_that, equal_to, greater_than_or_equal_to, instance_of, is_,
+    less_than_or_equal_to)
+from mock import patch
+
+from performanceplatform.utils.retry_policy import (
+    DecorrelatedJitterBackoff, ExponentialBackoff, default_policy)
+
+
+def _take(delays, count, retry_after=None):
+    return [delays.next(retry_after) for _ in range(count)]
+
+
+class TestExponentialBackoff(object):
+
+    def test_delays_double_from_the_base(self):
+        delays = ExponentialBackoff().delays()
+
+        assert_that(_take(delays, 5), equal_to([10, 20, 40, 80, 160]))
+
+    def test_delays_are_capped(self):
+        delays = ExponentialBackoff(max_delay=30).delays()
+
+        assert_that(_take(delays, 4), equal_to([10, 20, 30, 30]))
+
+    def test_retry_after_is_honoured(self):
+        delays = ExponentialBackoff().delays()
+
+        assert_that(delays.next(retry_after=45), equal_to(45))
+        assert_that(delays.next(retry_after=5), equal_to(90))
+
+    @patch('performanceplatform.utils.retry_policy.time.time')
+    def test_no_delay_once_past_the_deadline(self, mock_time):
+        mock_time.return_value = 1000
+        delays = ExponentialBackoff(deadline=60).delays()
+
+        assert_that(delays.next(), equal_to(10))
+        mock_time.return_value = 1010
+        assert_that(delays.next(), equal_to(20))
+        mock_time.return_value = 1030
+        assert_that(delays.next(), is_(None))
+
+
+class TestDecorrelatedJitterBackoff(object):
+
+    def test_delays_are_between_the_base_and_three_times_the_last(self):
+        delays = DecorrelatedJitterBackoff(max_delay=200).delays()
+
+        previous = 10
+        for delay in _take(delays, 20):
+            assert_that(delay, greater_than_or_equal_to(10))
+            assert_that(delay, less_than_or_equal_to(min(previous * 3, 200)))
+            previous = delay
+
+    @patch('performanceplatform.utils.retry_policy.random.uniform')
+    def test_delays_are_random(self, mock_uniform):
+        mock_uniform.side_effect = [12, 25]
+        delays = DecorrelatedJitterBackoff().delays()
+
+        assert_that(_take(delays, 2), equal_to([12, 25]))
+        assert_that(mock_uniform.call_args_list[1][0], equal_to((10, 36)))
+
+
+class TestDefaultPolicy(object):
+
+    @patch.dict(os.environ, {'COLLECTOR_BACKOFF': 'jitter',
+                             'COLLECTOR_BACKOFF_MAX_DELAY': '120',
+                             'COLLECTOR_BACKOFF_DEADLINE': '600'})
+    def test_configured_from_the_environment(self):
+        policy = default_policy()
+
+        assert_that(policy, instance_of(DecorrelatedJitterBackoff))
+        assert_that(policy.max_delay, equal_to(120))
+        assert_that(policy.deadline, equal_to(600))
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_exponential_without_limits_by_default(self):
+        policy = default_policy()
+
+        assert_that(type(policy), equal_to(ExponentialBackoff))
+        assert_that(policy.max_delay, is_(None))
+        assert_that(policy.deadline, is_(None))
@@ -0,0 +1,65 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytz
+from hamcrest import assert_that, equal_to
+
+from performanceplatform.utils.spool import Spool
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spool = Spool(os.path.join(self.directory, 'spool.jsonl'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_outstanding_chunks_are_numbered_in_order(self):
+        self.spool.append([[{'a': 1}, {'a': 2}], [{'a': 3}]])
+
+        assert_that(list(self.spool.outstanding()), equal_to([
+            (1, [{'a': 1}, {'a': 2}]),
+            (2, [{'a': 3}]),
+        ]))
+
+    def test_acknowledged_chunks_are_not_outstanding(self):
+        self.spool.append([[{'a': 1}], [{'a': 2}], [{'a': 3}]])
+        self.spool.acknowledge(2)
+
+        assert_that(list(self.spool.outstanding()), equal_to([
+            (1, [{'a': 1}]),
+            (3, [{'a': 3}]),
+        ]))
+
+    def test_appending_continues_numbering(self):
+        self.spool.append([[{'a': 1}]])
+        self.spool.acknowledge(1)
+        self.spool.append([[{'a': 2}]])
+
+        assert_that(list(self.spool.outstanding()),
+                    equal_to([(2, [{'a': 2}])]))
+
+    def test_timestamps_are_spooled_as_iso_strings(self):
+        timestamp = datetime.datetime(2014, 1, 1, tzinfo=pytz.UTC)
+        self.spool.append([[{'_timestamp': timestamp}]])
+
+        assert_that(list(self.spool.outstanding()), equal_to([
+            (1, [{'_timestamp': '2014-01-01T00:00:00+00:00'}])]))
+
+    def test_remembers_emptying(self):
+        self.spool.append([[{'a': 1}]])
+        assert_that(self.spool.emptied, equal_to(False))
+        self.spool.mark_emptied()
+        assert_that(self.spool.emptied, equal_to(True))
+
+    def test_remove(self):
+        self.spool.append([[{'a': 1}]])
+        self.spool.acknowledge(1)
+        self.spool.remove()
+
+        assert_that(self.spool.exists(), equal_to(False))
+        assert_that(os.listdir(self.directory), equal_to([]))
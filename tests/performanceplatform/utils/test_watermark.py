@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from freezegun import freeze_time
+from hamcrest import assert_that, equal_to, is_
+from mock import patch
+
+from performanceplatform.utils.watermark import (
+    Watermark, incremental_range, record_collected)
+
+DATA_SET_CONFIG = {'data-group': 'group', 'data-type': 'type'}
+
+
+class TestWatermark(unittest.TestCase):
+    def setUp(self):
+        self.state_path = tempfile.mkdtemp()
+        self.environ = patch.dict(
+            os.environ, {'COLLECTOR_STATE_PATH': self.state_path})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.state_path)
+
+    def test_only_moves_forwards(self):
+        watermark = Watermark(DATA_SET_CONFIG)
+        assert_that(watermark.get(), is_(None))
+
+        watermark.advance(date(2014, 3, 9))
+        watermark.advance(date(2014, 3, 2))
+
+        assert_that(Watermark(DATA_SET_CONFIG).get(),
+                    equal_to(date(2014, 3, 9)))
+
+    def test_range_is_unchanged_without_the_incremental_option(self):
+        Watermark(DATA_SET_CONFIG).advance(date(2014, 3, 9))
+
+        assert_that(
+            incremental_range(DATA_SET_CONFIG, {}, 'weekly', None, None),
+            equal_to((None, None)))
+
+    def test_range_is_unchanged_when_dates_are_given(self):
+        Watermark(DATA_SET_CONFIG).advance(date(2014, 3, 9))
+        start, end = datetime(2014, 1, 1), datetime(2014, 2, 1)
+
+        assert_that(
+            incremental_range(DATA_SET_CONFIG, {'incremental': True},
+                              'weekly', start, end),
+            equal_to((start, end)))
+
+    def test_range_is_unchanged_before_the_first_push(self):
+        assert_that(
+            incremental_range(DATA_SET_CONFIG, {'incremental': True},
+                              'weekly', None, None),
+            equal_to((None, None)))
+
+    @freeze_time('2014-03-26')
+    def test_range_starts_after_the_watermark(self):
+        Watermark(DATA_SET_CONFIG).advance(date(2014, 3, 2))
+
+        assert_that(
+            incremental_range(DATA_SET_CONFIG, {'incremental': True},
+                              'weekly', None, None),
+            equal_to((datetime(2014, 3, 3), datetime(2014, 3, 23))))
+
+    @freeze_time('2014-03-26')
+    def test_range_includes_the_recheck_window(self):
+        Watermark(DATA_SET_CONFIG).advance(date(2014, 3, 16))
+
+        assert_that(
+            incremental_range(
+                DATA_SET_CONFIG,
+                {'incremental': True, 'recheck-days': 7},
+                'weekly', None, None),
+            equal_to((datetime(2014, 3, 10), datetime(2014, 3, 23))))
+
+    @freeze_time('2014-03-26')
+    def test_nothing_to_collect_when_up_to_date(self):
+        Watermark(DATA_SET_CONFIG).advance(date(2014, 3, 23))
+
+        assert_that(
+            incremental_range(DATA_SET_CONFIG, {'incremental': True},
+                              'weekly', None, None),
+            is_(None))
+
+    @freeze_time('2014-03-26')
+    def test_records_the_end_of_the_last_complete_period(self):
+        record_collected(DATA_SET_CONFIG, {'incremental': True}, 'weekly',
+                         datetime(2014, 3, 3), datetime(2014, 3, 23))
+        assert_that(Watermark(DATA_SET_CONFIG).get(),
+                    equal_to(date(2014, 3, 23)))
+
+        record_collected(DATA_SET_CONFIG, {'incremental': True}, 'weekly',
+                         datetime(2014, 3, 3), datetime(2014, 3, 26))
+        assert_that(Watermark(DATA_SET_CONFIG).get(),
+                    equal_to(date(2014, 3, 25)))
+
+    def test_records_nothing_without_the_incremental_option(self):
+        record_collected(DATA_SET_CONFIG, {}, 'weekly',
+                         datetime(2014, 3, 3), datetime(2014, 3, 23))
+
+        assert_that(Watermark(DATA_SET_CONFIG).get(), is_(None))
+
+    def test_records_nothing_on_a_dry_run(self):
+        record_collected(dict(DATA_SET_CONFIG, dry_run=True),
+                         {'incremental': True}, 'weekly',
+                         datetime(2014, 3, 3), datetime(2014, 3, 23))
+
+        assert_that(Watermark(DATA_SET_CONFIG).get(), is_(None))
@@ -0,0 +1,76 @@
+"""
+Measure how quickly department codes are looked up, comparing the way
+they used to be looked up (compiling the department code pattern for every
+value) with DepartmentResolver, which compiles it once and remembers the
+department for each distinct string.
+
+The synthetic values are like GA's customVarValue9, the department codes
+of a page's organisations: a few departments publish most of the pages, so
+the departments are drawn from a Zipf-like distribution, and some values
+list more than one organisation or have codes which are not in the mapping.
+
+  python tools/benchmark-departments.py --rows 1000000
+"""
+import random
+import re
+
+from benchmark_util import argument_parser, compare, use_checkout
+
+use_checkout()
+from performanceplatform.collector.ga.plugins.department import (
+    DEPARTMENT_MAPPING, DepartmentResolver)
+
+
+def synthetic_values(rows, seed=1):
+    rng = random.Random(seed)
+    codes = sorted(DEPARTMENT_MAPPING) + ['<D9999>', '<EA9999>']
+    weights = [1.0 / rank for rank in range(1, len(codes) + 1)]
+    total = sum(weights)
+
+    def department_code():
+        point = rng.random() * total
+        for code, weight in zip(codes, weights):
+            point -= weight
+            if point <= 0:
+                return code
+        return codes[-1]
+
+    distinct = [''.join(department_code()
+                        for _ in range(rng.choice([1, 1, 1, 2, 3])))
+                for _ in range(5000)]
+    return [distinct[min(int(rng.expovariate(0.002)), len(distinct) - 1)]
+            for _ in range(rows)]
+
+
+def resolve_per_value(values):
+    """
+    Departments looked up as they were before DepartmentResolver
+    """
+    departments = []
+    for value in values:
+        get_first_re = re.compile("^(<[^>]+>).*$")
+        match = get_first_re.match(value)
+        assert match is not None
+        (code, ) = match.groups()
+        departments.append(DEPARTMENT_MAPPING.get(code, code))
+    return departments
+
+
+def main():
+    parser = argument_parser(__doc__)
+    args = parser.parse_args()
+
+    values = synthetic_values(args.rows)
+    assert (resolve_per_value(values[:1000]) ==
+            DepartmentResolver().resolve_all(values[:1000]))
+
+    print('{:,} rows, {:,} distinct values'.format(
+        args.rows, len(set(values))))
+    compare(args.rows,
+            ('per value', lambda: resolve_per_value(values)),
+            ('resolver', lambda: DepartmentResolver().resolve_all(values)),
+            args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure how quickly the _id and humanId of documents are made, comparing
+the way they used to be made (formatting every timestamp and a debug
+message for every document) with a TimestampFormatter and value_ids,
+which format each timestamp in a batch once and only format debug
+messages when they will be logged.
+
+The synthetic rows are spread over a year of weekly timestamps, as a
+backfill of a weekly data set would be.
+
+  python tools/benchmark-document-ids.py --rows 1000000
+"""
+import base64
+import logging
+from datetime import datetime, timedelta
+
+import pytz
+
+from benchmark_util import argument_parser, compare, use_checkout
+
+use_checkout()
+from performanceplatform.utils.data_parser import get_string_for_data_id
+from performanceplatform.utils.document_id import (
+    TimestampFormatter, format_timestamp, value_ids)
+
+
+def synthetic_rows(rows, timestamps):
+    first = datetime(2014, 1, 6, tzinfo=pytz.UTC)
+    return [(first + timedelta(weeks=n % timestamps),
+             [u'browser{}'.format(n % 20), u'device{}'.format(n % 3)])
+            for n in range(rows)]
+
+
+def ids_per_document(rows):
+    """
+    Ids made as they were before they were made in bulk
+    """
+    ids = []
+    for timestamp, dimensions in rows:
+        value = get_string_for_data_id(
+            'browsers', timestamp, 'week', dimensions, format_timestamp)
+        value_bytes = value.encode('utf-8')
+        logging.debug(u"'{0}' ({1})".format(value, type(value)))
+        ids.append((base64.urlsafe_b64encode(value_bytes), value_bytes))
+    return ids
+
+
+def ids_in_bulk(rows):
+    format_once = TimestampFormatter()
+    return value_ids([
+        get_string_for_data_id(
+            'browsers', timestamp, 'week', dimensions, format_once)
+        for timestamp, dimensions in rows])
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--timestamps', type=int, default=52)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    rows = synthetic_rows(args.rows, args.timestamps)
+
+    assert ids_per_document(rows[:1000]) == ids_in_bulk(rows[:1000])
+
+    print('{:,} rows, {} timestamps'.format(args.rows, args.timestamps))
+    compare(args.rows,
+            ('per document', lambda: ids_per_document(rows)),
+            ('in bulk', lambda: ids_in_bulk(rows)),
+            args.repeat)
+
+
+if __name__ == '__main__':
+    main()
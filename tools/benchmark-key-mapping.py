@@ -0,0 +1,91 @@
+"""
+Measure how quickly documents have their keys mapped, comparing the way
+mappings used to be applied (parsing every mapping and splitting every
+multi-value field again for each document) with DocumentBuilder, which
+parses them once and splits each field once per document.
+
+The synthetic rows have several customVarValue-style fields holding
+colon separated values, each split out by a mapping per value.
+
+  python tools/benchmark-key-mapping.py --rows 1000000
+"""
+import re
+from datetime import date
+
+from benchmark_util import argument_parser, compare, use_checkout
+
+use_checkout()
+from performanceplatform.utils.data_parser import DocumentBuilder
+
+
+def synthetic_rows(rows, fields, values_per_field):
+    distinct_rows = [
+        {
+            'start_date': date(2014, 1, 6),
+            'dimensions': dict(
+                ('customVarValue{}'.format(field),
+                 ':'.join('{}-{}-{}'.format(n, field, value)
+                          for value in range(values_per_field)))
+                for field in range(1, fields + 1)),
+        }
+        for n in range(1000)
+    ]
+    return [distinct_rows[n % len(distinct_rows)] for n in range(rows)]
+
+
+def synthetic_mappings(fields, values_per_field):
+    mappings = dict(
+        ('customVarValue{}_{}'.format(field, value),
+         'field{}Value{}'.format(field, value))
+        for field in range(1, fields + 1)
+        for value in range(values_per_field))
+    mappings['customVarValue1'] = 'allOfField1'
+    return mappings
+
+
+def map_per_document(mapping, pairs):
+    """
+    Mappings applied as they were before they were compiled
+    """
+    one_to_one = dict(
+        (mapping.get(key, key), value) for key, value in pairs.items())
+    multi_value = {}
+    for from_key, to_key in mapping.items():
+        matches = re.search('^(.*)_(\d*)$', from_key)
+        if matches:
+            multi_value_field = pairs.get(matches.group(1))
+            if multi_value_field is None:
+                continue
+            values = multi_value_field.split(':')
+            index = int(matches.group(2))
+            if index < len(values):
+                multi_value[to_key] = values[index]
+    return dict(one_to_one.items() + multi_value.items())
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--fields', type=int, default=5)
+    parser.add_argument('--values-per-field', type=int, default=4)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows, args.fields, args.values_per_field)
+    mappings = synthetic_mappings(args.fields, args.values_per_field)
+    builder = DocumentBuilder('benchmark', mappings)
+    documents = [row['dimensions'] for row in rows]
+
+    assert all(map_per_document(mappings, document) ==
+               builder.map_keys(document)
+               for document in documents[:1000])
+
+    print('{:,} rows, {} mappings'.format(args.rows, len(mappings)))
+    compare(args.rows,
+            ('per document', lambda: [map_per_document(mappings, document)
+                                      for document in documents]),
+            ('compiled', lambda: [builder.map_keys(document)
+                                  for document in documents]),
+            args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure how quickly plugins are run over many small sets of documents, as
+they are when a daemon or a batch runs many collectors in one process,
+comparing the way they used to be loaded (compiling every plugin string
+again for every set) with compile_plugins, which parses each string once.
+
+The plugins are typical of the content dashboards: a department looked up
+for every document, some keys removed, and an id made from the others.
+
+  python tools/benchmark-plugins.py --runs 10000 --rows 100
+"""
+import __builtin__
+
+from benchmark_util import argument_parser, compare, use_checkout
+
+use_checkout()
+import performanceplatform.collector.ga.plugins
+from performanceplatform.collector.ga.plugins import compile_plugins
+from performanceplatform.collector.ga.plugins.department import (
+    DEPARTMENT_MAPPING)
+
+PLUGINS = [
+    'ComputeDepartmentKey("customVarValue9")',
+    'SetDepartment("<D3>")',
+    'ComputeDepartmentKey("customVarValue9")',
+    'RemoveKey("customVarValue9", "visitors")',
+    'Comment("ids are made from the page and timestamp")',
+    'ComputeIdFrom("_timestamp", "pagePath")',
+]
+
+
+def synthetic_documents(rows):
+    codes = sorted(DEPARTMENT_MAPPING)
+    return [{'_timestamp': '2014-01-06T00:00:00+00:00',
+             'pagePath': u'/page/{}'.format(n),
+             'customVarValue9': codes[n % len(codes)],
+             'visitors': n,
+             'visits': n}
+            for n in range(rows)]
+
+
+def parse_every_time(plugin_names, documents):
+    """
+    Plugins run as they were before their strings were parsed only once
+    """
+    for plugin_name in plugin_names:
+        plugin = eval(
+            compile(plugin_name, "performanceplatform.collector plugin",
+                    "eval"),
+            __builtin__.__dict__,
+            performanceplatform.collector.ga.plugins.__dict__)
+        documents = plugin(documents)
+    return documents
+
+
+def main():
+    parser = argument_parser(__doc__, rows=100)
+    parser.add_argument('--runs', type=int, default=10000)
+    args = parser.parse_args()
+
+    assert (parse_every_time(PLUGINS, synthetic_documents(1000)) ==
+            compile_plugins(PLUGINS)(synthetic_documents(1000)))
+
+    print('{:,} runs of {:,} rows, {} plugins'.format(
+        args.runs, args.rows, len(PLUGINS)))
+
+    def run(plugins):
+        # The plugins change the documents, so each repeat needs new ones
+        repeats = [[synthetic_documents(args.rows) for _ in range(args.runs)]
+                   for _ in range(args.repeat)]
+        return lambda: [plugins(documents) for documents in repeats.pop()]
+
+    compare(args.runs * args.rows,
+            ('parsed every run',
+             run(lambda documents: parse_every_time(PLUGINS, documents))),
+            ('compiled',
+             run(lambda documents: compile_plugins(PLUGINS)(documents))),
+            args.repeat)
+
+
+if __name__ == '__main__':
+    main()
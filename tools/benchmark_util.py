@@ -0,0 +1,69 @@
+"""
+The shared parts of the benchmark scripts in this directory, which time an
+old way of doing something against a new one over synthetic rows.
+
+Each script calls use_checkout before importing anything from the
+collector, so that it measures the code in this checkout, run as
+
+  python tools/benchmark-<name>.py
+"""
+import argparse
+import os
+import sys
+import time
+
+
+def use_checkout():
+    """
+    Import the collector from the checkout this file is in. The installed
+    performanceplatform-client sets up the performanceplatform namespace
+    package without it, so putting the checkout on sys.path is not enough.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    import performanceplatform
+    package = os.path.join(root, 'performanceplatform')
+    if package not in performanceplatform.__path__:
+        performanceplatform.__path__.insert(0, package)
+
+
+def argument_parser(description, rows=1000000):
+    """
+    An ArgumentParser with the --rows and --repeat options every benchmark
+    takes, for the script to add its own to
+    """
+    parser = argparse.ArgumentParser(
+        description=description,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=rows)
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Time each way this many times and report '
+                             'the fastest')
+    return parser
+
+
+def time_it(name, rows, function, repeat=1):
+    """
+    Print and return the fewest seconds `function` took in `repeat` calls
+    """
+    seconds = None
+    for _ in range(repeat):
+        started = time.time()
+        function()
+        elapsed = time.time() - started
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    print('{:<20} {:>8.2f}s {:>12,.0f} rows/s'.format(
+        name, seconds, rows / seconds))
+    return seconds
+
+
+def compare(rows, before, after, repeat=1):
+    """
+    Time two (name, function) pairs over the same number of rows, the old
+    way first, and print how much faster the new way is
+    """
+    before_seconds = time_it(before[0], rows, before[1], repeat)
+    after_seconds = time_it(after[0], rows, after[1], repeat)
+    print('{:.1f}x faster'.format(before_seconds / after_seconds))